@@ -0,0 +1,82 @@
+import sys
+import json
+import argparse
+
+# Compare two bench/run_bench.py result files: overall latency and throughput,
+# then per-node and per-phase means. Exits 1 when a headline number regressed
+# by more than --threshold (relative), so it can gate a CI job.
+
+HEADLINES = (
+    # (label, path into the result, True if higher is better)
+    ("latency p50", ("latency_seconds", "p50"), False),
+    ("latency p95", ("latency_seconds", "p95"), False),
+    ("latency max", ("latency_seconds", "max"), False),
+    ("throughput/min", ("throughput_per_minute",), True),
+)
+SECTIONS = ("nodes", "phases", "llm", "time_to_ready", "queue_wait")
+
+
+def _get(result: dict, path: tuple):
+    for key in path:
+        result = (result or {}).get(key)
+    return result
+
+
+def _delta(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old
+
+
+def _row(label: str, old, new) -> str:
+    delta = _delta(old, new)
+    shown = f"{delta:+.1%}" if delta is not None else "n/a"
+    return f"  {label:<32} {str(old):>10} -> {str(new):<10} {shown}"
+
+
+def compare(old: dict, new: dict, threshold: float = 0.1) -> list:
+    """Print the comparison and return the regressed headline labels."""
+    print(f"baseline {old.get('commit')} ({old.get('timestamp')})  vs  {new.get('commit')} ({new.get('timestamp')})"
+          f"{'  [dirty tree]' if new.get('dirty') else ''}")
+    if old.get("config", {}).get("mode") != new.get("config", {}).get("mode") or \
+            old.get("config", {}).get("scenario") != new.get("config", {}).get("scenario"):
+        print("  warning: the runs used different modes/scenarios")
+    print(f"  {'ok':<32} {old.get('ok')}/{old.get('requests')} -> {new.get('ok')}/{new.get('requests')}")
+
+    regressions = []
+    for label, path, higher_is_better in HEADLINES:
+        old_value, new_value = _get(old, path), _get(new, path)
+        print(_row(label, old_value, new_value))
+        delta = _delta(old_value, new_value)
+        if delta is not None and (-delta if higher_is_better else delta) > threshold:
+            regressions.append(label)
+
+    for section in SECTIONS:
+        keys = sorted(set(old.get(section) or {}) | set(new.get(section) or {}))
+        if not keys:
+            continue
+        print(f"{section} (mean seconds):")
+        for key in keys:
+            print(_row(key, _get(old, (section, key, "mean")), _get(new, (section, key, "mean"))))
+
+    if new.get("ok", 0) < new.get("requests", 0):
+        regressions.append("failed requests")
+    print(f"\nregressed beyond {threshold:.0%}: {', '.join(regressions)}" if regressions else "\nno regressions")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+    with open(args.baseline, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        new = json.load(f)
+    return 1 if compare(old, new, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stand-in for the OpenAI chat completions API used by the benchmarks.
+# Replies are canned per agent (picked by a marker in the system prompt),
+# delayed by a configurable latency and streamed in chunks when asked.
+# The app is pointed at it through OPENAI_BASE_URL.
+
+INDEX_JS = (
+    "import Head from 'next/head';\n\n"
+    "export default function Home() {\n"
+    "  return (\n"
+    "    <div className=\"min-h-screen bg-gradient-to-r from-purple-500 to-pink-500 p-6\">\n"
+    "      <Head>\n        <title>Bench Dashboard</title>\n      </Head>\n"
+    "      <nav className=\"fixed top-0 w-full z-50 bg-white p-4\">Bench</nav>\n"
+    "      <main className=\"pt-20 grid grid-cols-3 gap-4\">\n"
+    "        <div className=\"rounded bg-white p-4\">Calories: 1,820</div>\n"
+    "        <div className=\"rounded bg-white p-4\">Steps: 9,412</div>\n"
+    "        <div className=\"rounded bg-white p-4\">Workouts: 4</div>\n"
+    "      </main>\n"
+    "    </div>\n"
+    "  );\n"
+    "}\n"
+)
+
+FILE_MAP = {
+    "package.json": json.dumps({
+        "name": "bench-app",
+        "version": "0.1.0",
+        "private": True,
+        "scripts": {"dev": "next dev -p 3000", "build": "next build", "start": "next start -p 3000"},
+        "dependencies": {"next": "^15.5.3", "react": "^19.1.1", "react-dom": "^19.1.1"},
+        "devDependencies": {"tailwindcss": "^3.4.10", "autoprefixer": "^10.4.20", "postcss": "^8.4.41"},
+    }, indent=2),
+    "pages/index.js": INDEX_JS,
+    "pages/api/data.js": "export default function handler(req, res) {\n  res.status(200).json({ calories: 1820, steps: 9412 });\n}\n",
+    "tailwind.config.js": "module.exports = {\n  content: [\"./pages/**/*.{js,jsx}\"],\n  theme: { extend: {} },\n  plugins: [],\n};\n",
+    "postcss.config.js": "module.exports = {\n  plugins: { tailwindcss: {}, autoprefixer: {} },\n};\n",
+    "styles/globals.css": "@tailwind base;\n@tailwind components;\n@tailwind utilities;\n",
+}
+
+# (system prompt marker, reply). The first marker found in the system prompt wins.
+RESPONSES = [
+    ("software architect", json.dumps({"output": {
+        "entities": {"Metric": ["name", "value"]},
+        "pages": {"/": "dashboard"},
+        "features": {"cards": "calories, steps and workout cards"},
+        "components": {"Navbar": "fixed top navbar", "MetricCard": "one metric"},
+    }})),
+    ("planning agent", json.dumps({"output": [
+        {"task": "layout", "description": "Dashboard page with a fixed navbar", "files": ["pages/index.js"]},
+        {"task": "data", "description": "Mock metrics API", "files": ["pages/api/data.js"]},
+        {"task": "styles", "description": "Tailwind setup", "files": ["tailwind.config.js", "styles/globals.css"]},
+    ]})),
+    ("editing an existing app", json.dumps({"output": {"pages/index.js": INDEX_JS.replace("from-purple-500", "from-blue-500")}})),
+    ("generating ONE file", None),  # content of the requested file, see reply_for()
+    ("Next.js developer", json.dumps({"output": FILE_MAP})),
+    ("analyzes user prompts", None),  # intent JSON, see reply_for()
+    ("JSON parser", json.dumps({"output": {}})),
+]
+DEFAULT_REPLY = json.dumps({"output": {}})
+
+CONFIG = {"latency": 0.2, "token_delay": 0.002, "chunk_chars": 24}
+STATS = {"requests": 0, "streamed": 0}
+_lock = threading.Lock()
+
+
+def reply_for(messages: list) -> str:
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+    for marker, reply in RESPONSES:
+        if marker not in system:
+            continue
+        if marker == "generating ONE file":
+            path = re.search(r"File to write: (\S+)", user)
+            return FILE_MAP.get(path.group(1) if path else "", "export default function Page() {\n  return null;\n}\n")
+        if marker == "analyzes user prompts":
+            slug = re.search(r"Existing slug \(if any\): (\S+)", user)
+            slug = slug.group(1) if slug and slug.group(1) != "None" else None
+            return json.dumps({"action": "edit" if slug else "build", "slug": slug, "details": user})
+        return reply
+    return DEFAULT_REPLY
+
+
+def _usage(messages: list, content: str) -> dict:
+    # Rough token counts (4 characters per token) so usage metrics have realistic magnitudes
+    prompt = sum(len(m.get("content") or "") for m in messages) // 4
+    completion = len(content) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        messages = body.get("messages") or []
+        content = reply_for(messages)
+        with _lock:
+            STATS["requests"] += 1
+        time.sleep(CONFIG["latency"])
+        if body.get("stream"):
+            self._stream(body, messages, content)
+        else:
+            self._send_json({
+                "id": f"chatcmpl-bench-{STATS['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "bench"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": _usage(messages, content),
+            })
+
+    def _send_json(self, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, body: dict, messages: list, content: str):
+        with _lock:
+            STATS["streamed"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "bench")}
+
+        def send(chunk):
+            self.wfile.write(f"data: {json.dumps({**base, **chunk})}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        size = CONFIG["chunk_chars"]
+        for i in range(0, len(content), size):
+            send({"choices": [{"index": 0, "delta": {"content": content[i:i + size]}, "finish_reason": None}]})
+            time.sleep(CONFIG["token_delay"])
+        send({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send({"choices": [], "usage": _usage(messages, content)})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start(port: int = 0, latency: float = None, token_delay: float = None, responses: dict = None):
+    """
+    Serve the stub on 127.0.0.1:port (0 picks a free port) in a daemon thread.
+    `responses` maps extra system prompt markers to replies, checked first.
+    Returns: (server, base_url) where base_url is the value for OPENAI_BASE_URL.
+    """
+    if latency is not None:
+        CONFIG["latency"] = latency
+    if token_delay is not None:
+        CONFIG["token_delay"] = token_delay
+    if responses:
+        RESPONSES[:0] = list(responses.items())
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub for offline benchmarks")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=CONFIG["latency"], help="seconds before each reply starts")
+    parser.add_argument("--token-delay", type=float, default=CONFIG["token_delay"], help="seconds between streamed chunks")
+    parser.add_argument("--responses", help="JSON file mapping system prompt markers to replies")
+    args = parser.parse_args()
+    extra = json.load(open(args.responses, encoding="utf-8")) if args.responses else None
+    server, url = start(args.port, args.latency, args.token_delay, extra)
+    print(f"OpenAI stub listening, set OPENAI_BASE_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
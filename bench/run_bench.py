@@ -0,0 +1,313 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import concurrent.futures
+from pathlib import Path
+
+# Offline end-to-end benchmark of the build/edit pipeline.
+# The LLM is the stub in bench/openai_stub.py and, by default, npm is the fake
+# in bench/fake_bin, so a run costs nothing and takes seconds. Runs either
+# graph.engine.run_graph directly ("graph") or the /process endpoint of a
+# uvicorn server ("http") with N concurrent users, and writes latency
+# percentiles, throughput and per-node/per-phase timings to a JSON file that
+# bench/compare.py diffs across commits.
+#
+#   python -m bench.run_bench --mode http --users 4 --requests 3
+#   python -m bench.compare bench/results/old.json bench/results/new.json
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKE_BIN = Path(__file__).resolve().parent / "fake_bin"
+PROMPT = "Build a fitness dashboard with a purple and pink gradient, a fixed navbar and calories, steps and workout cards"
+EDIT_PROMPT = "change the gradient to blue"
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return round(values[lo] + (values[hi] - values[lo]) * (k - lo), 4)
+
+
+def latency_summary(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "min": round(min(values), 4) if values else None,
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+def histogram_quantile(hist: dict, q: float):
+    """Estimate a quantile from cumulative bucket counts (linear within a bucket, like PromQL)."""
+    if not hist["count"]:
+        return None
+    rank, prev_bound, prev_count = q * hist["count"], 0.0, 0
+    for bound, count in zip(hist["bounds"], hist["buckets"]):
+        if count >= rank:
+            return round(prev_bound + (bound - prev_bound) * (rank - prev_count) / max(count - prev_count, 1), 4)
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+def histogram_table(metrics, name: str, *label_names) -> dict:
+    table = {}
+    for labels, hist in metrics.snapshot(name):
+        key = "/".join(str(labels.get(n, "")) for n in label_names)
+        table[key] = {
+            "count": hist["count"],
+            "total": round(hist["sum"], 4),
+            "mean": round(hist["sum"] / hist["count"], 4) if hist["count"] else None,
+            "p50": histogram_quantile(hist, 0.5),
+            "p95": histogram_quantile(hist, 0.95),
+        }
+    return dict(sorted(table.items()))
+
+
+def counter_table(metrics, name: str, *label_names) -> dict:
+    return dict(sorted(("/".join(str(labels.get(n, "")) for n in label_names), value)
+                       for labels, value in metrics.snapshot(name)))
+
+
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return ""
+    return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def configure_environment(args, workdir: str, stub_url: str):
+    """
+    Point the app at the stub, the fake npm and a scratch work directory. Must
+    run before graph/ui modules are imported: they read their settings at import time.
+    """
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": stub_url,
+        "LLM_CACHE_ENABLED": "0",
+        "LANGCHAIN_TRACING_V2": "false",
+        "LANGSMITH_TRACING": "false",
+        "JOB_WORKERS": str(args.workers or args.users),
+        "JOB_QUEUE_MAX": str(max(20, args.users * args.requests * 2)),
+        "PREVIEW_MAX_LIVE": str(args.users * args.requests + 1),
+        "PREVIEW_PORT_MIN": str(args.port_base),
+        "PREVIEW_PORT_MAX": str(args.port_base + 200),
+        "PREVIEW_HOST": "127.0.0.1",
+        "SCAFFOLD_MODE": args.scaffold_mode,
+    })
+    if args.shell == "fake":
+        os.environ["PATH"] = f"{args.fake_bin}{os.pathsep}{os.environ.get('PATH', '')}"
+    for key, value in (args.env or []):
+        os.environ[key] = value
+    os.chdir(workdir)
+    sys.path.insert(0, str(ROOT))
+
+
+def run_graph_request(engine, index: int, scenario: str, built: dict) -> dict:
+    slug = f"bench-{index}"
+    if scenario == "edit":
+        base = built[slug]
+        state = {
+            "user_prompt": f"Original app: {PROMPT}. Edit requirement: {EDIT_PROMPT}",
+            "slug": slug, "repo_path": base["repo_path"], "task_log": base.get("task_log", []),
+            "file_diffs": [], "pid": base.get("pid"), "port": base.get("port"), "run_url": base.get("run_url"),
+            "edit_mode": True, "edit_request": EDIT_PROMPT, "original_prompt": PROMPT,
+        }
+    else:
+        state = {"user_prompt": PROMPT, "slug": slug, "task_log": [], "file_diffs": [], "repo_path": None}
+    start = time.perf_counter()
+    result = engine.run_graph(state)
+    seconds = time.perf_counter() - start
+    built[slug] = result
+    return {"ok": bool(result.get("run_url")) and not result.get("last_error"), "seconds": seconds,
+            "error": result.get("last_error")}
+
+
+def run_http_request(client, index: int, scenario: str, built: dict, timeout: float) -> dict:
+    data = {"prompt": PROMPT}
+    if scenario == "edit":
+        data = {"prompt": EDIT_PROMPT, "slug": built[f"bench-{index}"]}
+    start = time.perf_counter()
+    response = client.post("/process", data=data)
+    if response.status_code != 200:
+        return {"ok": False, "seconds": time.perf_counter() - start, "error": f"HTTP {response.status_code}: {response.text[:200]}"}
+    job_id = re.search(r'data-job-id="([^"]+)"', response.text).group(1)
+    job = {}
+    while time.perf_counter() - start < timeout:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "error"):
+            break
+        time.sleep(0.05)
+    seconds = time.perf_counter() - start
+    result = job.get("result") or {}
+    if scenario == "build" and result.get("slug"):
+        built[f"bench-{index}"] = result["slug"]
+    return {"ok": job.get("status") == "done" and bool(result.get("run_url")) and not result.get("last_error"),
+            "seconds": seconds, "error": job.get("error") or result.get("last_error") or (None if job else "timeout")}
+
+
+def start_server(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-uvicorn", daemon=True)
+    thread.start()
+    deadline = time.time() + 20
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+    return server, thread
+
+
+def run(args) -> dict:
+    from bench import openai_stub
+
+    workdir = tempfile.mkdtemp(prefix="lovable-bench-")
+    stub, stub_url = openai_stub.start(latency=args.latency, token_delay=args.token_delay,
+                                       responses=json.load(open(args.responses, encoding="utf-8")) if args.responses else None)
+    configure_environment(args, workdir, stub_url)
+    print(f"bench: workdir={workdir} stub={stub_url} mode={args.mode} scenario={args.scenario} users={args.users}")
+
+    import httpx
+    from tools import metrics, preview_supervisor
+    from graph import engine
+
+    indices = list(range(args.users * args.requests))
+    built, server, client = {}, None, None
+    if args.mode == "http":
+        from ui import main
+        port = free_port()
+        server, _ = start_server(main.app, port)
+        client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30.0)
+
+    def one(index):
+        try:
+            if args.mode == "http":
+                return run_http_request(client, index, args.scenario, built, args.timeout)
+            return run_graph_request(engine, index, args.scenario, built)
+        except Exception as e:
+            return {"ok": False, "seconds": 0.0, "error": f"{type(e).__name__}: {e}"}
+
+    try:
+        if args.scenario == "edit":
+            # Edits need built apps: build them first, outside the measurement
+            scenario = args.scenario
+            args.scenario = "build"
+            with concurrent.futures.ThreadPoolExecutor(max_workers=args.users) as pool:
+                list(pool.map(one, indices))
+            args.scenario = scenario
+
+        metrics.reset()
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.users) as pool:
+            outcomes = list(pool.map(one, indices))
+        wall = time.perf_counter() - start
+    finally:
+        if client:
+            client.close()
+        if server:
+            server.should_exit = True
+        preview_supervisor.stop_all()
+        stub.shutdown()
+
+    latencies = [o["seconds"] for o in outcomes if o["ok"]]
+    return {
+        **git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "fake_bin")},
+        "requests": len(outcomes),
+        "ok": len(latencies),
+        "errors": [o["error"] for o in outcomes if not o["ok"]][:10],
+        "wall_seconds": round(wall, 3),
+        "throughput_per_minute": round(60 * len(latencies) / wall, 2) if wall else None,
+        "latency_seconds": latency_summary(latencies),
+        "nodes": histogram_table(metrics, "node_duration_seconds", "node"),
+        "phases": histogram_table(metrics, "phase_duration_seconds", "phase", "status"),
+        "llm": histogram_table(metrics, "llm_request_duration_seconds", "node"),
+        "llm_tokens": counter_table(metrics, "llm_tokens_total", "node", "kind"),
+        "time_to_ready": histogram_table(metrics, "time_to_ready_seconds", "via"),
+        "queue_wait": histogram_table(metrics, "job_queue_wait_seconds", "kind"),
+        "stub_requests": openai_stub.STATS["requests"],
+    }
+
+
+def print_report(result: dict):
+    lat = result["latency_seconds"]
+    print(f"\n{result['ok']}/{result['requests']} ok in {result['wall_seconds']}s, "
+          f"{result['throughput_per_minute']}/min, p50={lat['p50']}s p95={lat['p95']}s max={lat['max']}s")
+    for error in result["errors"]:
+        print(f"  error: {str(error)[:160]}")
+    for section in ("nodes", "phases", "llm", "time_to_ready", "queue_wait"):
+        if not result[section]:
+            continue
+        print(f"{section}:")
+        for key, row in result[section].items():
+            print(f"  {key:<28} n={row['count']:<4} mean={row['mean']}s p95~{row['p95']}s total={row['total']}s")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the app builder pipeline")
+    parser.add_argument("--mode", choices=("graph", "http"), default="graph",
+                        help="call run_graph directly or go through POST /process")
+    parser.add_argument("--scenario", choices=("build", "edit"), default="build")
+    parser.add_argument("--users", type=int, default=1, help="concurrent users")
+    parser.add_argument("--requests", type=int, default=3, help="requests per user")
+    parser.add_argument("--workers", type=int, default=0, help="JOB_WORKERS for http mode (default: users)")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds before each LLM reply")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="stub seconds between streamed chunks")
+    parser.add_argument("--responses", help="JSON file of extra stub replies keyed by system prompt marker")
+    parser.add_argument("--shell", choices=("fake", "real"), default="fake",
+                        help="fake: npm from --fake-bin; real: the npm on PATH")
+    parser.add_argument("--fake-bin", default=str(FAKE_BIN), help="directory with the fake npm (and any other fake commands)")
+    parser.add_argument("--scaffold-mode", choices=("single", "fanout"), default="single")
+    parser.add_argument("--env", action="append", type=lambda s: tuple(s.split("=", 1)), metavar="KEY=VALUE",
+                        help="extra environment setting for the app (repeatable)")
+    parser.add_argument("--port-base", type=int, default=43000, help="first preview port")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for one job in http mode")
+    parser.add_argument("--out", help="result file (default bench/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.fake_bin = str(Path(args.fake_bin).resolve())
+    out = args.out and str(Path(args.out).resolve())
+    compare_with = args.compare and str(Path(args.compare).resolve())
+    result = run(args)
+    print_report(result)
+
+    if not out:
+        results_dir = ROOT / "bench" / "results"
+        results_dir.mkdir(exist_ok=True)
+        out = str(results_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{result['commit'] or 'nogit'}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nbench: results written to {out}")
+
+    if compare_with:
+        from bench import compare
+        return compare.main([compare_with, out])
+    return 0 if result["ok"] == result["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import os
+import shutil
+import threading
+import time
+from tools import repo_tool, shell_tool, build_cache, dep_store
+from .nodes import fixer, log_entry
+
+# Production builds for previews served in "fast"/"lazy" mode. They run in a
+# separate build directory per slug so `next build` never touches the .next
+# directory of the running dev server. Failures go through the Fixer node; its
+# fixes land in the workspace, where the dev server hot-reloads them.
+PROD_BUILD_DIR = os.path.abspath(os.environ.get("PROD_BUILD_DIR", os.path.join("work", ".prod-builds")))
+PROD_BUILD_RETRIES = int(os.environ.get("PROD_BUILD_RETRIES", "2"))
+
+# Workspace entries that are not copied into the build directory
+SKIP_NAMES = {"node_modules", ".next", "dev_server.log"}
+
+BUILDS = {}  # slug -> build record
+_lock = threading.Lock()
+
+
+def status(slug: str):
+    record = BUILDS.get(slug)
+    if record is None:
+        return None
+    return {k: v for k, v in record.items() if k != "thread"}
+
+
+def start(state: dict, on_done=None) -> dict:
+    """
+    Start a background production build for the run in `state`, unless one is
+    already running for its slug. on_done(record, final_state) is called when
+    the build finishes, with the state as last updated by the Fixer.
+    """
+    slug = state["slug"]
+    with _lock:
+        record = BUILDS.get(slug)
+        if record and record["status"] == "running":
+            return record
+        record = {
+            "status": "running",
+            "started": time.time(),
+            "finished": None,
+            "error": None,
+            "fixes": 0,
+            "build_logs": "",
+        }
+        BUILDS[slug] = record
+    thread = threading.Thread(target=_run, args=(dict(state), record, on_done), name=f"prod-build-{slug}", daemon=True)
+    record["thread"] = thread
+    thread.start()
+    print(f"Background build started for {slug}")
+    return record
+
+
+def wait(slug: str, timeout: float = None):
+    """Wait for the slug's background build to finish and return its status."""
+    record = BUILDS.get(slug)
+    if record and record.get("thread"):
+        record["thread"].join(timeout)
+    return status(slug)
+
+
+def _sync_build_dir(repo_path: str, build_dir: str):
+    """
+    Mirror the workspace sources into build_dir, keeping build_dir/.next/cache
+    and linking node_modules from the workspace when its dependencies changed.
+    """
+    os.makedirs(build_dir, exist_ok=True)
+    for name in os.listdir(build_dir):
+        if name in SKIP_NAMES:
+            continue
+        path = os.path.join(build_dir, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    shutil.copytree(repo_path, build_dir, dirs_exist_ok=True, ignore=lambda d, names: [n for n in names if d == repo_path and n in SKIP_NAMES])
+
+    src_modules = os.path.join(repo_path, "node_modules")
+    dest_modules = os.path.join(build_dir, "node_modules")
+    stale = not os.path.isdir(dest_modules) or dep_store.installed_hash(build_dir) != dep_store.installed_hash(repo_path)
+    if os.path.isdir(src_modules) and stale:
+        shutil.rmtree(dest_modules, ignore_errors=True)
+        repo_tool.link_tree(src_modules, dest_modules)
+
+
+def _run(state: dict, record: dict, on_done):
+    slug = state["slug"]
+    build_dir = os.path.join(PROD_BUILD_DIR, slug)
+    try:
+        for attempt in range(PROD_BUILD_RETRIES + 1):
+            _sync_build_dir(state["repo_path"], build_dir)
+            cache_state = build_cache.prepare(build_dir)
+            build_start = time.time()
+            code, out, err = shell_tool.run_command(["npm", "run", "build"], cwd=build_dir)
+            build_seconds = time.time() - build_start
+            # Retries append to the log; keep it to the same tail a single phase keeps
+            record["build_logs"] = shell_tool.tail(record["build_logs"] + f"\n=== npm run build ({cache_state} cache, {build_seconds:.1f}s) ===\n{out}\n{err}")
+            print(f"Background build for {slug}: attempt={attempt} code={code} ({cache_state}, {build_seconds:.1f}s)")
+
+            if code == 0:
+                build_cache.record(slug, cache_state, build_seconds)
+                record["status"] = "ok"
+                record["error"] = None
+                state["task_log"] = state.get("task_log", []) + [log_entry("ProductionBuild", "ok", f"{cache_state}:{build_seconds:.1f}s")]
+                return
+
+            record["error"] = err or out[-2000:]
+            state["task_log"] = state.get("task_log", []) + [log_entry("ProductionBuild", "err", record["error"][:200])]
+            if attempt == PROD_BUILD_RETRIES:
+                break
+            state = fixer({**state, "last_error": record["error"], "build_logs": record["build_logs"]})
+            if not state.get("fixer_applied_fixes"):
+                break
+            record["fixes"] += 1
+
+        record["status"] = "failed"
+    except Exception as e:
+        print(f"Background build for {slug} crashed: {e}")
+        record["status"] = "failed"
+        record["error"] = str(e)
+    finally:
+        record["finished"] = time.time()
+        if on_done:
+            try:
+                on_done(status(slug), state)
+            except Exception as e:
+                print(f"Background build callback failed for {slug}: {e}")
@@ -1,59 +1,250 @@
-from langgraph.graph import StateGraph, START
-from .nodes import spec_synthesizer, planner, scaffolder, builder, fixer, preview_deploy, log_entry
+import os
+import time
+import uuid
+from typing import Annotated
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from .nodes import (
+    spec_synthesizer, planner, scaffolder, scaffold_file, scaffold_merge, scaffold_targets,
+    edit_patcher, hot_reload, can_hot_reload, validate, builder, fixer, preview_deploy, preview_ready, log_entry,
+)
 from langsmith import traceable
+from tools import metrics, run_store
+
+# "single": the Scaffolder writes the whole app in one completion (default)
+# "fanout": one ScaffoldFile branch per planned file, joined by ScaffoldMerge
+SCAFFOLD_MODE = os.environ.get("SCAFFOLD_MODE", "single")
+SCAFFOLD_CONCURRENCY = int(os.environ.get("SCAFFOLD_CONCURRENCY", "4"))
+
+# State keys holding per-file maps that parallel branches write into
+MERGED_KEYS = ("scaffold_files", "scaffold_errors")
+
+def merge_state(current: dict, update: dict) -> dict:
+    """
+    Reducer for the graph state. Nodes return the full state, so a shallow merge
+    keeps the usual last-write-wins behaviour; the per-file maps written by the
+    fan-out branches are merged key by key instead.
+    """
+    merged = {**(current or {}), **(update or {})}
+    for key in MERGED_KEYS:
+        if isinstance((current or {}).get(key), dict) and isinstance((update or {}).get(key), dict):
+            merged[key] = {**current[key], **update[key]}
+    return merged
+
+def timed(name: str, fn):
+    """Wrap a node so every run is recorded in the node duration metrics."""
+    def run(state):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = fn(state)
+            status = "ok"
+            return result
+        finally:
+            metrics.observe("node_duration_seconds", time.perf_counter() - start, node=name)
+            metrics.inc("node_runs_total", node=name, status=status)
+    run.__name__ = getattr(fn, "__name__", name)
+    return run
+
+def add_nodes(g, nodes: dict):
+    for name, fn in nodes.items():
+        g.add_node(name, timed(name, fn))
+
+def route_after_planner(state: dict):
+    if SCAFFOLD_MODE != "fanout":
+        return "Scaffolder"
+    targets = scaffold_targets(state.get("plan", []))
+    if not targets:
+        return "Scaffolder"
+    all_files = [t["path"] for t in targets]
+    return [
+        Send("ScaffoldFile", {
+            "path": t["path"],
+            "description": t["description"],
+            "user_prompt": state.get("user_prompt", ""),
+            "spec": state.get("spec", {}),
+            "all_files": all_files,
+        })
+        for t in targets
+    ]
 
 def make_graph():
-    g = StateGraph(dict)
+    g = StateGraph(Annotated[dict, merge_state])
 
-    g.add_node("SpecSynthesizer", spec_synthesizer)
-    g.add_node("Planner", planner)
-    g.add_node("Scaffolder", scaffolder)
-    g.add_node("Builder", builder)
-    g.add_node("Fixer", fixer)
-    g.add_node("PreviewDeploy", preview_deploy)
+    add_nodes(g, {
+        "SpecSynthesizer": spec_synthesizer,
+        "Planner": planner,
+        "Scaffolder": scaffolder,
+        "ScaffoldFile": scaffold_file,
+        "ScaffoldMerge": scaffold_merge,
+        "Validator": validate,
+        "Builder": builder,
+        "Fixer": fixer,
+        "PreviewDeploy": preview_deploy,
+    })
 
     g.add_edge(START, "SpecSynthesizer")
     g.add_edge("SpecSynthesizer", "Planner")
-    g.add_edge("Planner", "Scaffolder")
-    g.add_edge("Scaffolder", "Builder")
+    # Planner -> Scaffolder, or fan out to one ScaffoldFile branch per file
+    g.add_conditional_edges("Planner", route_after_planner, ["Scaffolder", "ScaffoldFile"])
+    g.add_edge("ScaffoldFile", "ScaffoldMerge")
+    g.add_edge("Scaffolder", "Validator")
+    g.add_edge("ScaffoldMerge", "Validator")
+    g.add_conditional_edges("Validator", after_validation(lambda state: "Builder"), ["Fixer", "Builder"])
+    add_build_edges(g)
+    return compile_graph(g)
+
+def make_edit_graph():
+    """
+    Graph for edits of an existing workspace: one EditPatcher call that rewrites
+    only the affected files, validation, then a hot reload into the running dev
+    server (or the Builder when that is not possible) and the usual Fixer loop.
+    PreviewDeploy only reports the URL of the running preview, so an edit
+    costs a single LLM call when nothing needs fixing.
+    """
+    g = StateGraph(Annotated[dict, merge_state])
+
+    add_nodes(g, {
+        "EditPatcher": edit_patcher,
+        "Validator": validate,
+        "HotReload": hot_reload,
+        "Builder": builder,
+        "Fixer": fixer,
+        "PreviewDeploy": preview_ready,
+    })
+
+    # Edits go into the running dev server when possible; otherwise rebuild and restart it
+    reload_or_build = lambda state: "HotReload" if can_hot_reload(state) else "Builder"
+
+    g.add_edge(START, "EditPatcher")
+    g.add_edge("EditPatcher", "Validator")
+    g.add_conditional_edges("Validator", after_validation(reload_or_build), ["Fixer", "HotReload", "Builder"])
+    g.add_conditional_edges(
+        "HotReload",
+        lambda state: "Fixer" if state.get("last_error") else "PreviewDeploy"
+    )
+    add_build_edges(g, fallback=reload_or_build)
+    return compile_graph(g)
+
+def after_validation(next_step):
+    """Validation errors go to the Fixer; a clean workspace continues to next_step(state)."""
+    return lambda state: "Fixer" if state.get("validation_errors") else next_step(state)
+
+def should_retry(state):
+    """After the Fixer: rebuild when it changed files and the retry budget is not used up."""
+    max_retries = 3
+    current_retries = state.get("build_retry_count", 0)
+    fixer_made_changes = state.get("fixer_applied_fixes", False)
+    build_successful = state.get("run_url") is not None
     
-    def should_retry(state):
-        max_retries = 3
-        current_retries = state.get("build_retry_count", 0)
-        fixer_made_changes = state.get("fixer_applied_fixes", False)
-        build_successful = state.get("run_url") is not None
-        
-        print(f"should_retry: retries={current_retries}/{max_retries}, fixer_made_changes={fixer_made_changes}, build_successful={build_successful}")
-        
-        return fixer_made_changes and not build_successful and current_retries < max_retries
+    print(f"should_retry: retries={current_retries}/{max_retries}, fixer_made_changes={fixer_made_changes}, build_successful={build_successful}")
+    
+    return fixer_made_changes and not build_successful and current_retries < max_retries
 
+def add_build_edges(g, fallback=lambda state: "Builder"):
+    """
+    Builder -> Fixer -> Validator retry loop shared by both graphs. Validation
+    is only a shortcut: if the Fixer could not fix validation errors, the real
+    build step picked by `fallback` still runs.
+    """
     # After Builder: if there's an error OR no run_url (build not successful) -> go to Fixer
     g.add_conditional_edges(
         "Builder",
-        lambda state: "Fixer" if state.get("last_error") or not state.get("run_url") else "PreviewDeploy"
+        lambda state: END if state.get("cancelled")
+        else "Fixer" if state.get("last_error") or not state.get("run_url")
+        else "PreviewDeploy"
     )
     
-    # After Fixer: if should_retry conditions are met -> go to Builder, else -> PreviewDeploy
+    # After Fixer: if should_retry conditions are met -> re-validate, else -> PreviewDeploy
     g.add_conditional_edges(
         "Fixer",
-        lambda state: "Builder" if should_retry(state) else "PreviewDeploy"
+        lambda state: "Validator" if should_retry(state)
+        else fallback(state) if state.get("fixing_validation")
+        else "PreviewDeploy"
     )
 
-    return g.compile()
+_graphs = {}
+
+def get_graph(kind: str = "build"):
+    if kind not in _graphs:
+        _graphs[kind] = make_edit_graph() if kind == "edit" else make_graph()
+    return _graphs[kind]
+
+def compile_graph(g):
+    # Every node's output is checkpointed per thread_id, so a run can be resumed
+    return g.compile(checkpointer=run_store.checkpointer())
+
+# Nodes a finished-but-failed run is resumed at: the build step, after the
+# LLM-generated workspace is in place
+RESUME_NODES = ("Builder", "HotReload")
 
-_graph = None
+def resume_config(kind: str, thread_id: str):
+    """
+    Find where to resume the run checkpointed under thread_id.
+    A run that was interrupted (crash, reload) continues with its pending nodes;
+    a run that finished with an error goes back to the checkpoint before its
+    last build step, with the retry budget and error cleared.
+    Returns the config to stream from, or None if there is nothing to resume.
+    """
+    g = get_graph(kind)
+    config = {"configurable": {"thread_id": thread_id}}
+    snapshot = g.get_state(config)
+    if not snapshot.values:
+        return None
+    if snapshot.next:
+        return config
+    for past in g.get_state_history(config):  # newest first
+        if any(node in past.next for node in RESUME_NODES):
+            return g.update_state(past.config, {"build_retry_count": 0, "last_error": None, "cancelled": False})
+    return None
 
-def get_graph():
-    global _graph
-    if _graph is None:
-        _graph = make_graph()
-    return _graph
+def graph_kind(state: dict) -> str:
+    """Edits of a workspace that still exists take the edit graph; anything else is a full build."""
+    repo_path = state.get("repo_path")
+    if state.get("edit_mode") and repo_path and os.path.isfile(os.path.join(repo_path, "package.json")):
+        return "edit"
+    return "build"
 
 @traceable
-def run_graph(initial_state: dict) -> dict:
-    g = get_graph()
+def run_graph(initial_state: dict, on_event=None, thread_id: str = None, kind: str = None, resume: bool = False) -> dict:
+    """
+    Run the pipeline with graph.stream so progress is visible while it runs.
+    `on_event` is called with a {"type": "node", "node", "entry"} event for every
+    task_log entry a node appends, as soon as that node completes.
+    Checkpoints are written under thread_id; with resume=True the run
+    checkpointed there is continued (see resume_config) instead of starting over.
+    """
+    kind = kind or graph_kind(initial_state)
+    thread_id = thread_id or f"{initial_state.get('slug')}-{uuid.uuid4().hex[:8]}"
+    print(f"run_graph: using the {kind} graph, thread {thread_id}{' (resume)' if resume else ''}")
+    g = get_graph(kind)
+    state = dict(initial_state)
+    graph_input = initial_state
+    # max_concurrency bounds the parallel ScaffoldFile branches
+    config = {"max_concurrency": SCAFFOLD_CONCURRENCY, "configurable": {"thread_id": thread_id}}
     try:
-        out = g.invoke(initial_state)
+        if resume:
+            resume_at = resume_config(kind, thread_id)
+            if resume_at is None:
+                raise ValueError(f"No checkpoint to resume for thread {thread_id}")
+            config["configurable"] = resume_at["configurable"]
+            state = {**state, **g.get_state(resume_at).values}
+            graph_input = None
+        seen = len(state.get("task_log", []))
+        for update in g.stream(graph_input, config=config, stream_mode="updates"):
+            for node_name, output in update.items():
+                if not isinstance(output, dict):
+                    continue
+                state = merge_state(state, output)
+                entries = state.get("task_log", [])
+                new_entries, seen = entries[seen:], len(entries)
+                if on_event:
+                    for entry in new_entries:
+                        try:
+                            on_event({"type": "node", "node": node_name, "entry": entry})
+                        except Exception as cb_error:
+                            print(f"run_graph: event callback failed: {cb_error}")
+        out = state
 
         print("FINAL STATE KEYS:", list(out.keys()))
         print("repo_path:", out.get("repo_path"))
@@ -65,6 +256,9 @@ def run_graph(initial_state: dict) -> dict:
         return out
     except Exception as e:
         print(f"Graph execution failed: {e}")
-        initial_state["task_log"] = initial_state.get("task_log", []) + [log_entry("Graph", "err", str(e))]
+        entry = log_entry("Graph", "err", str(e))
+        if on_event:
+            on_event({"type": "node", "node": "Graph", "entry": entry})
+        initial_state["task_log"] = state.get("task_log", []) + [entry]
         initial_state["last_error"] = str(e)
-        return initial_state
\ No newline at end of file
+        return initial_state
@@ -1,11 +1,13 @@
 import os
 import json
+import re
 import shutil
 from typing import Any, Dict
 from datetime import datetime
 from pathlib import Path
-from tools import repo_tool, shell_tool, zip_tool
-from tools.error_parser import parse_json_response  # Import the new parser tool
+from tools import repo_tool, shell_tool, zip_tool, port_tool, dep_store, build_cache, llm_cache, validator, readiness, preview_supervisor, metrics, workspace_pool
+from tools.file_stream import FileMapStreamParser
+from tools.error_parser import parse_json_response, parse_json_with_path, dev_log_status, analyze_build_log
 from openai import OpenAI
 import time
 import httpx
@@ -23,23 +25,249 @@ else:
 
 TEMPLATE_DIR = str(Path(__file__).resolve().parents[1] / "templates" / "next-basic")
 
+FALLBACK_FILE_MAP = {
+    "pages/index.js": "import Head from 'next/head';\n\nexport default function Home() {\n  return (\n    <div className=\"min-h-screen bg-gray-100 p-6\">\n      <Head>\n        <title>Default Dashboard</title>\n      </Head>\n      <main>\n        <h1 className=\"text-2xl font-bold\">Default Content</h1>\n      </main>\n    </div>\n  );\n}",
+    "package.json": '{\n  "name": "crm-dashboard",\n  "version": "0.1.0",\n  "private": true,\n  "scripts": {\n    "dev": "next dev -p 3000",\n    "build": "next build",\n    "start": "next start -p 3000"\n  },\n  "dependencies": {\n    "next": "^15.5.3",\n    "react": "^19.1.1",\n    "react-dom": "^19.1.1"\n  },\n  "devDependencies": {\n    "tailwindcss": "^3.4.10",\n    "autoprefixer": "^10.4.20",\n    "postcss": "^8.4.41"\n  }\n}',
+    "tailwind.config.js": 'module.exports = {\n  content: [\n    "./pages/**/*.{js,ts,jsx,tsx}",\n    "./components/**/*.{js,ts,jsx,tsx}",\n    "./app/**/*.{js,ts,jsx,tsx}"\n  ],\n  theme: { \n    extend: {} \n  },\n  plugins: [],\n};',
+    "styles/globals.css": "@tailwind base;\n@tailwind components;\n@tailwind utilities;"
+}
+
+# Fan-out scaffolding (SCAFFOLD_MODE=fanout): one generation branch per planned file
+SCAFFOLD_MAX_FILES = int(os.environ.get("SCAFFOLD_MAX_FILES", "12"))
+SCAFFOLD_FILE_MAX_TOKENS = int(os.environ.get("SCAFFOLD_FILE_MAX_TOKENS", "2048"))
+SCAFFOLD_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".css", ".json")
+
+# Edits: how many of the workspace's files (and how much of each) are sent to the model
+EDIT_MAX_FILES = int(os.environ.get("EDIT_MAX_FILES", "6"))
+EDIT_MAX_FILE_CHARS = int(os.environ.get("EDIT_MAX_FILE_CHARS", "12000"))
+EDIT_EXTENSIONS = SCAFFOLD_EXTENSIONS + (".mjs", ".cjs")
+EDIT_SKIP_FILES = ("package-lock.json",)
+
+# Edits are hot-reloaded into the slug's running dev server instead of rebuilding it,
+# unless they touch files that need a restart
+HOT_RELOAD = os.environ.get("HOT_RELOAD", "1") == "1"
+HOT_RELOAD_TIMEOUT = float(os.environ.get("HOT_RELOAD_TIMEOUT", "30"))
+RESTART_FILES = ("package.json", "next.config.js", "next.config.mjs", "next.config.ts", ".env", ".env.local")
+
+# Fixer context: files up to FIXER_FULL_FILE_LINES are sent whole, longer ones as a
+# window of FIXER_CONTEXT_LINES around the reported line
+FIXER_MAX_FILES = int(os.environ.get("FIXER_MAX_FILES", "4"))
+FIXER_FULL_FILE_LINES = int(os.environ.get("FIXER_FULL_FILE_LINES", "150"))
+FIXER_CONTEXT_LINES = int(os.environ.get("FIXER_CONTEXT_LINES", "25"))
+
+# Install/build phases: full output goes to BUILD_LOG_DIR/<slug>/<phase>.log, the state keeps tails
+BUILD_LOG_DIR = os.path.abspath(os.environ.get("BUILD_LOG_DIR", os.path.join("work", ".logs")))
+NPM_INSTALL_TIMEOUT = float(os.environ.get("NPM_INSTALL_TIMEOUT", "600"))
+NPM_BUILD_TIMEOUT = float(os.environ.get("NPM_BUILD_TIMEOUT", "600"))
+
+# Stream Scaffolder/Fixer completions and write each file as soon as it is complete
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "1") == "1"
+STREAMED_NODES = ("Scaffolder", "Fixer")
+# Ask streamed completions for token usage (stream_options.include_usage); turn
+# off for OpenAI-compatible servers that reject the option
+LLM_STREAM_USAGE = os.environ.get("LLM_STREAM_USAGE", "1") == "1"
+
+# "build": npm run build, then start the dev server (default)
+# "fast":  start the dev server right after install; the production build runs in the background
+# "lazy":  start the dev server right after install; the production build runs on /export
+PREVIEW_MODE = os.environ.get("PREVIEW_MODE", "build")
+
 def now_ts():
     return datetime.utcnow().isoformat() + "Z"
 
 def log_entry(name: str, status: str, note: str = "") -> Dict[str, Any]:
     return {"node": name, "when": now_ts(), "status": status, "note": note}
 
-def call_openai(name: str, messages, max_tokens=4096, temperature=0.2):  # Increased default max_tokens
+def call_openai(name: str, messages, max_tokens=4096, temperature=0.2, use_cache=True, on_delta=None):  # Increased default max_tokens
+    """
+    Call the chat completions API and return the reply text. With `on_delta`,
+    the reply is streamed and on_delta(text) is called for every piece as it arrives.
+    """
+    # Identical prompts are served from the LLM cache (opt out per call or via LLM_CACHE_DISABLED_NODES)
+    cache_key, cached = llm_cache.lookup(OPENAI_MODEL, messages, temperature, max_tokens, node=name) if use_cache else (None, None)
+    if cached is not None:
+        print(f"Cached {name} response: {cached}")  # Debug
+        metrics.inc("llm_requests_total", node=name, source="cache")
+        if on_delta:
+            on_delta(cached)
+        return cached
     if not client:
         raise RuntimeError("OPENAI_API_KEY not set in environment")
-    response = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=messages,
-        max_tokens=max_tokens,
-        temperature=temperature
-    )
-    print(f"Raw {name} response: {response.choices[0].message.content}")  # Debug
-    return response.choices[0].message.content
+    start = time.perf_counter()
+    try:
+        if on_delta is None:
+            response = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            content = response.choices[0].message.content
+            usage = response.usage
+        else:
+            stream = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                # The final chunk then carries the token usage
+                **({"stream_options": {"include_usage": True}} if LLM_STREAM_USAGE else {})
+            )
+            parts = []
+            usage = None
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        metrics.observe("llm_first_token_seconds", time.perf_counter() - start, node=name)
+                    parts.append(delta)
+                    on_delta(delta)
+            content = "".join(parts)
+    except Exception:
+        metrics.inc("llm_requests_total", node=name, source="error")
+        raise
+    metrics.record_llm(name, time.perf_counter() - start, usage)
+    print(f"Raw {name} response: {content}")  # Debug
+    llm_cache.store(cache_key, content)
+    return content
+
+def is_safe_rel_path(rel_path: str) -> bool:
+    """Reject model-provided paths that would escape the workspace."""
+    return bool(rel_path) and not os.path.isabs(rel_path) and ".." not in Path(rel_path).parts
+
+def stream_file_writer(name: str, repo_path: str, written: list, originals: dict = None):
+    """
+    Build an on_delta callback that writes each file of a streamed
+    {"output": {path: content}} reply into repo_path as soon as it is complete.
+    A finished package.json starts the dependency install in the background.
+    With `originals`, the content each file had before it was first
+    overwritten is recorded there ("" for new files).
+    """
+    parser = FileMapStreamParser()
+
+    def on_delta(text):
+        for rel_path, content in parser.feed(text):
+            # Diffs (Fixer) are applied once the whole reply is in
+            if not is_safe_rel_path(rel_path) or repo_tool.looks_like_diff(content):
+                continue
+            target = os.path.join(repo_path, rel_path)
+            if originals is not None and rel_path not in originals:
+                originals[rel_path] = repo_tool.read_file(target) if os.path.isfile(target) else ""
+            repo_tool.write_file(target, content)
+            written.append(rel_path)
+            print(f"{name}: streamed {rel_path} ({len(content)} chars)")
+            if rel_path == "package.json":
+                dep_store.prefetch(repo_path, lambda: shell_tool.run_command(["npm", "install"], cwd=repo_path, name="install"))
+
+    return on_delta
+
+def prepare_workspace(state: dict):
+    """
+    Create the slug's workspace from the template, stopping only this slug's own
+    dev server and keeping its compiler cache.
+    Returns (slug, repo_path, workspace_stats).
+    """
+    start = time.time()
+    slug = state.get("slug") or f"app-{int(time.time())}"
+    repo_path = state.get("repo_path") or repo_tool.create_work_dir("work", slug)
+    os.makedirs(repo_path, exist_ok=True)
+
+    cache_stash = None
+    # Clean the workspace before template copy. Only this slug's own
+    # dev server is stopped; other previews keep running.
+    if os.path.exists(repo_path):
+        print(f"Scaffolder: Repo path exists, cleaning up: {repo_path}")
+        try:
+            if not preview_supervisor.stop(slug, reason="workspace reset") and shell_tool.is_running(state.get("pid")):
+                shell_tool.stop_pid(state["pid"])
+            cache_stash = build_cache.stash(repo_path)
+            shutil.rmtree(repo_path, ignore_errors=True)
+        except Exception as cleanup_error:
+            print(f"Scaffolder: Cleanup error (continuing): {cleanup_error}")
+
+    # Copy template first, but only if repo doesn't exist yet. A pooled
+    # workspace already has the template, its dependencies and a warm cache.
+    workspace_stats = {"source": "existing"}
+    if not os.path.exists(os.path.join(repo_path, "package.json")):
+        if workspace_pool.claim(repo_path):
+            print(f"Scaffolder: Using a pre-provisioned workspace for {repo_path}")
+            workspace_stats = {"source": "pool"}
+        else:
+            # Links unchanged template files and copies only the ones that get written
+            workspace_stats = {"source": "template", **repo_tool.materialize_template(TEMPLATE_DIR, repo_path)}
+            print(f"Scaffolder: Materialized template into {repo_path}: {workspace_stats}")
+            metrics.inc("template_bytes_copied_total", workspace_stats["bytes_copied"])
+    else:
+        print(f"Scaffolder: Template already exists, skipping copy")
+    build_cache.restore(cache_stash, repo_path)
+    workspace_stats["seconds"] = round(time.time() - start, 4)
+    metrics.observe("workspace_setup_seconds", workspace_stats["seconds"], source=workspace_stats["source"])
+    return slug, repo_path, workspace_stats
+
+def materialize_scaffold(name: str, state: dict, file_map: dict, task_log: list) -> dict:
+    """
+    Set up the workspace from the template and write the generated files into it.
+    Shared by the Scaffolder and the fan-out ScaffoldMerge node.
+    """
+    # Ensure file_map is a dictionary and has expected keys
+    if not isinstance(file_map, dict) or len(file_map) == 0:
+        print(f"Scaffolder: Invalid or empty file_map, using fallback")
+        # Use correct fallback with proper package.json and tailwind setup
+        file_map = dict(FALLBACK_FILE_MAP)
+    
+    print(f"Scaffolder: Processed file_map with {len(file_map)} files: {list(file_map.keys())}")
+    
+    slug = state.get("slug") or f"app-{int(time.time())}"
+    repo_path = state.get("repo_path")
+    try:
+        # A streamed Scaffolder run has already set up the workspace (and written files into it)
+        workspace_stats = state.get("workspace_stats")
+        if not state.get("workspace_prepared") or not repo_path:
+            slug, repo_path, workspace_stats = prepare_workspace(state)
+        
+        diffs = state.get("file_diffs", [])
+        applied = 0
+        
+        # Write custom files AFTER template copy
+        for rel_path, content in file_map.items():
+            if isinstance(content, (dict, list)):
+                content = json.dumps(content, indent=2)
+            if not isinstance(content, str) or not is_safe_rel_path(rel_path):
+                continue
+            target_full = os.path.join(repo_path, rel_path)
+            if os.path.isfile(target_full) and repo_tool.read_file(target_full) == content:
+                # Already written while the reply was streaming
+                diffs.append(f"Updated {rel_path}")
+                applied += 1
+                continue
+            print(f"Scaffolder: Writing {len(content)} chars to {target_full}")
+            os.makedirs(os.path.dirname(target_full), exist_ok=True)
+            repo_tool.write_file(target_full, content)
+            diffs.append(f"Updated {rel_path}")
+            applied += 1
+            print(f"Scaffolder: Successfully wrote {rel_path}")
+        
+        print(f"Scaffolder: Applied {applied} file changes")
+        updates = {
+            "repo_path": repo_path,
+            "slug": slug,
+            "file_diffs": diffs,
+            "task_log": task_log,
+            "workspace_prepared": False,
+            "workspace_stats": workspace_stats,
+            "intent_details": state.get("user_prompt", "Minimal Next.js dashboard")
+        }
+    except Exception as e:
+        print(f"Scaffolder error: {e}")
+        task_log.append(log_entry(name, "err", f"Failed to scaffold: {str(e)}"))
+        updates = {"repo_path": repo_path, "slug": slug, "task_log": task_log, "workspace_prepared": False}
+
+    return updates
 
 @traceable
 def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, state: dict) -> dict:
@@ -49,11 +277,24 @@ def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, sta
         # Adjust max_tokens for Scaffolder to allow larger responses
         max_tokens = 4096 if name == "Scaffolder" else 1200
         
-        reasoning = call_openai(name, messages, max_tokens=max_tokens, temperature=0.2)
+        on_delta = None
+        streamed = []
+        originals = {}  # file contents before streaming overwrote them
+        if LLM_STREAMING and name in STREAMED_NODES:
+            if name == "Scaffolder":
+                # Set the workspace up first so files can be written while the reply streams in
+                slug, repo_path, workspace_stats = prepare_workspace(state)
+                state = {**state, "slug": slug, "repo_path": repo_path, "workspace_prepared": True, "workspace_stats": workspace_stats}
+            if state.get("repo_path") and (name == "Scaffolder" or state.get("last_error")):
+                on_delta = stream_file_writer(name, state["repo_path"], streamed, originals)
+
+        reasoning = call_openai(name, messages, max_tokens=max_tokens, temperature=0.2, on_delta=on_delta)
+        if streamed:
+            print(f"{name}: {len(streamed)} files written while streaming: {streamed}")
         
-        # Use the LLM parser to clean and extract the action dict
-        action = parse_json_response(reasoning)
-        print(f"Parsed action: {action}")  # Enhanced debugging
+        # Parse locally first; the LLM repair is only the last resort
+        action, parse_path = parse_json_with_path(reasoning)
+        print(f"Parsed action ({parse_path}): {action}")  # Enhanced debugging
         if not isinstance(action, dict):
             action = {"output": {}}
 
@@ -70,6 +311,8 @@ def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, sta
 
         updates = {}
         task_log = state.get("task_log", []) + [log_entry(name, "ok", reasoning[:200])]
+        # Record which parse path each node needed, so the LLM fallback rate is visible per run
+        state = {**state, "parse_paths": {**state.get("parse_paths", {}), name: parse_path}}
 
         if name == "SpecSynthesizer":
             spec = action.get("output", {})
@@ -105,69 +348,7 @@ def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, sta
             # Debug after extraction
             print(f"Scaffolder: Initial file_map after extraction: {file_map}")
             
-            # Ensure file_map is a dictionary and has expected keys
-            if not isinstance(file_map, dict) or len(file_map) == 0:
-                print(f"Scaffolder: Invalid or empty file_map, using fallback")
-                # Use correct fallback with proper package.json and tailwind setup
-                file_map = {
-                    "pages/index.js": "import Head from 'next/head';\n\nexport default function Home() {\n  return (\n    <div className=\"min-h-screen bg-gray-100 p-6\">\n      <Head>\n        <title>Default Dashboard</title>\n      </Head>\n      <main>\n        <h1 className=\"text-2xl font-bold\">Default Content</h1>\n      </main>\n    </div>\n  );\n}",
-                    "package.json": '{\n  "name": "crm-dashboard",\n  "version": "0.1.0",\n  "private": true,\n  "scripts": {\n    "dev": "next dev -p 3000",\n    "build": "next build",\n    "start": "next start -p 3000"\n  },\n  "dependencies": {\n    "next": "^15.5.3",\n    "react": "^19.1.1",\n    "react-dom": "^19.1.1"\n  },\n  "devDependencies": {\n    "tailwindcss": "^3.4.10",\n    "autoprefixer": "^10.4.20",\n    "postcss": "^8.4.41"\n  }\n}',
-                    "tailwind.config.js": 'module.exports = {\n  content: [\n    "./pages/**/*.{js,ts,jsx,tsx}",\n    "./components/**/*.{js,ts,jsx,tsx}",\n    "./app/**/*.{js,ts,jsx,tsx}"\n  ],\n  theme: { \n    extend: {} \n  },\n  plugins: [],\n};',
-                    "styles/globals.css": "@tailwind base;\n@tailwind components;\n@tailwind utilities;"
-                }
-            
-            print(f"Scaffolder: Processed file_map with {len(file_map)} files: {list(file_map.keys())}")
-            
-            slug = state.get("slug") or f"app-{int(time.time())}"
-            repo_path = state.get("repo_path") or repo_tool.create_work_dir("work", slug)
-            os.makedirs(repo_path, exist_ok=True)
-
-            try:
-                # More aggressive cleanup before template copy
-                if os.path.exists(repo_path):
-                    print(f"Scaffolder: Repo path exists, cleaning up: {repo_path}")
-                    try:
-                        import subprocess
-                        subprocess.run(['taskkill', '/f', '/t', '/im', 'node.exe'], 
-                                     capture_output=True, shell=True)
-                        time.sleep(2)  # Wait for processes to die
-                        shutil.rmtree(repo_path, ignore_errors=True)
-                        time.sleep(1)  # Wait for cleanup
-                    except Exception as cleanup_error:
-                        print(f"Scaffolder: Cleanup error (continuing): {cleanup_error}")
-                
-                # Copy template first, but only if repo doesn't exist yet
-                if not os.path.exists(os.path.join(repo_path, "package.json")):
-                    print(f"Scaffolder: Copying template from {TEMPLATE_DIR} to {repo_path}")
-                    repo_tool.copy_template(TEMPLATE_DIR, repo_path)
-                else:
-                    print(f"Scaffolder: Template already exists, skipping copy")
-                
-                diffs = state.get("file_diffs", [])
-                applied = 0
-                
-                # Write custom files AFTER template copy
-                for rel_path, content in file_map.items():
-                    target_full = os.path.join(repo_path, rel_path)
-                    print(f"Scaffolder: Writing {len(content)} chars to {target_full}")
-                    os.makedirs(os.path.dirname(target_full), exist_ok=True)
-                    repo_tool.write_file(target_full, content)
-                    diffs.append(f"Updated {rel_path}")
-                    applied += 1
-                    print(f"Scaffolder: Successfully wrote {rel_path}")
-                
-                print(f"Scaffolder: Applied {applied} file changes")
-                updates = {
-                    "repo_path": repo_path,
-                    "slug": slug,
-                    "file_diffs": diffs,
-                    "task_log": task_log,
-                    "intent_details": state.get("user_prompt", "Minimal Next.js dashboard")
-                }
-            except Exception as e:
-                print(f"Scaffolder error: {e}")
-                task_log.append(log_entry(name, "err", f"Failed to scaffold: {str(e)}"))
-                updates = {"repo_path": repo_path, "slug": slug, "task_log": task_log}
+            updates = materialize_scaffold(name, state, file_map, task_log)
 
         elif name == "Builder":
             repo_path = state.get("repo_path")
@@ -175,39 +356,67 @@ def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, sta
                 return {**state, "last_error": "Invalid repo_path", "task_log": task_log + [log_entry(name, "err", "repo_path not set or invalid")]}
 
             build_logs = ""
-            next_cache = os.path.join(repo_path, ".next")
-            if os.path.exists(next_cache):
-                shutil.rmtree(next_cache)
-                print(f"Cleared Next.js cache at {next_cache}")
-
-            code, out, err = shell_tool.run_command(["npm", "install"], cwd=repo_path)
-            build_logs += "\n=== npm install ===\n" + out + "\n" + err
-            print(f"Builder: npm install - code={code}, out={out}, err={err}")
+            slug = state.get("slug") or os.path.basename(repo_path)
+            phases = []
+
+            def stopped(result):
+                # A cancelled phase ends the run instead of going to the Fixer
+                note = f"{result['name']} {result['status']} after {result['seconds']:.1f}s"
+                updates = {"last_error": note, "build_logs": build_logs, "build_phases": phases, "run_url": None,
+                           "cancelled": result["status"] == "cancelled"}
+                return {**state, **updates, "task_log": task_log + [log_entry(name, "err", note)]}
+
+            # Reuses node_modules when package.json dependencies are unchanged or already in the store
+            install_start = time.time()
+            code, out, err, dep_source = dep_store.ensure_installed(
+                repo_path, lambda: run_build_phase(phases, "install", ["npm", "install"], repo_path, slug, NPM_INSTALL_TIMEOUT)
+            )
+            if dep_source != "install":
+                phases.append({"name": "install", "status": "ok", "exit_code": 0, "seconds": round(time.time() - install_start, 2), "source": dep_source})
+            build_logs += f"\n=== npm install ({dep_source}) ===\n" + out + "\n" + err
+            print(f"Builder: npm install ({dep_source}) - code={code}")
+            if phases and phases[-1]["status"] == "cancelled":
+                return stopped(phases[-1])
             if code != 0:
-                return {**state, "last_error": err, "build_logs": build_logs, "task_log": task_log + [log_entry(name, "err", f"npm install failed: {err}")]}
+                return {**state, "last_error": err or out, "build_logs": build_logs, "build_phases": phases, "task_log": task_log + [log_entry(name, "err", f"npm install failed: {err}")]}
+
+            if PREVIEW_MODE == "build":
+                # Keep .next/cache between builds of this slug unless the toolchain or config changed
+                cache_state = build_cache.prepare(repo_path)
+                code2, out2, err2 = run_build_phase(phases, "build", ["npm", "run", "build"], repo_path, slug, NPM_BUILD_TIMEOUT)
+                build_seconds = phases[-1]["seconds"]
+                build_logs += f"\n=== npm run build ({cache_state} cache, {build_seconds:.1f}s) ===\n" + out2 + "\n" + err2
+                print(f"Builder: npm run build ({cache_state}) - code={code2} in {build_seconds:.1f}s")
+                if phases[-1]["status"] == "cancelled":
+                    return stopped(phases[-1])
+                if code2 == 0:
+                    build_cache.record(slug, cache_state, build_seconds)
+                if code2 != 0:
+                    return {**state, "last_error": err2 or out2, "build_logs": build_logs, "build_phases": phases, "task_log": task_log + [log_entry(name, "err", f"build failed: {err2}")]}
+                prod_build = "done"
+            else:
+                # Serve the preview straight away; the production build happens later
+                cache_state, build_seconds = "deferred", 0.0
+                prod_build = "pending" if PREVIEW_MODE == "fast" else "on_export"
 
-            code2, out2, err2 = shell_tool.run_command(["npm", "run", "build"], cwd=repo_path)
-            build_logs += "\n=== npm run build ===\n" + out2 + "\n" + err2
-            print(f"Builder: npm run build - code={code2}, out={out2}, err={err2}")
-            if code2 != 0:
-                return {**state, "last_error": err2, "build_logs": build_logs, "task_log": task_log + [log_entry(name, "err", f"build failed: {err2}")]}
+            # Each slug gets its own port so several previews can run side by side
+            port = port_tool.lease(slug)
+            run_url = port_tool.preview_url(port)
+            if not preview_supervisor.is_live(slug) and shell_tool.is_running(state.get("pid")):
+                shell_tool.stop_pid(state["pid"])
 
             logfile_path = os.path.join(repo_path, "dev_server.log")
-            pid = shell_tool.start_dev_server(repo_path, logfile_path)
-
-            def check():
-                try:
-                    r = httpx.get("http://localhost:3000/api/health", timeout=1.0)
-                    print(f"Health check response: status={r.status_code}, text={r.text}")
-                    return r.status_code == 200
-                except Exception as e:
-                    print(f"Health check failed: {e}")
-                    return False
-
-            healthy = shell_tool.wait_for_url_check(check, timeout=30)
+            log_start = readiness.log_offset(logfile_path)
+            # The supervisor replaces this slug's previous server and enforces the live-preview cap
+            pid = preview_supervisor.start(slug, repo_path, port, logfile_path)
+
+            # Ready when the log says so or the port answers; fails fast if the process exits
+            ready = readiness.wait_ready(pid, logfile_path, run_url, offset=log_start, slug=slug,
+                                         is_alive=lambda: preview_supervisor.is_live(slug))
+            healthy = ready["ready"]
             status = "ok" if healthy else "err"
-            note = f"pid={pid} healthy={healthy}"
-            last_error = None if healthy else "Dev server not responding within timeout."
+            note = f"pid={pid} port={port} ready={healthy} via={ready['via']} in {ready['seconds']}s deps={dep_source} build={cache_state}:{build_seconds:.1f}s"
+            last_error = None if healthy else f"Dev server not ready: {ready['reason']}"
             
             # Track retry count
             retry_count = state.get("build_retry_count", 0)
@@ -216,9 +425,14 @@ def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, sta
                 
             updates = {
                 "repo_path": repo_path,
-                "run_url": "http://localhost:3000" if healthy else None,
+                "run_url": run_url if healthy else None,
                 "pid": pid,
+                "port": port,
                 "build_logs": build_logs,
+                "build_timing": {"cache": cache_state, "seconds": round(build_seconds, 2)},
+                "build_phases": phases,
+                "time_to_ready": ready["seconds"],
+                "prod_build": prod_build,
                 "last_error": last_error,
                 "build_retry_count": retry_count,
                 "task_log": task_log + [log_entry(name, status, note)]
@@ -247,23 +461,41 @@ def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, sta
             repo_path = state.get("repo_path", "")
             applied = 0
             diffs = state.get("file_diffs", [])
+            patches = state.get("fix_patches", [])
+            counts = {"patched": 0, "rewritten": 0, "failed": 0}
+            deps_changed = False
             
-            # Handle the case where content might not be a string (like dict objects from bad LLM responses)
+            # Values are unified diffs against the current file, or complete content
+            # (new files, package.json, and dict objects from bad LLM responses)
             for rel_path, content in file_map.items():
-                if isinstance(content, str):
-                    target_full = os.path.join(repo_path, rel_path)
-                    os.makedirs(os.path.dirname(target_full), exist_ok=True)
-                    repo_tool.write_file(target_full, content)
-                    diffs.append(f"Fixed {rel_path}")
-                    applied += 1
-                elif isinstance(content, dict):
-                    # Convert dict to JSON string for package.json files
-                    target_full = os.path.join(repo_path, rel_path)
-                    os.makedirs(os.path.dirname(target_full), exist_ok=True)
-                    json_content = json.dumps(content, indent=2)
-                    repo_tool.write_file(target_full, json_content)
-                    diffs.append(f"Fixed {rel_path}")
-                    applied += 1
+                if isinstance(content, (dict, list)):
+                    content = json.dumps(content, indent=2)
+                if not isinstance(content, str) or not is_safe_rel_path(rel_path):
+                    continue
+                target_full = os.path.join(repo_path, rel_path)
+                if rel_path in originals:
+                    # Already written while the reply was streaming: compare with the file as it was before
+                    current = originals[rel_path]
+                else:
+                    current = repo_tool.read_file(target_full) if os.path.isfile(target_full) else ""
+                if repo_tool.looks_like_diff(content):
+                    try:
+                        new_content = repo_tool.apply_unified_diff(current, content)
+                        counts["patched"] += 1
+                    except ValueError as patch_error:
+                        print(f"Fixer: could not apply diff to {rel_path}: {patch_error}")
+                        counts["failed"] += 1
+                        continue
+                else:
+                    new_content = content
+                    counts["rewritten"] += 1
+                if new_content == current:
+                    continue
+                repo_tool.write_file_atomic(target_full, new_content)
+                patches.append(repo_tool.make_unified_diff(current, new_content, rel_path))
+                diffs.append(f"Fixed {rel_path}")
+                applied += 1
+                deps_changed = deps_changed or os.path.basename(rel_path) == "package.json"
             
             # Track if we actually fixed something
             fixer_made_changes = applied > 0
@@ -277,7 +509,9 @@ def agent_node(name: str, system_prompt: str, user_prompt: str, tools: dict, sta
                 "previous_error": previous_error,
                 "fixer_applied_fixes": fixer_made_changes,
                 "build_retry_count": build_retry_count,
-                "task_log": task_log + [log_entry(name, "ok" if applied > 0 else "noop", f"fixed_files={applied}")]
+                "fix_patches": patches[-20:],
+                "task_log": task_log + [log_entry(name, "ok" if applied > 0 else "noop",
+                                                  f"fixed_files={applied} patched={counts['patched']} rewritten={counts['rewritten']} failed={counts['failed']} scope={'deps' if deps_changed else 'code'}")]
             }
 
         elif name == "PreviewDeploy":
@@ -374,6 +608,292 @@ Generate the necessary files with proper Tailwind setup.
     
     return agent_node("Scaffolder", system_prompt, user_prompt, tools, state)
 
+def scaffold_targets(plan) -> list:
+    """
+    Collect the files named in the Planner's tasks, with the descriptions of the
+    tasks that touch each file. Returns [{"path", "description"}], in plan order.
+    """
+    targets = {}
+    for task in plan if isinstance(plan, list) else []:
+        if not isinstance(task, dict):
+            continue
+        description = str(task.get("description") or task.get("task") or "")
+        for path in task.get("files") or []:
+            if not isinstance(path, str):
+                continue
+            path = path.strip().removeprefix("./").lstrip("/")
+            if not path.endswith(SCAFFOLD_EXTENSIONS) or ".." in path:
+                continue
+            if path not in targets and len(targets) >= SCAFFOLD_MAX_FILES:
+                continue
+            targets.setdefault(path, []).append(description)
+    return [{"path": path, "description": " ".join(d for d in descs if d)} for path, descs in targets.items()]
+
+@traceable
+def scaffold_file(payload: dict) -> dict:
+    """
+    Fan-out branch: generate a single file. Receives the payload sent by the
+    Planner router and returns a partial update that the graph merges.
+    """
+    path = payload["path"]
+    system_prompt = (
+        "You are a Next.js developer generating ONE file of a larger app (pages router, Tailwind CSS). "
+        "The other files listed are generated at the same time; import them with correct relative paths. "
+        "Match the user's colors, layout and components EXACTLY. "
+        f"Output ONLY the complete contents of {path}: no markdown code fences, no explanations."
+    )
+    user_prompt = (
+        f"App description: {payload.get('user_prompt', '')}\n\n"
+        f"Spec:\n{json.dumps(payload.get('spec', {}), indent=2)}\n\n"
+        f"All files in the app: {', '.join(payload.get('all_files', []))}\n\n"
+        f"File to write: {path}\nWhat it must do: {payload.get('description', '')}"
+    )
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+    try:
+        content = call_openai("ScaffoldFile", messages, max_tokens=SCAFFOLD_FILE_MAX_TOKENS, temperature=0.2)
+        content = content.strip()
+        if content.startswith("```"):
+            content = content.split("\n", 1)[1] if "\n" in content else ""
+            content = content.rsplit("```", 1)[0]
+        return {"scaffold_files": {path: content.strip() + "\n"}}
+    except Exception as e:
+        print(f"ScaffoldFile {path} failed: {e}")
+        return {"scaffold_errors": {path: str(e)}}
+
+@traceable
+def scaffold_merge(state: dict) -> dict:
+    """
+    Join point of the fan-out: collect the generated files into one file map and
+    write them into the workspace like the Scaffolder does.
+    """
+    targets = [t["path"] for t in scaffold_targets(state.get("plan", []))]
+    generated = state.get("scaffold_files", {})
+    errors = state.get("scaffold_errors", {})
+    file_map = {path: generated[path] for path in targets if generated.get(path)}
+
+    task_log = state.get("task_log", [])
+    for path in targets:
+        if path in file_map:
+            task_log = task_log + [log_entry("ScaffoldFile", "ok", f"{path} ({len(file_map[path])} chars)")]
+        else:
+            task_log = task_log + [log_entry("ScaffoldFile", "err", f"{path}: {errors.get(path, 'no content')}")]
+    task_log = task_log + [log_entry("ScaffoldMerge", "ok" if file_map else "err", f"merged {len(file_map)}/{len(targets)} files")]
+    return {**state, **materialize_scaffold("ScaffoldMerge", state, file_map, task_log)}
+
+def select_edit_files(repo_path: str, request: str) -> list:
+    """
+    Pick the workspace files most relevant to an edit request: files whose path
+    or content mention words of the request rank first, and the main page is
+    always included. Returns relative paths, at most EDIT_MAX_FILES.
+    """
+    words = {w for w in re.findall(r"[a-z][a-z0-9]{2,}", request.lower())}
+    ranked = []
+    for rel_path in repo_tool.list_source_files(repo_path, EDIT_EXTENSIONS):
+        if os.path.basename(rel_path) in EDIT_SKIP_FILES:
+            continue
+        try:
+            content = repo_tool.read_file(os.path.join(repo_path, rel_path)).lower()
+        except (OSError, UnicodeDecodeError):
+            continue
+        path_words = set(re.findall(r"[a-z][a-z0-9]{2,}", rel_path.lower()))
+        score = 3 * len(words & path_words) + sum(1 for w in words if w in content)
+        if rel_path in ("pages/index.js", "pages/index.tsx", "app/page.js", "app/page.tsx"):
+            score += 2
+        ranked.append((-score, rel_path))
+    ranked.sort()
+    return [rel_path for neg_score, rel_path in ranked if neg_score < 0][:EDIT_MAX_FILES]
+
+@traceable
+def edit_patcher(state: dict) -> dict:
+    """
+    Edit graph entry point: send the edit request with the current contents of
+    the relevant workspace files and write back only the files the model changed.
+    """
+    repo_path = state.get("repo_path")
+    request = state.get("edit_request") or state.get("user_prompt", "")
+    task_log = state.get("task_log", [])
+    all_files = [p for p in repo_tool.list_source_files(repo_path, EDIT_EXTENSIONS) if os.path.basename(p) not in EDIT_SKIP_FILES]
+    selected = select_edit_files(repo_path, request)
+
+    sections = []
+    for rel_path in selected:
+        content = repo_tool.read_file(os.path.join(repo_path, rel_path))
+        if len(content) > EDIT_MAX_FILE_CHARS:
+            content = content[:EDIT_MAX_FILE_CHARS] + "\n/* ...truncated... */"
+        sections.append(f"--- {rel_path} ---\n{content}")
+
+    system_prompt = (
+        "You are a Next.js developer editing an existing app (pages router, Tailwind CSS). "
+        "Apply the requested change with the smallest set of edits and keep everything else as it is. "
+        "Return ONLY the files you changed or created, each with its complete new content. "
+        "Output VALID JSON with double quotes only: {\"output\": {\"path/to/file.js\": \"complete file content\"}}"
+    )
+    user_prompt = (
+        f"Original app: {state.get('original_prompt', '')}\n"
+        f"Edit requirement: {request}\n\n"
+        f"Files in the app: {', '.join(all_files)}\n\n"
+        f"Current contents of the relevant files:\n\n" + "\n\n".join(sections)
+    )
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+
+    try:
+        reply = call_openai("EditPatcher", messages, max_tokens=4096, temperature=0.2)
+        action, parse_path = parse_json_with_path(reply)
+        file_map = action.get("output", action)
+        if isinstance(file_map, dict) and isinstance(file_map.get("output"), dict):
+            file_map = file_map["output"]
+        if not isinstance(file_map, dict):
+            raise ValueError(f"expected a file map, got {type(file_map).__name__}")
+
+        # Remember where the dev server log ends so HotReload only reads the recompile output
+        dev_log_offset = dev_log_size(repo_path)
+        diffs = state.get("file_diffs", [])
+        changed = []
+        for rel_path, content in file_map.items():
+            if isinstance(content, (dict, list)):
+                content = json.dumps(content, indent=2)
+            if not isinstance(content, str) or not is_safe_rel_path(rel_path):
+                continue
+            target_full = os.path.join(repo_path, rel_path)
+            if os.path.isfile(target_full) and repo_tool.read_file(target_full) == content:
+                continue
+            repo_tool.write_file_atomic(target_full, content)
+            diffs.append(f"Edited {rel_path}")
+            changed.append(rel_path)
+
+        note = f"sent {len(selected)}/{len(all_files)} files, changed {len(changed)}: {', '.join(changed)}"
+        print(f"EditPatcher: {note}")
+        parse_paths = {**state.get("parse_paths", {}), "EditPatcher": parse_path}
+        return {
+            **state,
+            "file_diffs": diffs,
+            "edit_changed_files": changed,
+            "dev_log_offset": dev_log_offset,
+            "parse_paths": parse_paths,
+            "task_log": task_log + [log_entry("EditPatcher", "ok" if changed else "noop", note)],
+        }
+    except Exception as e:
+        print(f"EditPatcher error: {e}")
+        return {**state, "task_log": task_log + [log_entry("EditPatcher", "err", str(e))]}
+
+@traceable
+def validate(state: dict) -> dict:
+    """
+    Pre-build checks (manifest, imports, syntax) that take milliseconds. Errors
+    are written to last_error in build-log form so the Fixer can act on them
+    before any install or build runs.
+    """
+    repo_path = state.get("repo_path")
+    task_log = state.get("task_log", [])
+    if not repo_path or not os.path.isdir(repo_path):
+        return {**state, "validation_errors": [], "task_log": task_log + [log_entry("Validator", "noop", "no workspace")]}
+
+    result = validator.validate_workspace(repo_path)
+    errors = result["errors"]
+    note = f"{len(errors)} problems in {result['files']} files ({result['ms']}ms)"
+    print(f"Validator: {note}")
+    if not errors:
+        return {**state, "validation_errors": [], "task_log": task_log + [log_entry("Validator", "ok", note)]}
+
+    report = validator.format_errors(errors)
+    return {
+        **state,
+        "validation_errors": errors,
+        "last_error": report,
+        "build_logs": report,
+        "run_url": None,
+        "build_retry_count": state.get("build_retry_count", 0) + 1,
+        "task_log": task_log + [log_entry("Validator", "err", f"{note}: {errors[0]['path']}: {errors[0]['message']}")],
+    }
+
+def run_build_phase(phases: list, phase: str, cmd: list, repo_path: str, slug: str, timeout: float):
+    """
+    Run an install/build command through shell_tool.run_phase with its log in
+    BUILD_LOG_DIR and record the phase summary in `phases`.
+    Returns: (exit_code, stdout_tail, stderr_tail)
+    """
+    result = shell_tool.run_phase(
+        cmd, cwd=repo_path, name=phase, timeout=timeout,
+        log_path=os.path.join(BUILD_LOG_DIR, slug, f"{phase}.log"), cancel_key=slug,
+    )
+    phases.append({k: result[k] for k in ("name", "status", "exit_code", "seconds", "log_path")})
+    return result["exit_code"], result["stdout_tail"], result["stderr_tail"]
+
+def dev_log_size(repo_path: str) -> int:
+    try:
+        return os.path.getsize(os.path.join(repo_path, "dev_server.log"))
+    except OSError:
+        return 0
+
+def can_hot_reload(state: dict) -> bool:
+    """True when the slug's dev server is still up and the changed files do not need a restart."""
+    changed = state.get("edit_changed_files") or []
+    return (
+        HOT_RELOAD
+        and bool(state.get("port"))
+        and preview_supervisor.is_live(state.get("slug"))
+        and not any(os.path.basename(p) in RESTART_FILES for p in changed)
+    )
+
+@traceable
+def hot_reload(state: dict) -> dict:
+    """
+    Let the running `next dev` pick the edited files up: request the page (dev
+    compiles routes on demand, even with no browser attached) and read the new
+    part of dev_server.log for the recompile result.
+    """
+    repo_path = state["repo_path"]
+    run_url = port_tool.preview_url(state["port"])
+    log_path = os.path.join(repo_path, "dev_server.log")
+    offset = state.get("dev_log_offset", 0)
+    task_log = state.get("task_log", [])
+    start = time.time()
+    preview_supervisor.touch(state.get("slug"))
+
+    page_status, request_error = None, None
+    try:
+        page_status = httpx.get(run_url, timeout=HOT_RELOAD_TIMEOUT).status_code
+    except Exception as e:
+        request_error = str(e)
+
+    # The response comes after the compile; give the log a moment to flush
+    status, detail, new_output = None, "", ""
+    deadline = time.time() + 2
+    while True:
+        try:
+            with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                f.seek(offset)
+                new_output = f.read()
+        except OSError:
+            new_output = ""
+        status, detail = dev_log_status(new_output)
+        if status is not None or time.time() > deadline:
+            break
+        time.sleep(0.2)
+
+    seconds = time.time() - start
+    if status == "error" or request_error or (page_status or 0) >= 500:
+        error = detail or request_error or f"{run_url} returned {page_status} after the edit"
+        print(f"HotReload: recompile failed after {seconds:.1f}s: {error}")
+        return {
+            **state,
+            "run_url": None,
+            "last_error": error,
+            "build_logs": state.get("build_logs", "") + f"\n=== next dev (hot reload) ===\n{new_output}",
+            "build_retry_count": state.get("build_retry_count", 0) + 1,
+            "dev_log_offset": offset + len(new_output.encode("utf-8")),
+            "task_log": task_log + [log_entry("HotReload", "err", error[:200])],
+        }
+
+    print(f"HotReload: {state.get('slug')} updated in {seconds:.1f}s (page status {page_status})")
+    return {
+        **state,
+        "run_url": run_url,
+        "last_error": None,
+        "dev_log_offset": offset + len(new_output.encode("utf-8")),
+        "task_log": task_log + [log_entry("HotReload", "ok", f"recompiled in {seconds:.1f}s, status={page_status}")],
+    }
+
 @traceable
 def builder(state: dict) -> dict:
     tools = {"run_command": shell_tool.run_command, "start_dev_server": shell_tool.start_dev_server}
@@ -384,25 +904,69 @@ def builder(state: dict) -> dict:
     user_prompt = f"Repo path: {state.get('repo_path')}"
     return agent_node("Builder", system_prompt, user_prompt, tools, state)
 
+def fixer_context(state: dict):
+    """
+    Analyze the failing build output and collect excerpts of the files it points
+    at. Returns (analysis, excerpts text).
+    """
+    repo_path = state.get("repo_path") or ""
+    log_text = f"{state.get('last_error') or ''}\n{state.get('build_logs') or ''}"
+    analysis = analyze_build_log(log_text, repo_path if os.path.isdir(repo_path) else None, max_files=FIXER_MAX_FILES)
+
+    paths = [f["path"] for f in analysis["files"]]
+    lines_by_path = {f["path"]: f["line"] for f in analysis["files"]}
+    needs_manifest = any(not m.startswith(".") for m in analysis["missing_modules"]) or "script" in log_text.lower()
+    if needs_manifest and "package.json" not in paths and os.path.isfile(os.path.join(repo_path, "package.json")):
+        paths.append("package.json")
+
+    sections = []
+    for rel_path in paths:
+        try:
+            lines = repo_tool.read_file(os.path.join(repo_path, rel_path)).splitlines()
+        except (OSError, UnicodeDecodeError):
+            continue
+        line = lines_by_path.get(rel_path)
+        if len(lines) <= FIXER_FULL_FILE_LINES or rel_path == "package.json":
+            first, last = 1, len(lines)
+        else:
+            center = line or 1
+            first = max(1, center - FIXER_CONTEXT_LINES)
+            last = min(len(lines), center + FIXER_CONTEXT_LINES)
+        where = f", error at line {line}" if line else ""
+        sections.append(f"--- {rel_path} (lines {first}-{last} of {len(lines)}{where}) ---\n" + "\n".join(lines[first - 1:last]))
+    return analysis, "\n\n".join(sections)
+
 @traceable
 def fixer(state: dict) -> dict:
     tools = {"write_file": repo_tool.write_file}
     system_prompt = (
-        "You are a fixer agent. Given build/run errors, suggest code fixes as JSON. "
+        "You are a fixer agent. Given build/run errors and excerpts of the failing files, fix them with the smallest possible change. "
+        "For each file you change, return a UNIFIED DIFF against the current file (--- a/path, +++ b/path, @@ hunks with 3 lines of context copied exactly from the excerpt). "
+        "For new files and for package.json, return the complete file content instead of a diff. "
         "For 'Missing script: \"build\"' errors, update package.json with Next.js-compatible scripts: 'build': 'next build', 'dev': 'next dev'. "
         "For 'Cannot find module tailwindcss' errors, update package.json to include tailwindcss, postcss, and autoprefixer in devDependencies with proper versions. "
-        "IMPORTANT: Always provide the file path as the key and the complete file content as the value. "
+        "IMPORTANT: Always use the file path as the key. "
         "Output VALID JSON with double quotes only in this exact format: "
-        "{\"output\": {\"package.json\": \"complete file content here\"}} "
+        "{\"output\": {\"pages/index.js\": \"--- a/pages/index.js\\n+++ b/pages/index.js\\n@@ -3,3 +3,3 @@\\n...\", \"package.json\": \"complete file content\"}} "
         "DO NOT use keys like 'relative_file_path' or 'complete_fixed_content_as_string'."
     )
-    # ... rest of the function remains the same
     last_error = state.get('last_error', '')
     if not last_error:
-        return {**state, "task_log": state.get("task_log", []) + [log_entry("Fixer", "noop", "no errors to fix")]}
-    
-    user_prompt = f"Fix this error: {last_error}\n\nRepo path: {state.get('repo_path')}\n\nProvide complete file content as strings. For package.json, include all required dependencies."
-    return agent_node("Fixer", system_prompt, user_prompt, tools, state)
+        return {**state, "validation_errors": [], "fixing_validation": False,
+                "task_log": state.get("task_log", []) + [log_entry("Fixer", "noop", "no errors to fix")]}
+
+    analysis, excerpts = fixer_context(state)
+    print(f"Fixer: analysis={analysis}")
+    user_prompt = (
+        f"Fix this error: {last_error}\n\n"
+        f"Error lines from the build log:\n" + "\n".join(analysis["errors"]) + "\n\n"
+        f"Missing modules: {', '.join(analysis['missing_modules']) or 'none'}\n\n"
+        f"Relevant files:\n\n{excerpts or '(no file locations found in the log)'}"
+    )
+    result = agent_node("Fixer", system_prompt, user_prompt, tools, {**state, "fix_analysis": analysis})
+    # Validation errors are consumed here; the graph uses fixing_validation to
+    # still run the real build if this fix is not accepted
+    return {**result, "validation_errors": [], "fixing_validation": bool(state.get("validation_errors"))}
 
 @traceable
 def preview_deploy(state: dict) -> dict:
@@ -414,4 +978,16 @@ def preview_deploy(state: dict) -> dict:
     repo = state.get("repo_path")
     run_url = state.get("run_url")
     user_prompt = f"Repo: {repo}\nRunURL: {run_url}"
-    return agent_node("PreviewDeploy", system_prompt, user_prompt, tools, state)
\ No newline at end of file
+    return agent_node("PreviewDeploy", system_prompt, user_prompt, tools, state)
+
+
+@traceable
+def preview_ready(state: dict) -> dict:
+    """PreviewDeploy of the edit graph: the preview already runs, so only report its URL (no LLM call)."""
+    task_log = state.get("task_log", [])
+    run_url = state.get("run_url")
+    if state.get("repo_path") and run_url:
+        return {**state, "last_error": None,
+                "task_log": task_log + [log_entry("PreviewDeploy", "ok", f"preview ready at {run_url}")]}
+    return {**state, "last_error": "missing repo_path or run_url",
+            "task_log": task_log + [log_entry("PreviewDeploy", "err", "missing repo_path or run_url")]}
@@ -1,4 +1,17 @@
+import os
 import uvicorn
 
+# Runs, checkpoints and previews survive reloads, so auto-reload stays on by
+# default; only source directories are watched, never the generated apps in work/.
+RELOAD = os.environ.get("RELOAD", "1") == "1"
+# Several API worker processes share runs, jobs and ports through the
+# coordination database (tools/coordination.py); reload only works with one
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "1"))
+
 if __name__ == "__main__":
-    uvicorn.run("ui.main:app", host="0.0.0.0", port=8081, reload=True)
+    if WEB_WORKERS > 1:
+        os.environ.setdefault("COORD_BACKEND", "sqlite")
+        uvicorn.run("ui.main:app", host="0.0.0.0", port=8081, workers=WEB_WORKERS)
+    else:
+        uvicorn.run("ui.main:app", host="0.0.0.0", port=8081, reload=RELOAD,
+                    reload_dirs=["ui", "graph", "tools"] if RELOAD else None)
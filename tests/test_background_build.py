@@ -0,0 +1,27 @@
+from graph import background_build
+from tools import shell_tool
+
+
+def test_build_logs_keep_a_bounded_tail(tmp_path, monkeypatch):
+    repo = tmp_path / "app"
+    repo.mkdir()
+    (repo / "package.json").write_text("{}")
+    monkeypatch.setattr(background_build, "PROD_BUILD_DIR", str(tmp_path / "builds"))
+    monkeypatch.setattr(background_build, "PROD_BUILD_RETRIES", 3)
+    monkeypatch.setattr(shell_tool, "PHASE_TAIL_LINES", 50)
+    output = "\n".join(f"line {i}" for i in range(40))
+    monkeypatch.setattr(shell_tool, "run_command", lambda cmd, cwd=None: (1, output, "Type error"))
+    seen = []
+
+    def fixer(state):
+        seen.append(state["build_logs"])
+        return {**state, "fixer_applied_fixes": ["page.tsx"]}
+    monkeypatch.setattr(background_build, "fixer", fixer)
+
+    background_build.start({"slug": "app", "repo_path": str(repo)})
+    record = background_build.wait("app", timeout=10)
+
+    assert record["status"] == "failed" and record["fixes"] == 3
+    assert len(record["build_logs"].split("\n")) <= 50
+    assert record["build_logs"].endswith("Type error")
+    assert all(len(logs.split("\n")) <= 50 for logs in seen)
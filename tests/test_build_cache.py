@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from tools import build_cache
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "package.json").write_text(json.dumps({"dependencies": {"next": "14.2.3", "react": "18.2.0"}}))
+    (tmp_path / "node_modules" / "next").mkdir(parents=True)
+    (tmp_path / "node_modules" / "next" / "package.json").write_text('{\n  "name": "next",\n  "version": "14.2.3"\n}\n')
+    (tmp_path / "tailwind.config.js").write_text("module.exports = { content: [] };\n")
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "index.js").write_text("export default () => null;\n")
+    return tmp_path
+
+
+def test_fingerprint_ignores_app_code(repo):
+    before = build_cache.fingerprint(str(repo))
+    (repo / "pages" / "index.js").write_text("export default () => 'changed';\n")
+
+    assert build_cache.fingerprint(str(repo)) == before
+
+
+@pytest.mark.parametrize("change", [
+    lambda repo: (repo / "tailwind.config.js").write_text("module.exports = { content: ['./pages/**'] };\n"),
+    lambda repo: (repo / "next.config.js").write_text("module.exports = {};\n"),
+    lambda repo: (repo / "package.json").write_text(json.dumps({"dependencies": {"next": "14.2.4", "react": "18.2.0"}})),
+    lambda repo: (repo / "node_modules" / "next" / "package.json").write_text('{"version": "15.0.0"}'),
+])
+def test_fingerprint_follows_dependencies_and_config(repo, change):
+    before = build_cache.fingerprint(str(repo))
+    change(repo)
+
+    assert build_cache.fingerprint(str(repo)) != before
+
+
+def test_prepare_keeps_a_matching_cache(repo, monkeypatch):
+    monkeypatch.setattr(build_cache, "BUILD_CACHE_MODE", "keep")
+    assert build_cache.prepare(str(repo)) == "cold"
+    (repo / ".next" / "cache" / "webpack").mkdir()
+
+    assert build_cache.prepare(str(repo)) == "warm"
+    assert (repo / ".next" / "cache" / "webpack").is_dir()
+
+    (repo / "postcss.config.js").write_text("module.exports = {};\n")
+    assert build_cache.prepare(str(repo)) == "cold"
+    assert not (repo / ".next" / "cache" / "webpack").exists()
+
+
+def test_clean_mode_always_wipes(repo, monkeypatch):
+    monkeypatch.setattr(build_cache, "BUILD_CACHE_MODE", "clean")
+    build_cache.prepare(str(repo))
+
+    assert build_cache.prepare(str(repo)) == "cold"
+
+
+def test_stash_and_restore(repo):
+    build_cache.prepare(str(repo))
+    (repo / ".next" / "cache" / "webpack").mkdir()
+
+    stash = build_cache.stash(str(repo))
+    assert stash and not (repo / ".next" / "cache").exists()
+    build_cache.restore(stash, str(repo))
+
+    assert (repo / ".next" / "cache" / "webpack").is_dir()
+    assert build_cache.prepare(str(repo)) == "warm"
+    assert build_cache.stash(str(repo / "pages")) is None
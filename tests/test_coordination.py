@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from tools import coordination
+
+
+@pytest.fixture
+def coord(tmp_path, monkeypatch):
+    monkeypatch.setattr(coordination, "COORD_BACKEND", "sqlite")
+    monkeypatch.setattr(coordination, "COORD_DB_PATH", str(tmp_path / "coord.sqlite"))
+    monkeypatch.setattr(coordination, "_local", threading.local())
+    monkeypatch.setattr(coordination, "_schema_ready", False)
+    monkeypatch.setattr(coordination, "NODE_ID", "node-a")
+    coordination.register_node()
+    return coordination
+
+
+def as_node(coord, monkeypatch, node_id: str):
+    monkeypatch.setattr(coord, "NODE_ID", node_id)
+    coord.register_node()
+
+
+def job(job_id: str, slug: str, created: float) -> dict:
+    return {"id": job_id, "kind": "process", "slug": slug, "payload": {"prompt": job_id}, "created": created}
+
+
+def test_claim_and_finish(coord):
+    assert coord.enqueue_job(job("j1", "app", 1.0), max_queued=10)
+
+    claimed = coord.claim_job(["process"])
+
+    assert claimed["id"] == "j1" and claimed["status"] == "running" and claimed["node_id"] == "node-a"
+    assert claimed["payload"] == {"prompt": "j1"}
+    assert coord.claim_job(["process"]) is None
+    coord.finish_job("j1", "done", {"run_url": "http://localhost:3000"}, None, time.time())
+    finished = coord.get_job("j1")
+    assert finished["status"] == "done" and finished["result"] == {"run_url": "http://localhost:3000"}
+    assert coord.active_job_for_slug("app") is None
+
+
+def test_queue_is_bounded(coord):
+    assert coord.enqueue_job(job("j1", "a", 1.0), max_queued=1)
+    assert not coord.enqueue_job(job("j2", "b", 2.0), max_queued=1)
+    assert coord.job_counts() == {"queued": 1}
+
+
+def test_one_running_job_per_slug(coord):
+    coord.enqueue_job(job("j1", "app", 1.0), max_queued=10)
+    coord.enqueue_job(job("j2", "app", 2.0), max_queued=10)
+    coord.enqueue_job(job("j3", "other", 3.0), max_queued=10)
+
+    assert coord.claim_job(["process"])["id"] == "j1"
+    assert coord.claim_job(["process"])["id"] == "j3"
+    assert coord.claim_job(["process"]) is None
+
+
+def test_jobs_of_slugs_leased_elsewhere_are_skipped(coord, monkeypatch):
+    coord.enqueue_job(job("j1", "app", 1.0), max_queued=10)
+    assert coord.acquire("app")
+
+    as_node(coord, monkeypatch, "node-b")
+    assert coord.claim_job(["process"]) is None
+    assert coord.owner("app")["node_id"] == "node-a"
+    assert not coord.owner("app")["local"]
+
+
+def test_jobs_of_dead_nodes_are_requeued(coord, monkeypatch):
+    coord.enqueue_job(job("j1", "app", 1.0), max_queued=10)
+    assert coord.claim_job(["process"])["node_id"] == "node-a"
+    coord._db().execute("UPDATE nodes SET heartbeat = 0 WHERE node_id = 'node-a'")
+    coord._db().execute("UPDATE leases SET expires = 0")
+
+    as_node(coord, monkeypatch, "node-b")
+    claimed = coord.claim_job(["process"])
+
+    assert claimed["id"] == "j1" and claimed["node_id"] == "node-b"
+
+
+def test_concurrent_claims_never_share_a_job(coord):
+    for i in range(20):
+        coord.enqueue_job(job(f"j{i}", f"slug-{i}", float(i)), max_queued=100)
+    claimed, lock = [], threading.Lock()
+
+    def worker():
+        while True:
+            got = coord.claim_job(["process"])
+            if got is None:
+                return
+            with lock:
+                claimed.append(got["id"])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(claimed) == sorted(f"j{i}" for i in range(20))
+
+
+def test_ports(coord, monkeypatch):
+    assert coord.claim_port("a", 3000)
+    assert coord.port_of("a") == 3000
+
+    as_node(coord, monkeypatch, "node-b")
+    assert not coord.claim_port("b", 3000)
+    coord.release_port("a")
+    assert coord.claim_port("b", 3000)
+    assert coord.port_of("a") is None
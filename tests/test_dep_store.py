@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+import pytest
+
+from tools import dep_store
+
+MANIFEST = {
+    "name": "app",
+    "scripts": {"dev": "next dev", "build": "next build"},
+    "dependencies": {"react": "18.2.0", "next": "14.2.3"},
+    "devDependencies": {"tailwindcss": "^3.4.0"},
+}
+
+
+def write_manifest(repo, manifest):
+    repo.mkdir(exist_ok=True)
+    (repo / "package.json").write_text(json.dumps(manifest))
+    return str(repo)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(dep_store, "DEP_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(dep_store, "STATS", {k: 0 for k in dep_store.STATS})
+    return dep_store
+
+
+def fake_install(repo, calls):
+    def install():
+        calls.append(repo)
+        os.makedirs(os.path.join(repo, "node_modules", "react"), exist_ok=True)
+        with open(os.path.join(repo, "node_modules", "react", "index.js"), "w") as f:
+            f.write("module.exports = {};")
+        return 0, "added 1 package", ""
+    return install
+
+
+def test_hash_covers_only_dependencies(tmp_path):
+    base = dep_store.manifest_hash(write_manifest(tmp_path / "a", MANIFEST))
+    reordered = {**MANIFEST, "name": "other", "version": "2.0.0", "scripts": {},
+                 "dependencies": {"next": "14.2.3", "react": "18.2.0"}}
+    changed = {**MANIFEST, "devDependencies": {"tailwindcss": "^3.4.1"}}
+
+    assert base and len(base) == 24
+    assert dep_store.manifest_hash(write_manifest(tmp_path / "b", reordered)) == base
+    assert dep_store.manifest_hash(write_manifest(tmp_path / "c", changed)) != base
+
+
+def test_hash_of_missing_or_invalid_manifest(tmp_path):
+    assert dep_store.manifest_hash(str(tmp_path)) is None
+    (tmp_path / "package.json").write_text("{not json")
+    assert dep_store.manifest_hash(str(tmp_path)) is None
+
+
+def test_install_then_unchanged_then_store(store, tmp_path):
+    calls = []
+    first = write_manifest(tmp_path / "first", MANIFEST)
+
+    assert store.ensure_installed(first, fake_install(first, calls))[3] == "install"
+    assert store.installed_hash(first) == store.manifest_hash(first)
+    assert store.ensure_installed(first, fake_install(first, calls))[3] == "unchanged"
+
+    entry = os.path.join(store.DEP_STORE_DIR, store.manifest_hash(first), store.COMPLETE)
+    deadline = time.time() + 10
+    while not os.path.exists(entry) and time.time() < deadline:
+        time.sleep(0.05)  # the store copy is made in the background
+    second = write_manifest(tmp_path / "second", MANIFEST)
+    code, _, _, source = store.ensure_installed(second, fake_install(second, calls))
+
+    assert (code, source) == (0, "store")
+    assert os.path.isfile(os.path.join(second, "node_modules", "react", "index.js"))
+    assert calls == [first]
+    assert store.STATS == {"unchanged": 1, "store": 1, "install": 1}
+
+
+def test_changed_dependencies_reinstall(store, tmp_path):
+    calls = []
+    repo = write_manifest(tmp_path / "app", MANIFEST)
+    store.ensure_installed(repo, fake_install(repo, calls))
+    write_manifest(tmp_path / "app", {**MANIFEST, "dependencies": {**MANIFEST["dependencies"], "zod": "3.23.0"}})
+
+    assert store.ensure_installed(repo, fake_install(repo, calls))[3] == "install"
+    assert len(calls) == 2
+
+
+def test_failed_install_is_not_recorded(store, tmp_path):
+    repo = write_manifest(tmp_path / "app", MANIFEST)
+
+    code, _, err, source = store.ensure_installed(repo, lambda: (1, "", "ERESOLVE"))
+
+    assert (code, err, source) == (1, "ERESOLVE", "install")
+    assert store.installed_hash(repo) is None
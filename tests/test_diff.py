@@ -0,0 +1,44 @@
+import pytest
+
+from tools.repo_tool import apply_unified_diff, looks_like_diff, make_unified_diff
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 21))
+
+
+def test_round_trip():
+    new = ORIGINAL.replace("line 5\n", "line five\n").replace("line 17\n", "")
+    diff = make_unified_diff(ORIGINAL, new, "pages/index.js")
+
+    assert diff.startswith("--- pages/index.js\n+++ pages/index.js")
+    assert looks_like_diff(diff)
+    assert apply_unified_diff(ORIGINAL, diff) == new
+
+
+def test_wrong_line_numbers_still_apply():
+    diff = "--- a/x.js\n+++ b/x.js\n@@ -2,3 +2,3 @@\n line 9\n-line 10\n+line ten\n line 11\n"
+
+    assert apply_unified_diff(ORIGINAL, diff) == ORIGINAL.replace("line 10\n", "line ten\n")
+
+
+def test_missing_space_on_empty_context_line():
+    original = "a\n\nb\nc\n"
+    diff = "@@ -1,4 +1,4 @@\n a\n\n-b\n+B\n c\n"
+
+    assert apply_unified_diff(original, diff) == "a\n\nB\nc\n"
+
+
+def test_mismatched_context_raises():
+    diff = "@@ -1,2 +1,2 @@\n not in the file\n-line 1\n+line one\n"
+
+    with pytest.raises(ValueError):
+        apply_unified_diff(ORIGINAL, diff)
+
+
+def test_no_hunks_raises():
+    with pytest.raises(ValueError):
+        apply_unified_diff(ORIGINAL, "--- a/x.js\n+++ b/x.js\n")
+
+
+def test_full_content_is_not_a_diff():
+    assert not looks_like_diff("export default function Home() {}\n")
+    assert not looks_like_diff('{\n  "name": "app"\n}\n')
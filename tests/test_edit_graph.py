@@ -0,0 +1,24 @@
+from graph import nodes
+
+
+def no_llm(*args, **kwargs):
+    raise AssertionError("the edit graph's PreviewDeploy must not call the LLM")
+
+
+def test_preview_ready_reports_url_without_llm(monkeypatch, tmp_path):
+    monkeypatch.setattr(nodes, "call_openai", no_llm)
+
+    result = nodes.preview_ready({"repo_path": str(tmp_path), "run_url": "http://localhost:3001", "task_log": []})
+
+    assert result["last_error"] is None
+    assert result["task_log"][-1]["node"] == "PreviewDeploy"
+    assert "http://localhost:3001" in result["task_log"][-1]["note"]
+
+
+def test_preview_ready_without_url_is_an_error(monkeypatch, tmp_path):
+    monkeypatch.setattr(nodes, "call_openai", no_llm)
+
+    result = nodes.preview_ready({"repo_path": str(tmp_path), "run_url": None, "task_log": []})
+
+    assert result["last_error"]
+    assert result["task_log"][-1]["status"] == "err"
@@ -0,0 +1,40 @@
+import pytest
+
+from tools import error_parser
+
+
+@pytest.mark.parametrize("raw, path", [
+    ('{"output": {"pages/index.js": "x"}}', "strict"),
+    ('Here you go:\n```json\n{"output": {"a.js": "x"}}\n```', "fenced"),
+    ('Sure! {"output": {"a.js": "{not json}"}} Let me know.', "braces"),
+    ('{"output": {"a.js": "x",},}', "repaired"),
+    ('```json\n{"output": ["a.js",]}\n```', "repaired"),
+    ("Result: {'output': {'a.js': 'x'}, 'done': True}", "literal"),
+])
+def test_extract_json_paths(raw, path):
+    parsed, used = error_parser.extract_json(raw)
+
+    assert used == path
+    assert "output" in parsed
+
+
+def test_strict_json_is_not_repaired():
+    parsed, path = error_parser.extract_json('{"output": {"a.js": "items = [1, 2,]"}}')
+
+    assert path == "strict"
+    assert parsed["output"]["a.js"] == "items = [1, 2,]"
+
+
+def test_unparseable_reply():
+    assert error_parser.extract_json("no json here") == (None, None)
+    assert error_parser.extract_json("") == (None, None)
+
+
+def test_paths_are_counted(monkeypatch):
+    monkeypatch.setattr(error_parser, "PARSE_STATS", dict.fromkeys(error_parser.PARSE_STATS, 0))
+
+    error_parser.parse_json_with_path('{"output": {"a.js": "x"}}')
+    error_parser.parse_json_with_path('{"output": {"a.js": "x",}}')
+
+    assert error_parser.PARSE_STATS["strict"] == 1
+    assert error_parser.PARSE_STATS["repaired"] == 1
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from tools.file_stream import FileMapStreamParser
+
+FILES = {
+    "pages/index.js": 'export default () => <p className="x">{"}"} \\ done</p>;\n',
+    "styles/globals.css": "body {\n  margin: 0;\n}\n\t/* café ✓ */",
+    "package.json": {"name": "app", "scripts": {"dev": "next dev"}, "keywords": ["a}", "[b"]},
+}
+REPLY = 'Here are the files:\n```json\n' + json.dumps({"output": FILES, "done": True}) + '\n```'
+
+
+def expected():
+    return {path: json.dumps(value, indent=2) if isinstance(value, dict) else value for path, value in FILES.items()}
+
+
+def feed_all(chunks):
+    parser = FileMapStreamParser()
+    done = []
+    for chunk in chunks:
+        done.extend(parser.feed(chunk))
+    return done
+
+
+def test_whole_reply():
+    assert dict(feed_all([REPLY])) == expected()
+
+
+def test_one_character_at_a_time():
+    assert dict(feed_all(REPLY)) == expected()
+
+
+@pytest.mark.parametrize("cut", range(1, len(REPLY), 7))
+def test_every_chunk_boundary(cut):
+    assert dict(feed_all([REPLY[:cut], REPLY[cut:]])) == expected()
+
+
+def test_split_escape_sequences():
+    reply = '{"output": {"a.js": "q\\"\\\\\\n\\u00e9"}}'
+    for cut in range(1, len(reply)):
+        assert feed_all([reply[:cut], reply[cut:]]) == [("a.js", 'q"\\\né')]
+
+
+def test_files_are_returned_as_soon_as_they_complete():
+    parser = FileMapStreamParser()
+
+    assert parser.feed('{"outp') == []
+    assert parser.feed('ut": {"a.js": "one"') == [("a.js", "one")]
+    assert parser.feed(', "b.js": "tw') == []
+    assert parser.feed('o"}}') == [("b.js", "two")]
+    assert parser.feed(' trailing {"output": {"c.js": "x"}}') == []
+
+
+def test_invalid_escape_is_skipped():
+    assert feed_all(['{"output": {"bad.js": "\\q", "ok.js": "fine"}}']) == [("ok.js", "fine")]
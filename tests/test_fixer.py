@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from graph import engine, nodes
+
+BROKEN = "export default function Home() {\n  return <div>Home</div>\n"
+FIXED = "export default function Home() {\n  return <div>Home</div>;\n}\n"
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "index.js").write_text(BROKEN)
+    return tmp_path
+
+
+def fake_reply(reply: str):
+    def call_openai(name, messages, max_tokens=4096, temperature=0.2, use_cache=True, on_delta=None):
+        if on_delta:
+            for i in range(0, len(reply), 7):
+                on_delta(reply[i:i + 7])
+        return reply
+    return call_openai
+
+
+def fixer_state(repo) -> dict:
+    return {
+        "slug": "demo",
+        "repo_path": str(repo),
+        "last_error": "./pages/index.js\nError: Unexpected token (3:0)",
+        "build_retry_count": 1,
+        "run_url": None,
+        "task_log": [],
+    }
+
+
+def test_streamed_rewrite_counts_as_applied(repo, monkeypatch):
+    monkeypatch.setattr(nodes, "LLM_STREAMING", True)
+    monkeypatch.setattr(nodes, "call_openai", fake_reply(json.dumps({"output": {"pages/index.js": FIXED}})))
+
+    result = nodes.fixer(fixer_state(repo))
+
+    assert (repo / "pages" / "index.js").read_text() == FIXED
+    assert result["fixer_applied_fixes"] is True
+    assert result["last_error"] is None
+    assert "+}" in result["fix_patches"][-1]
+    assert engine.should_retry(result)
+
+
+def test_unchanged_rewrite_is_not_applied(repo, monkeypatch):
+    monkeypatch.setattr(nodes, "LLM_STREAMING", True)
+    monkeypatch.setattr(nodes, "call_openai", fake_reply(json.dumps({"output": {"pages/index.js": BROKEN}})))
+
+    result = nodes.fixer(fixer_state(repo))
+
+    assert result["fixer_applied_fixes"] is False
+    assert not engine.should_retry(result)
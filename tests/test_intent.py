@@ -0,0 +1,66 @@
+import pytest
+
+from ui import intent
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(intent, "STATS", dict.fromkeys(intent.STATS, 0))
+
+
+def llm(action="edit"):
+    calls = []
+
+    def llm_fn(prompt, slug):
+        calls.append(prompt)
+        return {"action": action, "slug": slug, "details": prompt}
+    return llm_fn, calls
+
+
+def test_without_a_slug_it_is_a_local_build():
+    llm_fn, calls = llm()
+
+    result = intent.classify("make the navbar blue", llm_fn=llm_fn)
+
+    assert (result["action"], result["source"], result["confidence"]) == ("build", "local", 1.0)
+    assert calls == []
+
+
+def test_confident_edit_stays_local():
+    llm_fn, calls = llm("build")
+
+    result = intent.classify("change the navbar color", slug="todo", known_slug=True, llm_fn=llm_fn)
+
+    assert result["action"] == "edit" and result["source"] == "local"
+    assert result["confidence"] >= intent.INTENT_CONFIDENCE_THRESHOLD
+    assert calls == []
+
+
+def test_uncertain_request_goes_to_the_llm():
+    llm_fn, calls = llm("edit")
+    action, confidence = intent.score("dark mode please", slug="todo")
+    assert confidence < intent.INTENT_CONFIDENCE_THRESHOLD
+
+    result = intent.classify("dark mode please", slug="todo", llm_fn=llm_fn)
+
+    assert result["source"] == "llm" and result["action"] == "edit"
+    assert calls == ["dark mode please"]
+    assert intent.stats()["fallback_rate"] == 1.0
+
+
+@pytest.mark.parametrize("threshold, source", [(0.0, "local"), (0.99, "llm")])
+def test_threshold_decides_the_fallback(monkeypatch, threshold, source):
+    monkeypatch.setattr(intent, "INTENT_CONFIDENCE_THRESHOLD", threshold)
+    llm_fn, _ = llm()
+
+    assert intent.classify("rename the title", slug="todo", known_slug=True, llm_fn=llm_fn)["source"] == source
+
+
+def test_failed_llm_call_falls_back_to_the_local_answer():
+    def broken(prompt, slug):
+        return {"action": "delete everything"}
+
+    result = intent.classify("dark mode please", slug="todo", llm_fn=broken)
+
+    assert result["source"] == "local"
+    assert intent.STATS["llm_failed"] == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from tools import llm_cache
+
+MESSAGES = [{"role": "system", "content": "plan"}, {"role": "user", "content": "a todo app"}]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm-cache.sqlite"))
+    monkeypatch.setattr(llm_cache, "_conn", None)
+    monkeypatch.setattr(llm_cache, "_memory", llm_cache.OrderedDict())
+    monkeypatch.setattr(llm_cache, "STATS", {k: 0 for k in llm_cache.STATS})
+    yield llm_cache
+    if llm_cache._conn is not None:
+        llm_cache._conn.close()
+
+
+def test_miss_store_hit(cache):
+    key, value = cache.lookup("m", MESSAGES, 0.2, 100, node="Planner")
+    assert key and value is None
+
+    cache.store(key, "reply")
+
+    assert cache.lookup("m", MESSAGES, 0.2, 100, node="Planner") == (key, "reply")
+    assert cache.STATS["misses"] == 1 and cache.STATS["hits"] == 1
+
+
+def test_key_covers_all_parameters(cache):
+    keys = {
+        cache.make_key("m", MESSAGES, 0.2, 100),
+        cache.make_key("other", MESSAGES, 0.2, 100),
+        cache.make_key("m", MESSAGES[:1], 0.2, 100),
+        cache.make_key("m", MESSAGES, 0.7, 100),
+        cache.make_key("m", MESSAGES, 0.2, 200),
+    }
+    assert len(keys) == 5
+
+
+def test_disk_hit_after_memory_is_lost(cache):
+    key, _ = cache.lookup("m", MESSAGES, 0.2, 100)
+    cache.store(key, "reply")
+    cache._memory.clear()  # as after a restart
+
+    assert cache.lookup("m", MESSAGES, 0.2, 100) == (key, "reply")
+    assert cache.STATS["disk_hits"] == 1
+
+
+def test_memory_is_bounded(cache, monkeypatch):
+    monkeypatch.setattr(cache, "LLM_CACHE_MAX_ITEMS", 2)
+    for i in range(3):
+        key, _ = cache.lookup("m", [{"role": "user", "content": str(i)}], 0.2, 100)
+        cache.store(key, f"reply {i}")
+
+    assert len(cache._memory) == 2
+
+
+def test_expired_entries_are_misses(cache, monkeypatch):
+    key, _ = cache.lookup("m", MESSAGES, 0.2, 100)
+    cache.store(key, "reply")
+    monkeypatch.setattr(cache, "LLM_CACHE_TTL", -1)
+
+    assert cache.lookup("m", MESSAGES, 0.2, 100) == (key, None)
+
+
+def test_disabled_nodes_bypass_the_cache(cache):
+    assert cache.lookup("m", MESSAGES, 0.2, 100, node="Fixer") == (None, None)
+    cache.store(None, "reply")
+    assert cache.STATS["bypassed"] == 1 and cache.STATS["stores"] == 0
+
+
+def test_clear_empties_memory_and_disk(cache):
+    key, _ = cache.lookup("m", MESSAGES, 0.2, 100)
+    cache.store(key, "reply")
+    cache.clear()
+
+    assert cache.lookup("m", MESSAGES, 0.2, 100) == (key, None)
@@ -0,0 +1,137 @@
+import os
+import threading
+
+import pytest
+
+from tools import repo_tool
+
+
+@pytest.fixture
+def template(tmp_path):
+    root = tmp_path / "template"
+    (root / "pages").mkdir(parents=True)
+    (root / "pages" / "index.js").write_text("export default () => null;\n")
+    (root / "pages" / "_app.js").write_text("export default function App() {}\n")
+    (root / "package.json").write_text('{"name": "template"}\n')
+    (root / "node_modules" / "react").mkdir(parents=True)
+    (root / "node_modules" / "react" / "index.js").write_text("x" * 1000)
+    (root / ".next" / "cache").mkdir(parents=True)
+    (root / "debug.log").write_text("log")
+    return root
+
+
+def materialize(template, dest, mode, monkeypatch, reflink=False):
+    monkeypatch.setattr(repo_tool, "TEMPLATE_LINK_MODE", mode)
+    monkeypatch.setattr(repo_tool, "_reflink", lambda src, dst: reflink and _copy(src, dst))
+    return repo_tool.materialize_template(str(template), str(dest), writable=("package.json", "pages/index.js"))
+
+
+def _copy(src, dst):
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        d.write(s.read())
+    return True
+
+
+def same_file(a, b) -> bool:
+    return os.stat(a).st_ino == os.stat(b).st_ino
+
+
+def test_excluded_artifacts_are_skipped(template, tmp_path, monkeypatch):
+    stats = materialize(template, tmp_path / "ws", "copy", monkeypatch)
+
+    assert stats["files"] == 3
+    assert stats["skipped_bytes"] >= 1003
+    assert not (tmp_path / "ws" / "node_modules").exists()
+    assert not (tmp_path / "ws" / ".next").exists()
+    assert not (tmp_path / "ws" / "debug.log").exists()
+
+
+def test_root_patterns_only_exclude_at_the_template_root(template, tmp_path, monkeypatch):
+    (template / "dist").mkdir()
+    (template / "dist" / "bundle.js").write_text("built")
+    (template / "components" / "dist").mkdir(parents=True)
+    (template / "components" / "dist" / "Button.js").write_text("export default null;\n")
+    (template / "components" / "debug.log").write_text("log")
+
+    materialize(template, tmp_path / "ws", "copy", monkeypatch)
+
+    assert not (tmp_path / "ws" / "dist").exists()
+    assert (tmp_path / "ws" / "components" / "dist" / "Button.js").exists()
+    assert not (tmp_path / "ws" / "components" / "debug.log").exists()
+
+
+def test_hardlink_mode_links_read_only_files(template, tmp_path, monkeypatch):
+    ws = tmp_path / "ws"
+    stats = materialize(template, ws, "hardlink", monkeypatch)
+
+    assert (stats["linked"], stats["copied"]) == (1, 2)
+    assert same_file(ws / "pages" / "_app.js", template / "pages" / "_app.js")
+    assert not same_file(ws / "package.json", template / "package.json")
+    assert stats["bytes_copied"] == os.path.getsize(template / "package.json") + os.path.getsize(template / "pages" / "index.js")
+
+
+def test_copy_mode_copies_everything(template, tmp_path, monkeypatch):
+    ws = tmp_path / "ws"
+    stats = materialize(template, ws, "copy", monkeypatch)
+
+    assert (stats["linked"], stats["copied"]) == (0, 3)
+    assert not same_file(ws / "pages" / "_app.js", template / "pages" / "_app.js")
+
+
+def test_auto_mode_prefers_reflinks(template, tmp_path, monkeypatch):
+    stats = materialize(template, tmp_path / "ws", "auto", monkeypatch, reflink=True)
+
+    assert (stats["reflinked"], stats["linked"], stats["copied"]) == (3, 0, 0)
+
+
+def test_auto_mode_falls_back_to_hardlinks(template, tmp_path, monkeypatch):
+    stats = materialize(template, tmp_path / "ws", "auto", monkeypatch)
+
+    assert (stats["reflinked"], stats["linked"], stats["copied"]) == (0, 1, 2)
+
+
+def test_writes_never_reach_the_template(template, tmp_path, monkeypatch):
+    ws = tmp_path / "ws"
+    materialize(template, ws, "hardlink", monkeypatch)
+
+    repo_tool.write_file(str(ws / "pages" / "_app.js"), "changed\n")
+
+    assert (ws / "pages" / "_app.js").read_text() == "changed\n"
+    assert (template / "pages" / "_app.js").read_text() == "export default function App() {}\n"
+
+
+def test_manifest_follows_template_changes(template, tmp_path, monkeypatch):
+    materialize(template, tmp_path / "ws1", "copy", monkeypatch)
+    (template / "pages" / "about.js").write_text("export default () => null;\n")
+
+    stats = materialize(template, tmp_path / "ws2", "copy", monkeypatch)
+
+    assert stats["files"] == 4
+    assert (tmp_path / "ws2" / "pages" / "about.js").exists()
+
+
+def test_concurrent_atomic_writes_use_their_own_temp_files(tmp_path, monkeypatch):
+    path = str(tmp_path / "pages" / "index.js")
+    both_written = threading.Barrier(2, timeout=5)
+    replace = os.replace
+
+    def replace_together(src, dst):
+        both_written.wait()
+        replace(src, dst)
+    monkeypatch.setattr(os, "replace", replace_together)
+    errors = []
+
+    def write(content):
+        try:
+            repo_tool.write_file_atomic(path, content)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=write, args=(c,)) for c in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert open(path).read() in ("a", "b")
+    assert os.listdir(tmp_path / "pages") == ["index.js"]
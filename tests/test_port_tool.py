@@ -0,0 +1,49 @@
+import socket
+
+import pytest
+
+from tools import port_tool
+
+PORT_MIN = 47320
+
+
+@pytest.fixture
+def ports(monkeypatch):
+    monkeypatch.setattr(port_tool, "PREVIEW_PORT_MIN", PORT_MIN)
+    monkeypatch.setattr(port_tool, "PREVIEW_PORT_MAX", PORT_MIN + 2)
+    monkeypatch.setattr(port_tool, "LEASES", {})
+    return port_tool
+
+
+def test_lease_is_stable_per_slug(ports):
+    first = ports.lease("a")
+
+    assert ports.lease("a") == first
+    assert ports.lease("b") != first
+    assert ports.get("a") == first
+    assert ports.preview_url(first) == f"http://{ports.PREVIEW_HOST}:{first}"
+
+
+def test_busy_ports_are_skipped(ports):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("0.0.0.0", PORT_MIN))
+        s.listen()
+        assert not ports.is_port_free(PORT_MIN)
+        assert ports.lease("a") == PORT_MIN + 1
+
+
+def test_exhausted_range_raises_until_released(ports):
+    leased = [ports.lease(slug) for slug in ("a", "b", "c")]
+    with pytest.raises(RuntimeError):
+        ports.lease("d")
+
+    assert ports.release("b") == leased[1]
+    assert ports.release("b") is None
+    assert ports.lease("d") == leased[1]
+
+
+def test_reserve(ports):
+    assert ports.reserve("a", PORT_MIN + 2)
+    assert ports.lease("a") == PORT_MIN + 2
+    assert not ports.reserve("b", PORT_MIN + 2)
+    assert ports.reserve("a", PORT_MIN + 2)
@@ -0,0 +1,131 @@
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+from tools import port_tool, preview_supervisor
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    monkeypatch.setattr(port_tool, "PREVIEW_PORT_MIN", 47310)
+    monkeypatch.setattr(port_tool, "PREVIEW_PORT_MAX", 47311)
+    monkeypatch.setattr(port_tool, "LEASES", {})
+    monkeypatch.setattr(preview_supervisor, "PREVIEWS", preview_supervisor.OrderedDict())
+    monkeypatch.setattr(preview_supervisor, "STATS", {k: 0 for k in preview_supervisor.STATS})
+    monkeypatch.setattr(preview_supervisor, "PREVIEW_STOP_GRACE", 2)
+    monkeypatch.setattr(preview_supervisor, "start_reaper", lambda: None)
+    yield preview_supervisor
+    preview_supervisor.stop_all()
+
+
+def add_preview(slug: str, last_access: float = None, cmd=("sleep", "30")) -> int:
+    """Register a stand-in dev server (a sleeping process) for slug on a leased port."""
+    port = port_tool.lease(slug)
+    popen = subprocess.Popen(list(cmd), start_new_session=True)
+    now = time.time()
+    preview_supervisor.PREVIEWS[slug] = {
+        "slug": slug, "repo_path": "", "port": port, "log_path": "", "popen": popen,
+        "pid": popen.pid, "started": now, "last_access": last_access or now,
+    }
+    return port
+
+
+def test_idle_stop_releases_port(supervisor, monkeypatch):
+    monkeypatch.setattr(supervisor, "PREVIEW_IDLE_TIMEOUT", 60)
+    idle_port = add_preview("idle", last_access=time.time() - 120)
+    add_preview("busy")
+    with pytest.raises(RuntimeError):
+        port_tool.lease("third")
+
+    supervisor.reap()
+
+    assert not supervisor.is_live("idle")
+    assert supervisor.is_live("busy")
+    assert port_tool.get("idle") is None
+    assert port_tool.lease("third") == idle_port
+
+
+def test_exited_preview_releases_port(supervisor):
+    add_preview("crashed")
+    supervisor.PREVIEWS["crashed"]["popen"].kill()
+    supervisor.PREVIEWS["crashed"]["popen"].wait()
+
+    supervisor.reap()
+
+    assert port_tool.get("crashed") is None
+
+
+def test_eviction_releases_port(supervisor, monkeypatch, tmp_path):
+    monkeypatch.setattr(supervisor, "PREVIEW_MAX_LIVE", 1)
+    old_port = add_preview("old")
+    new_port = port_tool.lease("new")
+
+    supervisor.start("new", str(tmp_path), new_port, str(tmp_path / "dev_server.log"))
+
+    assert "old" not in supervisor.PREVIEWS
+    assert port_tool.get("old") is None
+    assert port_tool.lease("another") == old_port
+
+
+def test_restart_keeps_port(supervisor, tmp_path):
+    port = add_preview("app")
+
+    supervisor.start("app", str(tmp_path), port, str(tmp_path / "dev_server.log"))
+
+    assert port_tool.get("app") == port
+
+
+def test_eviction_does_not_hold_the_lock(supervisor, monkeypatch, tmp_path):
+    monkeypatch.setattr(supervisor, "PREVIEW_MAX_LIVE", 1)
+    monkeypatch.setattr(supervisor, "PREVIEW_STOP_GRACE", 1)
+    # Ignores SIGTERM, so stopping it takes the whole grace period
+    add_preview("stubborn", cmd=("sh", "-c", "trap '' TERM; sleep 30 & wait"))
+    time.sleep(0.2)
+    port = port_tool.lease("new")
+    starter = threading.Thread(target=supervisor.start, args=("new", str(tmp_path), port, str(tmp_path / "dev_server.log")))
+
+    starter.start()
+    time.sleep(0.3)
+    waited = time.time()
+    supervisor.stats()  # takes the lock
+    waited = time.time() - waited
+    starter.join()
+
+    assert waited < 0.5
+    assert supervisor.STATS["evicted"] == 1
+    assert "stubborn" not in supervisor.PREVIEWS
+
+
+def test_reaper_keeps_the_port_of_a_restarted_preview(supervisor, monkeypatch):
+    port = add_preview("app")
+    stale = supervisor.PREVIEWS["app"]
+    stale["popen"].kill()
+    stale["popen"].wait()
+    # Restarted (e.g. by /preview/{slug}) after the reaper took its snapshot
+    popen = subprocess.Popen(["sleep", "30"], start_new_session=True)
+    supervisor.PREVIEWS["app"] = {**stale, "popen": popen, "pid": popen.pid}
+    monkeypatch.setattr(supervisor.PREVIEWS, "values", lambda: [stale])
+
+    supervisor.reap()
+
+    assert supervisor.is_live("app")
+    assert port_tool.get("app") == port
+    assert supervisor.STATS["exited"] == 0
+
+
+def test_limits_are_applied_from_the_parent(supervisor, monkeypatch):
+    resource = pytest.importorskip("resource")
+    monkeypatch.setattr(supervisor, "PREVIEW_NOFILE", 256)
+    monkeypatch.setattr(supervisor, "PREVIEW_NICE", 3)
+    popen = subprocess.Popen(["sleep", "30"], start_new_session=True)
+    try:
+        supervisor._limit(popen.pid)
+
+        assert resource.prlimit(popen.pid, resource.RLIMIT_NOFILE)[0] == 256
+        assert os.getpriority(os.PRIO_PROCESS, popen.pid) == min(19, os.getpriority(os.PRIO_PROCESS, 0) + 3)
+    finally:
+        popen.kill()
+        popen.wait()
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # ui.main creates its client at import
+
+from tools.run_store import RunStore  # noqa: E402
+from ui import jobs, main  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "RUNS", RunStore(str(tmp_path / "runs.sqlite")))
+    monkeypatch.setattr(main, "detect_intent", lambda prompt, slug=None: {"action": "build", "slug": None, "details": prompt})
+    return TestClient(main.app)
+
+
+def test_rejected_build_leaves_no_run(client, monkeypatch):
+    def queue_full(kind, state, slug=None):
+        raise jobs.QueueFullError("job queue is full")
+    monkeypatch.setattr(jobs, "submit", queue_full)
+
+    response = client.post("/process", data={"prompt": "a todo app"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "30"
+    assert len(main.RUNS) == 0
+
+
+def test_accepted_build_records_the_run(client, monkeypatch):
+    submitted = []
+
+    def submit(kind, state, slug=None):
+        submitted.append(slug)
+        return {"id": "j1", "slug": slug, "status": "queued"}
+    monkeypatch.setattr(jobs, "submit", submit)
+
+    response = client.post("/process", data={"prompt": "a todo app"})
+
+    assert response.status_code == 200
+    assert list(main.RUNS) == submitted
+
+
+def test_edit_result_is_merged_into_the_run(client, monkeypatch):
+    main.RUNS["app"] = {"slug": "app", "prod_build": "done", "thread_id": "app-old", "user_prompt": "a todo app"}
+    deleted = []
+    monkeypatch.setattr(main.run_store, "track_thread", lambda thread_id: None)
+    monkeypatch.setattr(main.run_store, "delete_checkpoints", deleted.append)
+    monkeypatch.setattr(main, "run_graph", lambda state, **kwargs: {"slug": "app", "repo_path": "/tmp/app", "last_error": "boom"})
+
+    result = main.run_pipeline({"slug": "app", "graph_kind": "edit"})
+
+    assert main.RUNS["app"] == result
+    assert result["prod_build"] == "done" and result["user_prompt"] == "a todo app"
+    assert result["pipeline_status"] == "failed" and result["thread_id"] != "app-old"
+    assert deleted == ["app-old"]
@@ -0,0 +1,80 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+from tools import readiness
+
+NO_SERVER = "http://127.0.0.1:9"
+
+
+def alive():
+    return True
+
+
+def append_later(path, text, delay=0.2):
+    def write():
+        time.sleep(delay)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+    threading.Thread(target=write, daemon=True).start()
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "dev_server.log"
+    path.write_text("")
+    return str(path)
+
+
+def test_ready_line_in_log(log):
+    append_later(log, "  ▲ Next.js 14.2.3\n ✓ Ready in 1.2s\n")
+
+    result = readiness.wait_ready(None, log, NO_SERVER, timeout=5, is_alive=alive)
+
+    assert result["ready"] and result["via"] == "log"
+    assert "Ready in" in result["reason"]
+
+
+def test_output_before_offset_is_ignored(log):
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(" ✓ Ready in 0.9s\n")  # from the previous server
+
+    result = readiness.wait_ready(None, log, NO_SERVER, offset=readiness.log_offset(log), timeout=0.5, is_alive=alive)
+
+    assert not result["ready"]
+    assert "not ready after" in result["reason"]
+
+
+def test_fatal_line_fails_fast(log):
+    append_later(log, "Error: listen EADDRINUSE: address already in use :::3000\n")
+
+    result = readiness.wait_ready(None, log, NO_SERVER, timeout=10, is_alive=alive)
+
+    assert not result["ready"] and "EADDRINUSE" in result["reason"]
+    assert result["seconds"] < 5
+
+
+def test_exited_process_fails_fast(log):
+    with open(log, "a", encoding="utf-8") as f:
+        f.write("> next dev\nsh: 1: next: not found")
+
+    result = readiness.wait_ready(None, log, NO_SERVER, timeout=10, is_alive=lambda: False)
+
+    assert not result["ready"]
+    assert result["reason"].startswith("dev server exited") and "next: not found" in result["reason"]
+
+
+def test_http_probe_when_the_log_is_silent(log):
+    server = http.server.HTTPServer(("127.0.0.1", 0), http.server.BaseHTTPRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        result = readiness.wait_ready(None, log, url, timeout=5, is_alive=alive)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result["ready"] and result["via"] == "http"
+    assert not readiness.probe(NO_SERVER)
@@ -0,0 +1,120 @@
+import time
+from collections import OrderedDict
+
+import pytest
+
+from tools.run_store import RunStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "runs.sqlite")
+
+
+def test_mapping_round_trip(path):
+    runs = RunStore(path)
+    runs["a"] = {"slug": "a", "run_url": "http://localhost:3000"}
+    runs["b"] = {"slug": "b"}
+
+    assert runs["a"]["run_url"] == "http://localhost:3000"
+    assert "a" in runs and "c" not in runs
+    assert list(runs) == ["a", "b"] and len(runs) == 2
+    del runs["a"]
+    assert "a" not in runs
+    with pytest.raises(KeyError):
+        runs["a"]
+    with pytest.raises(KeyError):
+        del runs["a"]
+
+
+def test_runs_survive_a_restart(path):
+    RunStore(path)["a"] = {"slug": "a", "task_log": [{"node": "Builder", "status": "ok"}]}
+
+    assert RunStore(path)["a"]["task_log"][0]["node"] == "Builder"
+
+
+def test_update_run_merges(path):
+    runs = RunStore(path)
+    runs["a"] = {"slug": "a", "port": 3000}
+
+    state = runs.update_run("a", {"run_url": "http://localhost:3000"})
+
+    assert state == {"slug": "a", "port": 3000, "run_url": "http://localhost:3000"}
+    assert RunStore(path)["a"] == state
+    assert runs.update_run("new", {"slug": "new"}) == {"slug": "new"}
+
+
+def test_cache_is_bounded_and_not_stale(path):
+    mine, other = RunStore(path, cache_size=2), RunStore(path)
+    for slug in ("a", "b", "c"):
+        mine[slug] = {"slug": slug}
+    assert len(mine._cache) == 2
+
+    other["c"] = {"slug": "c", "changed_by": "other worker"}
+    assert mine["c"]["changed_by"] == "other worker"
+
+    del other["b"]
+    assert "b" not in mine
+    with pytest.raises(KeyError):
+        mine["b"]
+
+
+def test_values_are_json(path):
+    runs = RunStore(path)
+    runs["a"] = {"when": object()}
+
+    assert isinstance(RunStore(path)["a"]["when"], str)
+
+
+def _checkpoint(saver, thread_id):
+    from langgraph.checkpoint.base import empty_checkpoint
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    saver.put(config, empty_checkpoint(), {"source": "input", "step": -1}, {})
+    return config
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def checkpoints(request, monkeypatch, tmp_path):
+    from tools import run_store
+    if request.param == "memory":
+        monkeypatch.setattr(run_store, "SqliteSaver", None)
+    elif run_store.SqliteSaver is None:
+        pytest.skip("langgraph-checkpoint-sqlite not installed")
+    monkeypatch.setattr(run_store, "CHECKPOINT_PATH", str(tmp_path / "checkpoints.sqlite"))
+    monkeypatch.setattr(run_store, "_checkpointer", None)
+    monkeypatch.setattr(run_store, "_threads", OrderedDict())
+    monkeypatch.setattr(run_store, "_threads_conn", None)
+    return run_store
+
+
+def test_checkpoints_beyond_the_cap_are_pruned(checkpoints, monkeypatch):
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_MAX_THREADS", 2)
+    saver = checkpoints.checkpointer()
+    configs = {}
+    for thread_id in ("t1", "t2", "t3"):
+        checkpoints.track_thread(thread_id)
+        configs[thread_id] = _checkpoint(saver, thread_id)
+        time.sleep(0.01)
+    checkpoints.track_thread("t4")
+
+    assert saver.get_tuple(configs["t1"]) is None and saver.get_tuple(configs["t2"]) is None
+    assert saver.get_tuple(configs["t3"]) is not None
+
+
+def test_old_checkpoints_are_pruned(checkpoints, monkeypatch):
+    saver = checkpoints.checkpointer()
+    checkpoints.track_thread("old")
+    config = _checkpoint(saver, "old")
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_MAX_AGE", 0)
+
+    assert checkpoints.prune_checkpoints() == 1
+    assert saver.get_tuple(config) is None
+    assert checkpoints.prune_checkpoints() == 0
+
+
+def test_deleted_checkpoints_leave_the_registry(checkpoints):
+    checkpoints.track_thread("done")
+    checkpoints.delete_checkpoints("done")
+
+    assert checkpoints._expired_threads() == []
+    assert "done" not in checkpoints._threads
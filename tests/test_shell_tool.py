@@ -0,0 +1,72 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from tools import shell_tool
+
+
+@pytest.fixture(autouse=True)
+def short_grace(monkeypatch):
+    monkeypatch.setattr(shell_tool, "PHASE_KILL_GRACE", 1)
+
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+
+def test_only_a_tail_is_kept_but_everything_is_logged(tmp_path, monkeypatch):
+    monkeypatch.setattr(shell_tool, "PHASE_TAIL_LINES", 5)
+    log_path = str(tmp_path / "logs" / "install.log")
+    lines = []
+
+    result = shell_tool.run_phase(python("import sys\nfor i in range(100): print(i)\nsys.stderr.write('oops\\n')"),
+                                  name="install", log_path=log_path, on_line=lambda stream, line: lines.append((stream, line)))
+
+    assert result["status"] == "ok" and result["exit_code"] == 0
+    assert result["stdout_tail"].split("\n") == ["95", "96", "97", "98", "99"]
+    assert result["stderr_tail"] == "oops"
+    assert len(lines) == 101 and ("stderr", "oops") in lines
+    log = open(log_path).read()
+    assert "\n0\n" in log and "=== install: ok (exit 0)" in log
+
+
+def test_failed_command():
+    result = shell_tool.run_phase(python("import sys; sys.exit(3)"))
+
+    assert result["status"] == "failed" and result["exit_code"] == 3
+
+
+def test_missing_command():
+    result = shell_tool.run_phase(["no-such-command-here"])
+
+    assert result["status"] == "failed" and result["exit_code"] == 127
+
+
+def test_timeout_stops_the_phase():
+    start = time.time()
+
+    result = shell_tool.run_phase(python("import time; print('started', flush=True); time.sleep(30)"), name="build", timeout=0.5)
+
+    assert time.time() - start < 10
+    assert result["status"] == "timeout" and result["exit_code"] == 124
+    assert result["stdout_tail"] == "started"
+    assert result["stderr_tail"].endswith("build timed out after 0.5s")
+
+
+def test_cancel_stops_the_phase():
+    shell_tool.clear_cancel("app")
+    threading.Timer(0.3, shell_tool.cancel, args=("app",)).start()
+    start = time.time()
+
+    result = shell_tool.run_phase(python("import time; time.sleep(30)"), name="install", cancel_key="app")
+
+    assert time.time() - start < 10
+    assert result["status"] == "cancelled" and result["exit_code"] == 130
+    shell_tool.clear_cancel("app")
+
+
+def test_tail():
+    assert shell_tool.tail("a\nb\nc", 2) == "b\nc"
+    assert shell_tool.tail("a\nb", 5) == "a\nb"
@@ -0,0 +1,113 @@
+from tools import validator
+from tools.validator import scan_brackets
+
+PAGE = """import Head from 'next/head';
+
+export default function Pricing({ plans }) {
+  const total = plans.reduce((sum, p) => sum + p.price, 0);
+  return (
+    <div className="p-6">
+      <Head><title>Pricing (beta)</title></Head>
+      <ol>
+        <li>1) Pick a plan :)</li>
+        <li>Don't worry [we'll help]</li>
+        {plans.map((p) => (
+          <li key={p.id} title="a ) in an attribute">{p.name} {`(${p.price})`}</li>
+        ))}
+      </ol>
+      <>
+        <p>Total: {total > 0 ? <b>{total}</b> : 'free'}</p>
+        <br />
+      </>
+    </div>
+  );
+}
+"""
+
+
+def messages(rel_path, source):
+    return [e["message"] for e in scan_brackets(rel_path, source)]
+
+
+def test_jsx_text_is_not_scanned():
+    assert scan_brackets("pages/pricing.js", PAGE) == []
+
+
+def test_strings_templates_and_comments_are_skipped():
+    source = (
+        "const a = ')';\n"
+        "const b = \"]\";\n"
+        "const c = `{ ${a + `(${b})`} [`;\n"
+        "// closing ) in a comment\n"
+        "/* { and ( in a\n   block comment */\n"
+        "if (a < b && b > c) { call(a); }\n"
+    )
+    assert scan_brackets("lib/util.js", source) == []
+
+
+def test_unbalanced_code_is_reported():
+    assert messages("lib/a.js", "function f() {\n  return g(1;\n}\n") == ["unexpected '}'"]
+    assert scan_brackets("lib/b.js", "const x = [1, 2;\n")[0]["line"] == 1
+    assert messages("lib/c.js", "const t = `open ${x}\n") == ["unterminated template literal"]
+
+
+def test_unbalanced_jsx_expression_is_reported():
+    source = "export default function A() {\n  return <div>{items.map((i) => i)</div>;\n}\n"
+    assert scan_brackets("pages/a.js", source) == [
+        {"path": "pages/a.js", "line": 2, "message": "JSX element '<div>' is never closed"}
+    ]
+
+
+def test_unclosed_jsx_element_is_reported():
+    source = "export default function A() {\n  return (\n    <div>\n      <p>text</div>\n  );\n}\n"
+    assert messages("pages/a.jsx", source) == ["unexpected '</div>', expected '</p>'"]
+
+
+def test_generics_and_comparisons_are_not_jsx():
+    source = (
+        "const [items, setItems] = useState<string[]>([]);\n"
+        "const pick = <T,>(xs: T[]) => xs[0];\n"
+        "const small = items.length < 3;\n"
+    )
+    assert scan_brackets("components/list.tsx", source) == []
+
+
+def test_css_brackets():
+    assert scan_brackets("styles/a.css", ".a { color: red; }\n") == []
+    assert messages("styles/b.css", ".a { color: red;\n") == ["'{' is never closed"]
+
+
+def test_check_syntax_falls_back_to_scanner(monkeypatch):
+    monkeypatch.setattr(validator, "esprima", None)
+    assert validator.check_syntax("pages/pricing.js", PAGE) == []
+
+
+def test_regex_literals_are_skipped():
+    source = (
+        "const paren = /\\(/g;\n"
+        "const cls = /[)\\]}]+/;\n"
+        "const slash = /\\/(\\w+)/i.test(path);\n"
+        "function f(s) { return /^\\s*[{(]/.test(s); }\n"
+        "const half = total / 2 / (count || 1);\n"
+        "const ratio = (a) / (b);\n"
+    )
+    assert scan_brackets("lib/re.js", source) == []
+
+
+def test_regex_like_division_is_still_scanned():
+    assert messages("lib/div.js", "const x = a / (b;\n") == ["'(' is never closed"]
+
+
+def test_imports_in_comments_and_strings_are_ignored(tmp_path):
+    source = (
+        "import React from 'react';\n"
+        "// import Chart from 'chart.js';\n"
+        "/* import { motion } from 'framer-motion'; */\n"
+        "const help = \"run: import x from 'lodash'\";\n"
+        "const code = `import dayjs from 'dayjs'`;\n"
+        "const lazy = () => import('./missing');\n"
+    )
+    errors = validator.check_imports(str(tmp_path), "pages/index.js", source, {"react"})
+
+    assert [e["message"] for e in errors] == ["cannot resolve import './missing'"]
+    assert errors[0]["line"] == 6
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from tools import workspace_pool
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    template = tmp_path / "template"
+    template.mkdir()
+    (template / "package.json").write_text("{}")
+    monkeypatch.setattr(workspace_pool, "TEMPLATE_DIR", str(template))
+    monkeypatch.setattr(workspace_pool, "WORKSPACE_POOL_DIR", str(tmp_path / "pool"))
+    monkeypatch.setattr(workspace_pool, "WORKSPACE_POOL", True)
+    monkeypatch.setattr(workspace_pool, "STATS", {k: 0 for k in workspace_pool.STATS})
+    os.makedirs(tmp_path / "pool")
+    return tmp_path
+
+
+def add_ready(pool, name="a") -> str:
+    path = pool / "pool" / f"ready-{workspace_pool.template_fingerprint()}-{name}"
+    path.mkdir()
+    (path / "package.json").write_text("{}")
+    return str(path)
+
+
+def test_claim_moves_a_ready_workspace(pool):
+    add_ready(pool)
+    dest = pool / "run"
+    dest.mkdir()
+
+    assert workspace_pool.claim(str(dest))
+    assert (dest / "package.json").exists()
+    assert not workspace_pool.claim(str(pool / "run2"))
+    assert workspace_pool.stats()["hit_ratio"] == 0.5
+
+
+def test_stale_template_is_not_claimed(pool):
+    stale = pool / "pool" / "ready-000000000000-a"
+    stale.mkdir()
+
+    assert not workspace_pool.claim(str(pool / "run"))
+    assert workspace_pool.stats()["hit_ratio"] == 0.0
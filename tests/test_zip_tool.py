@@ -0,0 +1,94 @@
+import io
+import os
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # ui.main creates its client at import
+
+from tools import zip_tool  # noqa: E402
+from tools.run_store import RunStore  # noqa: E402
+from ui import main  # noqa: E402
+
+
+@pytest.fixture
+def app_dir(tmp_path):
+    root = tmp_path / "app"
+    (root / "pages").mkdir(parents=True)
+    (root / "pages" / "index.js").write_text("export default () => null;\n" * 5000)
+    (root / "package.json").write_text('{"name": "app"}\n')
+    (root / "components" / "dist").mkdir(parents=True)
+    (root / "components" / "dist" / "x.js").write_text("x")
+    (root / "node_modules" / "react").mkdir(parents=True)
+    (root / "node_modules" / "react" / "index.js").write_text("react")
+    (root / ".env").write_text("SECRET=1")
+    (root / "dev_server.log").write_text("log")
+    return root
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(zip_tool, "EXPORT_CACHE_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(zip_tool, "STATS", dict.fromkeys(zip_tool.STATS, 0))
+    return tmp_path / "exports"
+
+
+def test_stream_contains_only_the_sources(app_dir, cache_dir):
+    data = b"".join(zip_tool.stream_zip(str(app_dir)))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert sorted(zf.namelist()) == ["package.json", "pages/index.js"]
+        assert zf.read("pages/index.js") == (app_dir / "pages" / "index.js").read_bytes()
+
+
+def test_stream_is_chunked_and_cached_under_its_key(app_dir, cache_dir, monkeypatch):
+    monkeypatch.setattr(zip_tool, "CHUNK_SIZE", 1024)
+    key = zip_tool.export_key(str(app_dir))
+
+    chunks = list(zip_tool.stream_zip(str(app_dir), key))
+
+    assert len(chunks) > 1
+    assert zip_tool.cached_export(key) == str(cache_dir / f"{key}.zip")
+    assert (cache_dir / f"{key}.zip").read_bytes() == b"".join(chunks)
+
+
+def test_interrupted_stream_leaves_nothing_cached(app_dir, cache_dir, monkeypatch):
+    monkeypatch.setattr(zip_tool, "CHUNK_SIZE", 1024)
+    stream = zip_tool.stream_zip(str(app_dir), "abc")
+    next(stream)
+    stream.close()
+
+    assert os.listdir(cache_dir) == []
+    assert zip_tool.cached_export("abc") is None
+
+
+def test_key_follows_included_files_only(app_dir):
+    key = zip_tool.export_key(str(app_dir))
+    (app_dir / "node_modules" / "react" / "index.js").write_text("changed")
+    (app_dir / "dev_server.log").write_text("more log")
+    assert zip_tool.export_key(str(app_dir)) == key
+
+    (app_dir / "pages" / "index.js").write_text("export default () => 1;\n")
+    assert zip_tool.export_key(str(app_dir)) != key
+
+
+def test_export_route_uses_the_etag_and_cache(app_dir, cache_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "RUNS", RunStore(str(tmp_path / "runs.sqlite")))
+    main.RUNS["app"] = {"slug": "app", "repo_path": str(app_dir), "prod_build": "done"}
+    client = TestClient(main.app)
+
+    first = client.get("/export/app")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["x-export-cache"] == "miss"
+    assert zipfile.ZipFile(io.BytesIO(first.content)).namelist()
+
+    again = client.get("/export/app")
+    assert again.headers["x-export-cache"] == "hit" and again.headers["etag"] == etag
+    assert again.content == first.content
+
+    assert client.get("/export/app", headers={"If-None-Match": etag}).status_code == 304
+
+    (app_dir / "package.json").write_text('{"name": "renamed"}\n')
+    changed = client.get("/export/app", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
@@ -0,0 +1,118 @@
+import os
+import shutil
+import hashlib
+import threading
+from collections import deque
+from tools import dep_store
+
+# "keep" reuses repo/.next/cache between builds while its fingerprint matches;
+# "clean" restores the old behaviour of wiping .next before every build.
+BUILD_CACHE_MODE = os.environ.get("BUILD_CACHE_MODE", "keep")
+FINGERPRINT_FILE = ".lovable-fingerprint"
+
+# Files whose changes invalidate the compiler cache
+CONFIG_FILES = (
+    "next.config.js", "next.config.mjs", "next.config.ts",
+    "tailwind.config.js", "tailwind.config.ts",
+    "postcss.config.js", "postcss.config.mjs",
+    "tsconfig.json", "jsconfig.json",
+    ".babelrc", "babel.config.js",
+)
+
+TIMINGS = {"cold": deque(maxlen=100), "warm": deque(maxlen=100)}
+_timings_lock = threading.Lock()
+
+
+def _installed_next_version(repo_path: str) -> str:
+    try:
+        with open(os.path.join(repo_path, "node_modules", "next", "package.json"), "r", encoding="utf-8") as f:
+            for line in f:
+                if '"version"' in line:
+                    return line.split(":", 1)[1].strip().strip('",')
+    except OSError:
+        pass
+    return "missing"
+
+
+def fingerprint(repo_path: str) -> str:
+    """
+    Fingerprint of everything the compiler cache depends on: dependency set,
+    node version, installed Next.js version and the build config files.
+    """
+    h = hashlib.sha256()
+    h.update(f"deps={dep_store.manifest_hash(repo_path)};next={_installed_next_version(repo_path)}".encode("utf-8"))
+    for name in CONFIG_FILES:
+        path = os.path.join(repo_path, name)
+        if os.path.isfile(path):
+            h.update(name.encode("utf-8"))
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()[:24]
+
+
+def prepare(repo_path: str) -> str:
+    """
+    Get repo_path/.next ready for `next build`. Keeps the existing cache when its
+    fingerprint still matches, otherwise wipes .next and stamps a fresh cache dir.
+    Returns: "warm" or "cold".
+    """
+    next_dir = os.path.join(repo_path, ".next")
+    cache_dir = os.path.join(next_dir, "cache")
+    marker = os.path.join(cache_dir, FINGERPRINT_FILE)
+    current = fingerprint(repo_path)
+
+    if BUILD_CACHE_MODE != "clean" and os.path.isfile(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            if f.read().strip() == current:
+                return "warm"
+
+    if os.path.exists(next_dir):
+        shutil.rmtree(next_dir, ignore_errors=True)
+        print(f"Cleared Next.js cache at {next_dir}")
+    # Whatever the next build writes into the cache is valid for this fingerprint
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(current)
+    return "cold"
+
+
+def stash(repo_path: str):
+    """
+    Move repo_path/.next/cache out of a workspace that is about to be wiped.
+    Returns the stash path, or None if there was no cache.
+    """
+    cache_dir = os.path.join(repo_path, ".next", "cache")
+    if not os.path.isfile(os.path.join(cache_dir, FINGERPRINT_FILE)):
+        return None
+    stash_dir = f"{os.path.abspath(repo_path)}.next-cache"
+    shutil.rmtree(stash_dir, ignore_errors=True)
+    shutil.move(cache_dir, stash_dir)
+    return stash_dir
+
+
+def restore(stash_dir: str, repo_path: str):
+    """Put a stashed cache back into the (re-created) workspace."""
+    if not stash_dir or not os.path.isdir(stash_dir):
+        return
+    cache_dir = os.path.join(repo_path, ".next", "cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+    shutil.move(stash_dir, cache_dir)
+
+
+def record(slug: str, kind: str, seconds: float):
+    with _timings_lock:
+        TIMINGS[kind].append({"slug": slug, "seconds": round(seconds, 2)})
+    print(f"Build timing: {slug} {kind} build took {seconds:.2f}s")
+
+
+def summary() -> dict:
+    """Average cold and warm build durations, and the saving per warm build."""
+    out = {}
+    with _timings_lock:
+        for kind, items in TIMINGS.items():
+            seconds = [t["seconds"] for t in items]
+            out[kind] = {"count": len(seconds), "avg_seconds": round(sum(seconds) / len(seconds), 2) if seconds else None}
+    if out["cold"]["avg_seconds"] is not None and out["warm"]["avg_seconds"] is not None:
+        out["saving_seconds"] = round(out["cold"]["avg_seconds"] - out["warm"]["avg_seconds"], 2)
+    return out
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+# Shared state for running several API workers and build hosts against one
+# run registry. With COORD_BACKEND=sqlite every process opens the same SQLite
+# file (on a shared volume for several hosts) which holds:
+#   nodes   - live workers, refreshed by a heartbeat
+#   leases  - slug -> owning node; the owner runs the slug's jobs and serves
+#             its workspace and preview; leases of dead nodes expire
+#   jobs    - the shared job queue; workers claim jobs for slugs they own or
+#             that nobody owns
+#   ports   - preview ports, so workers never hand out the same one
+# The default "local" backend keeps everything in process, as before.
+COORD_BACKEND = os.environ.get("COORD_BACKEND", "local")
+COORD_DB_PATH = os.path.abspath(os.environ.get("COORD_DB_PATH", os.path.join("work", ".coord.sqlite")))
+LEASE_TTL = float(os.environ.get("LEASE_TTL", "30"))
+NODE_ID = os.environ.get("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# Base URL other nodes redirect to for this node's workspaces; nodes sharing a
+# URL (workers of one host) share the filesystem and serve each other's slugs
+NODE_URL = (os.environ.get("NODE_URL") or "").rstrip("/")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, url TEXT, heartbeat REAL NOT NULL, started REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (slug TEXT PRIMARY KEY, node_id TEXT NOT NULL, expires REAL NOT NULL, acquired REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS ports (port INTEGER PRIMARY KEY, slug TEXT NOT NULL UNIQUE, node_id TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, kind TEXT NOT NULL, slug TEXT, status TEXT NOT NULL, payload TEXT, result TEXT,
+    error TEXT, node_id TEXT, created REAL NOT NULL, started REAL, finished REAL, cancel INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_events (job_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, PRIMARY KEY (job_id, seq));
+"""
+JOB_FIELDS = ("id", "kind", "slug", "status", "payload", "result", "error", "node_id", "created", "started", "finished")
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+_heartbeat = None
+
+
+def enabled() -> bool:
+    return COORD_BACKEND == "sqlite"
+
+
+def _db() -> sqlite3.Connection:
+    """Connection of the calling thread; autocommit, with explicit BEGIN IMMEDIATE for read-modify-write."""
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(COORD_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(COORD_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready = True
+        _local.conn = conn
+    return conn
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error): one writer at a time across processes."""
+
+    def __enter__(self):
+        self.conn = _db()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# === Nodes ===
+
+def register_node():
+    now = time.time()
+    with _transaction() as db:
+        db.execute("INSERT OR REPLACE INTO nodes (node_id, url, heartbeat, started) VALUES (?, ?, ?, ?)",
+                   (NODE_ID, NODE_URL, now, now))
+
+
+def heartbeat() -> list:
+    """
+    Mark this node alive and extend its slug leases.
+    Returns the slugs of this node's running jobs that were asked to cancel.
+    """
+    now = time.time()
+    with _transaction() as db:
+        db.execute("UPDATE nodes SET heartbeat = ? WHERE node_id = ?", (now, NODE_ID))
+        db.execute("UPDATE leases SET expires = ? WHERE node_id = ?", (now + LEASE_TTL, NODE_ID))
+        rows = db.execute("SELECT slug FROM jobs WHERE node_id = ? AND status = 'running' AND cancel = 1", (NODE_ID,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def start_heartbeat(on_cancel=None):
+    """Register this node and refresh it every LEASE_TTL/3 seconds; on_cancel(slug) handles remote cancel requests."""
+    global _heartbeat
+    if not enabled() or _heartbeat is not None:
+        return
+    register_node()
+
+    def loop():
+        while True:
+            try:
+                for slug in heartbeat():
+                    if on_cancel:
+                        on_cancel(slug)
+            except Exception as e:
+                print(f"coordination: heartbeat failed: {e}")
+            time.sleep(LEASE_TTL / 3)
+
+    _heartbeat = threading.Thread(target=loop, name="coord-heartbeat", daemon=True)
+    _heartbeat.start()
+    print(f"coordination: node {NODE_ID} ({NODE_URL or 'no url'}) joined {COORD_DB_PATH}")
+
+
+def live_nodes() -> list:
+    rows = _db().execute("SELECT node_id, url, heartbeat, started FROM nodes WHERE heartbeat > ?",
+                         (time.time() - LEASE_TTL,)).fetchall()
+    return [{"node_id": r[0], "url": r[1], "heartbeat": r[2], "started": r[3]} for r in rows]
+
+
+# === Slug leases ===
+
+def acquire(slug: str, db=None) -> bool:
+    """Take or renew the lease on slug. Fails if another live node holds it."""
+    if db is None:
+        with _transaction() as db:
+            return acquire(slug, db)
+    now = time.time()
+    row = db.execute("SELECT node_id, expires FROM leases WHERE slug = ?", (slug,)).fetchone()
+    if row and row[0] != NODE_ID and row[1] > now:
+        return False
+    acquired = now if not row or row[0] != NODE_ID else db.execute(
+        "SELECT acquired FROM leases WHERE slug = ?", (slug,)).fetchone()[0]
+    db.execute("INSERT OR REPLACE INTO leases (slug, node_id, expires, acquired) VALUES (?, ?, ?, ?)",
+               (slug, NODE_ID, now + LEASE_TTL, acquired))
+    return True
+
+
+def owner(slug: str):
+    """The live lease on slug as {"node_id", "url", "expires", "local"}, or None."""
+    if not enabled():
+        return None
+    row = _db().execute(
+        "SELECT l.node_id, n.url, l.expires FROM leases l LEFT JOIN nodes n ON n.node_id = l.node_id "
+        "WHERE l.slug = ? AND l.expires > ?", (slug, time.time())).fetchone()
+    if row is None:
+        return None
+    return {"node_id": row[0], "url": row[1] or "", "expires": row[2], "local": row[0] == NODE_ID}
+
+
+def remote_owner(slug: str):
+    """The owner of slug if it is a node on another host (different NODE_URL), else None."""
+    lease = owner(slug)
+    if lease and not lease["local"] and lease["url"] and lease["url"] != NODE_URL:
+        return lease
+    return None
+
+
+def release(slug: str, force: bool = False):
+    """Give up the lease on slug; force also drops another node's lease (e.g. on reset)."""
+    if not enabled():
+        return
+    with _transaction() as db:
+        if force:
+            db.execute("DELETE FROM leases WHERE slug = ?", (slug,))
+        else:
+            db.execute("DELETE FROM leases WHERE slug = ? AND node_id = ?", (slug, NODE_ID))
+
+
+# === Ports ===
+
+def claim_port(slug: str, port: int) -> bool:
+    """Record port as slug's preview port unless a live node's slug already has it."""
+    with _transaction() as db:
+        row = db.execute("SELECT p.slug, n.heartbeat FROM ports p LEFT JOIN nodes n ON n.node_id = p.node_id "
+                         "WHERE p.port = ?", (port,)).fetchone()
+        if row and row[0] != slug and (row[1] or 0) > time.time() - LEASE_TTL:
+            return False
+        db.execute("DELETE FROM ports WHERE slug = ? OR port = ?", (slug, port))
+        db.execute("INSERT INTO ports (port, slug, node_id) VALUES (?, ?, ?)", (port, slug, NODE_ID))
+    return True
+
+
+def port_of(slug: str):
+    row = _db().execute("SELECT port FROM ports WHERE slug = ?", (slug,)).fetchone()
+    return row[0] if row else None
+
+
+def release_port(slug: str):
+    with _transaction() as db:
+        db.execute("DELETE FROM ports WHERE slug = ?", (slug,))
+
+
+# === Jobs ===
+
+def _job_from_row(row) -> dict:
+    job = dict(zip(JOB_FIELDS, row))
+    job["payload"] = json.loads(job["payload"]) if job["payload"] else None
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def enqueue_job(job: dict, max_queued: int) -> bool:
+    """Insert a queued job. Returns False (and inserts nothing) when max_queued jobs are already waiting."""
+    with _transaction() as db:
+        queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= max_queued:
+            return False
+        db.execute("INSERT INTO jobs (id, kind, slug, status, payload, created) VALUES (?, ?, ?, 'queued', ?, ?)",
+                   (job["id"], job["kind"], job["slug"], json.dumps(job["payload"], default=str), job["created"]))
+    return True
+
+
+def claim_job(kinds) -> dict:
+    """
+    Claim the oldest queued job this node may run: one whose slug it owns or
+    nobody owns, with no other job of that slug running. Jobs of nodes that
+    stopped heartbeating are put back in the queue first.
+    Returns the job (status "running") or None.
+    """
+    now = time.time()
+    with _transaction() as db:
+        db.execute(
+            "UPDATE jobs SET status = 'queued', node_id = NULL, started = NULL WHERE status = 'running' AND node_id NOT IN "
+            "(SELECT node_id FROM nodes WHERE heartbeat > ?)", (now - LEASE_TTL,))
+        placeholders = ",".join("?" for _ in kinds)
+        rows = db.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) "
+                          "ORDER BY created LIMIT 50", tuple(kinds)).fetchall()
+        for row in rows:
+            job = _job_from_row(row)
+            slug = job["slug"]
+            if slug:
+                busy = db.execute("SELECT 1 FROM jobs WHERE slug = ? AND status = 'running'", (slug,)).fetchone()
+                if busy or not acquire(slug, db):
+                    continue
+            db.execute("UPDATE jobs SET status = 'running', node_id = ?, started = ? WHERE id = ?", (NODE_ID, now, job["id"]))
+            return {**job, "status": "running", "node_id": NODE_ID, "started": now}
+    return None
+
+
+def finish_job(job_id: str, status: str, result: dict, error: str, finished: float):
+    with _transaction() as db:
+        db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, payload = NULL WHERE id = ?",
+                   (status, json.dumps(result, default=str) if result is not None else None, error, finished, job_id))
+
+
+def add_event(job_id: str, event: dict):
+    _db().execute("INSERT OR REPLACE INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+                  (job_id, event["seq"], json.dumps(event, default=str)))
+
+
+def events_since(job_id: str, seq: int) -> list:
+    rows = _db().execute("SELECT event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, seq)).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def get_job(job_id: str):
+    row = _db().execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = _job_from_row(row)
+    job["events"] = events_since(job_id, 0)
+    return job
+
+
+def active_job_for_slug(slug: str):
+    row = _db().execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE slug = ? AND status IN ('queued', 'running') "
+                        "ORDER BY created LIMIT 1", (slug,)).fetchone()
+    return _job_from_row(row) if row else None
+
+
+def request_cancel(job_id: str):
+    with _transaction() as db:
+        db.execute("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+
+
+def job_counts() -> dict:
+    rows = _db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    return dict(rows)
+
+
+def prune_jobs(keep: int):
+    """Drop the oldest finished jobs (and their events) beyond `keep`."""
+    with _transaction() as db:
+        old = db.execute("SELECT id FROM jobs WHERE status IN ('done', 'error') ORDER BY finished DESC LIMIT -1 OFFSET ?",
+                         (keep,)).fetchall()
+        for (job_id,) in old:
+            db.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+def stats() -> dict:
+    if not enabled():
+        return {"backend": COORD_BACKEND, "node_id": NODE_ID}
+    leases = _db().execute("SELECT node_id, COUNT(*) FROM leases WHERE expires > ? GROUP BY node_id", (time.time(),)).fetchall()
+    return {
+        "backend": COORD_BACKEND,
+        "node_id": NODE_ID,
+        "node_url": NODE_URL,
+        "nodes": live_nodes(),
+        "leases": dict(leases),
+        "jobs": job_counts(),
+    }
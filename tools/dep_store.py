@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import subprocess
+import threading
+from tools import repo_tool
+
+# Content-addressed store of installed node_modules trees, keyed by a hash of
+# the normalized dependency sets in package.json.
+DEP_STORE_DIR = os.path.abspath(os.environ.get("DEP_STORE_DIR", os.path.join("work", ".dep-store")))
+DEP_STORE_MAX_ENTRIES = int(os.environ.get("DEP_STORE_MAX_ENTRIES", "8"))
+
+DEP_FIELDS = ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies")
+MARKER = ".lovable-dep-hash"  # written inside a workspace's node_modules after a good install
+COMPLETE = ".complete"        # written inside a store entry once it is fully populated
+
+STATS = {"unchanged": 0, "store": 0, "install": 0}
+
+_node_version = None
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def node_version() -> str:
+    global _node_version
+    if _node_version is None:
+        try:
+            _node_version = subprocess.run(["node", "--version"], capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            _node_version = "unknown"
+    return _node_version
+
+
+def manifest_hash(repo_path: str):
+    """
+    Hash the dependency sets of repo_path/package.json together with the node
+    version and platform. Returns None if the manifest is missing or invalid.
+    """
+    try:
+        with open(os.path.join(repo_path, "package.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict):
+        return None
+
+    deps = {}
+    for field in DEP_FIELDS:
+        value = manifest.get(field)
+        if isinstance(value, dict) and value:
+            deps[field] = {name: str(version) for name, version in sorted(value.items())}
+    payload = json.dumps({"deps": deps, "node": node_version(), "platform": sys.platform}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def installed_hash(repo_path: str):
+    """Manifest hash recorded by the last successful install in this workspace."""
+    try:
+        with open(os.path.join(repo_path, "node_modules", MARKER), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write_marker(repo_path: str, digest: str):
+    marker = os.path.join(repo_path, "node_modules", MARKER)
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(digest)
+
+
+def ensure_installed(repo_path: str, install_fn):
+    """
+    Make sure repo_path/node_modules matches package.json, doing as little work as possible:
+      - "unchanged": the manifest hash equals the last successful install, nothing to do
+      - "store":     a matching tree exists in the store and is linked in
+      - "install":   install_fn() runs (it returns (code, stdout, stderr)) and a
+                     successful result is added to the store in the background
+    Returns: (exit_code, stdout, stderr, source)
+    """
+    with _lock_for(os.path.abspath(repo_path)):
+        digest = manifest_hash(repo_path)
+        node_modules = os.path.join(repo_path, "node_modules")
+
+        if digest and installed_hash(repo_path) == digest and os.path.isdir(node_modules):
+            STATS["unchanged"] += 1
+            return 0, f"dependencies unchanged ({digest})", "", "unchanged"
+
+        entry = os.path.join(DEP_STORE_DIR, digest) if digest else None
+        if entry and os.path.exists(os.path.join(entry, COMPLETE)):
+            try:
+                start = time.time()
+                shutil.rmtree(node_modules, ignore_errors=True)
+                repo_tool.link_tree(os.path.join(entry, "node_modules"), node_modules)
+                _write_marker(repo_path, digest)
+                os.utime(entry)
+                STATS["store"] += 1
+                return 0, f"linked node_modules from store {digest} in {time.time() - start:.2f}s", "", "store"
+            except Exception as e:
+                print(f"dep_store: failed to link {digest}, falling back to install: {e}")
+                shutil.rmtree(node_modules, ignore_errors=True)
+
+        code, out, err = install_fn()
+        STATS["install"] += 1
+        if code == 0 and digest:
+            _write_marker(repo_path, digest)
+            threading.Thread(target=_add_to_store, args=(node_modules, digest), daemon=True).start()
+        return code, out, err, "install"
+
+
+def prefetch(repo_path: str, install_fn):
+    """
+    Start ensure_installed() in a background thread, e.g. as soon as a streamed
+    package.json is complete. A later ensure_installed() call for the same repo
+    waits on the per-repo lock and then finds the dependencies unchanged.
+    """
+    def run():
+        try:
+            code, _, err, source = ensure_installed(repo_path, install_fn)
+            print(f"dep_store: prefetch for {repo_path} finished ({source}, code={code})")
+        except Exception as e:
+            print(f"dep_store: prefetch for {repo_path} failed: {e}")
+
+    thread = threading.Thread(target=run, name=f"dep-prefetch-{os.path.basename(repo_path)}", daemon=True)
+    thread.start()
+    return thread
+
+
+def _add_to_store(node_modules: str, digest: str):
+    entry = os.path.join(DEP_STORE_DIR, digest)
+    with _lock_for(digest):
+        if os.path.exists(os.path.join(entry, COMPLETE)):
+            return
+        tmp = f"{entry}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            start = time.time()
+            os.makedirs(DEP_STORE_DIR, exist_ok=True)
+            shutil.rmtree(tmp, ignore_errors=True)
+            repo_tool.link_tree(node_modules, os.path.join(tmp, "node_modules"),
+                                ignore=shutil.ignore_patterns(MARKER, ".cache"))
+            open(os.path.join(tmp, COMPLETE), "w").close()
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp, entry)
+            print(f"dep_store: stored {digest} in {time.time() - start:.2f}s")
+        except Exception as e:
+            print(f"dep_store: failed to store {digest}: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+    prune()
+
+
+def prune():
+    """Drop the least recently used store entries beyond DEP_STORE_MAX_ENTRIES."""
+    if not os.path.isdir(DEP_STORE_DIR):
+        return
+    entries = []
+    for name in os.listdir(DEP_STORE_DIR):
+        path = os.path.join(DEP_STORE_DIR, name)
+        if os.path.exists(os.path.join(path, COMPLETE)):
+            entries.append((os.path.getmtime(path), name, path))
+    entries.sort()
+    for _, name, path in entries[:max(0, len(entries) - DEP_STORE_MAX_ENTRIES)]:
+        with _lock_for(name):
+            shutil.rmtree(path, ignore_errors=True)
+        print(f"dep_store: evicted {name}")
@@ -1,7 +1,12 @@
 import os
+import re
+import ast
+import json
+import time
+import threading
 from openai import OpenAI
 from dotenv import load_dotenv
-import json
+from tools import llm_cache, metrics
 
 load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -9,14 +14,148 @@ OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
 
 client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 
+# How often each parse path succeeded: strict, fenced, braces, repaired, literal, llm, failed
+PARSE_STATS = {"strict": 0, "fenced": 0, "braces": 0, "repaired": 0, "literal": 0, "llm": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+FENCE_RE = re.compile(r"```(?:json|javascript|js|python)?\s*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def _as_action(value):
+    """Normalize a parsed value into the action dict agent_node expects."""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, list):
+        return {"output": value}
+    return None
+
+
+def _loads(text: str):
+    try:
+        return _as_action(json.loads(text))
+    except (ValueError, TypeError):
+        return None
+
+
+def _repaired(text: str):
+    """Parse JSON with trailing commas (`[1, 2,]`, `{"a": 1,}`) removed."""
+    fixed = TRAILING_COMMA_RE.sub(r"\1", text)
+    return _loads(fixed) if fixed != text else None
+
+
+def _balanced_objects(text: str):
+    """
+    Yield every top-level {...} or [...] span in text, skipping brackets inside
+    JSON/Python string literals. Longest candidates come first.
+    """
+    spans = []
+    depth = 0
+    start = None
+    quote = None
+    escaped = False
+    for i, ch in enumerate(text):
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+            continue
+        if ch in "\"'" and depth > 0:
+            quote = ch
+        elif ch in "{[":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch in "}]" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                spans.append(text[start:i + 1])
+    return sorted(spans, key=len, reverse=True)
+
+
+def _literal(text: str):
+    """Parse Python-literal style output (single quotes, True/None, trailing commas)."""
+    try:
+        return _as_action(ast.literal_eval(text))
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def extract_json(raw_response: str):
+    """
+    Deterministically extract the JSON object from a model reply.
+    Tries, in order: strict JSON, fenced code blocks, balanced-brace scanning,
+    trailing-comma repair of those, and Python-literal repair.
+    Returns (action_dict, path) or (None, None).
+    """
+    text = (raw_response or "").strip()
+    if not text:
+        return None, None
+
+    parsed = _loads(text)
+    if parsed is not None:
+        return parsed, "strict"
+
+    for block in FENCE_RE.findall(text):
+        parsed = _loads(block.strip())
+        if parsed is not None:
+            return parsed, "fenced"
+
+    candidates = _balanced_objects(text)
+    for candidate in candidates:
+        parsed = _loads(candidate)
+        if parsed is not None:
+            return parsed, "braces"
+
+    for candidate in [text, *(block.strip() for block in FENCE_RE.findall(text)), *candidates]:
+        parsed = _repaired(candidate)
+        if parsed is not None:
+            return parsed, "repaired"
+
+    for candidate in candidates:
+        parsed = _literal(candidate)
+        if parsed is not None:
+            return parsed, "literal"
+
+    return None, None
+
+
+def _record(path: str):
+    with _stats_lock:
+        PARSE_STATS[path] += 1
+    metrics.inc("json_parse_total", path=path)
+
+
+def parse_json_with_path(raw_response: str):
+    """
+    Parse a model reply into an action dict, using the LLM repair only when the
+    local parser fails. Returns (action_dict, path) where path is the parse step
+    that succeeded: strict, fenced, braces, repaired, literal, llm or failed.
+    """
+    parsed, path = extract_json(raw_response)
+    if parsed is None:
+        parsed = _llm_parse(raw_response)
+        path = "llm" if parsed.get("output") else "failed"
+    _record(path)
+    print(f"parse_json_response: path={path}")
+    return parsed, path
+
+
 def parse_json_response(raw_response: str) -> dict:
     """
-    Use LLM to parse and fix a potentially malformed JSON response into a clean dictionary.
+    Parse a potentially malformed JSON response into a clean dictionary.
     Assumes the response contains a file map like {'output': {'pages/index.js': '...', ...}}.
     """
-    if not client:
-        raise RuntimeError("OPENAI_API_KEY not set in environment")
-    
+    return parse_json_with_path(raw_response)[0]
+
+
+def _llm_parse(raw_response: str) -> dict:
+    """
+    Use LLM to parse and fix a potentially malformed JSON response into a clean dictionary.
+    """
     system_prompt = (
         "You are a JSON parser. Extract and fix the JSON object from the input. "
         "Ensure the output is a valid JSON object with an 'output' key containing the file map "
@@ -27,14 +166,20 @@ def parse_json_response(raw_response: str) -> dict:
     user_prompt = f"Raw response: {raw_response}"
     
     messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
-    response = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=messages,
-        max_tokens=4096,  # Increased for larger responses
-        temperature=0.0  # Low temperature for deterministic output
-    )
-    
-    cleaned_json_str = response.choices[0].message.content.strip()
+    cache_key, cleaned_json_str = llm_cache.lookup(OPENAI_MODEL, messages, 0.0, 4096, node="JsonRepair")
+    if cleaned_json_str is None:
+        if not client:
+            raise RuntimeError("OPENAI_API_KEY not set in environment")
+        start = time.perf_counter()
+        response = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            max_tokens=4096,  # Increased for larger responses
+            temperature=0.0  # Low temperature for deterministic output
+        )
+        metrics.record_llm("JsonRepair", time.perf_counter() - start, response.usage)
+        cleaned_json_str = response.choices[0].message.content.strip()
+        llm_cache.store(cache_key, cleaned_json_str)
     
     # Parse the cleaned string to a dict
     try:
@@ -45,4 +190,74 @@ def parse_json_response(raw_response: str) -> dict:
         return parsed
     except json.JSONDecodeError:
         print(f"LLM parsing failed to produce valid JSON: {cleaned_json_str}")
-        return {"output": {}}  # Return empty output dict on failure
\ No newline at end of file
+        return {"output": {}}  # Return empty output dict on failure
+
+# Markers `next dev` prints when a recompile finishes or fails
+DEV_OK_MARKERS = ("✓ Compiled", "compiled successfully", "Compiled in", "compiled client and server successfully")
+DEV_ERROR_MARKERS = ("Failed to compile", "⨯ ", "Module not found", "SyntaxError", "Error:", "Unhandled Runtime Error")
+
+
+def dev_log_status(log_text: str, context_lines: int = 20):
+    """
+    Classify new `next dev` output: "error" if an error marker appears after the
+    last successful compile, "ok" if a compile finished cleanly, None if neither
+    shows up yet. Returns (status, detail) where detail is the error excerpt.
+    """
+    lines = log_text.splitlines()
+    last_ok = last_error = -1
+    for i, line in enumerate(lines):
+        if any(m in line for m in DEV_OK_MARKERS):
+            last_ok = i
+        elif any(m in line for m in DEV_ERROR_MARKERS):
+            last_error = i if last_error < last_ok or last_error == -1 else last_error
+    if last_error > last_ok:
+        return "error", "\n".join(lines[last_error:last_error + context_lines])
+    if last_ok >= 0:
+        return "ok", ""
+    return None, ""
+
+
+# File references in Next.js / webpack / SWC / tsc output, e.g. "./pages/index.js:12:5"
+# or ",-[/abs/work/app/pages/index.js:3:1]"
+LOG_PATH_RE = re.compile(r"(?P<path>(?:[A-Za-z]:)?[\w@./\\\[\]-]*[\w\]]\.(?:jsx?|tsx?|mjs|cjs|css|json))(?:[:(](?P<line>\d+)(?:[:,](?P<col>\d+))?)?")
+MISSING_MODULE_RE = re.compile(r"(?:Can't resolve|Cannot find module)\s+'([^']+)'")
+LOG_ERROR_LINE_RE = re.compile(r"(error|⨯|failed to compile|unexpected token|is not defined|not found)", re.IGNORECASE)
+
+
+def analyze_build_log(log_text: str, repo_path: str = None, max_files: int = 6) -> dict:
+    """
+    Pull the actionable parts out of install/build output.
+    Returns {"files": [{"path", "line", "column"}], "missing_modules": [...], "errors": [...]}
+    where paths are relative to repo_path (and exist there, when it is given),
+    in order of first mention; dependency and build output paths are skipped.
+    """
+    root = os.path.abspath(repo_path) if repo_path else None
+    files = {}
+    for match in LOG_PATH_RE.finditer(log_text or ""):
+        path = match.group("path").replace("\\", "/")
+        if "[/" in path:
+            path = path[path.index("[/") + 1:]  # SWC frame ",-[/abs/path.js:3:1]"
+        if root and os.path.isabs(path):
+            if not path.startswith(root.replace("\\", "/") + "/"):
+                continue
+            path = path[len(root) + 1:]
+        path = path.removeprefix("./")
+        if not path or path.startswith(("/", "../")) or path.split("/")[0] in ("node_modules", ".next"):
+            continue
+        if root and not os.path.isfile(os.path.join(root, path)):
+            continue
+        line = int(match.group("line")) if match.group("line") else None
+        entry = files.setdefault(path, {"path": path, "line": None, "column": None})
+        if entry["line"] is None and line is not None:
+            entry["line"] = line
+            entry["column"] = int(match.group("col")) if match.group("col") else None
+        if len(files) >= max_files:
+            break
+
+    missing = list(dict.fromkeys(MISSING_MODULE_RE.findall(log_text or "")))
+    errors = []
+    for line in (log_text or "").splitlines():
+        line = line.strip()
+        if line and LOG_ERROR_LINE_RE.search(line) and line not in errors:
+            errors.append(line[:300])
+    return {"files": list(files.values()), "missing_modules": missing, "errors": errors[:15]}
@@ -0,0 +1,110 @@
+import re
+import json
+
+OUTPUT_RE = re.compile(r'"output"\s*:\s*\{')
+
+
+class FileMapStreamParser:
+    """
+    Incremental parser for streamed replies shaped like
+    {"output": {"path": "content", ...}}.
+
+    feed() takes the next piece of text and returns the (path, content) pairs
+    whose values became complete, so files can be written while the rest of the
+    reply is still being generated. Object or array values (e.g. package.json
+    sent as an object) are returned re-serialized as JSON text. Each character
+    is scanned once.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.mode = "seek"
+        self.key = None
+        self.start = 0
+        self.escaped = False
+        self.depth = 0
+        self.in_string = False
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        done = []
+        if self.mode == "seek":
+            match = OUTPUT_RE.search(self.buffer, max(0, self.pos - 16))
+            if not match:
+                self.pos = len(self.buffer)
+                return done
+            self.pos = match.end()
+            self.mode = "between"
+
+        buf = self.buffer
+        while self.pos < len(buf) and self.mode != "done":
+            ch = buf[self.pos]
+            mode = self.mode
+
+            if mode == "between":
+                if ch == '"':
+                    self.mode, self.start, self.escaped = "key", self.pos + 1, False
+                elif ch == "}":
+                    self.mode = "done"
+            elif mode in ("key", "string"):
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    raw = buf[self.start:self.pos]
+                    if mode == "key":
+                        self.key = self._decode(raw)
+                        self.mode = "colon"
+                    else:
+                        value = self._decode(raw)
+                        if self.key is not None and value is not None:
+                            done.append((self.key, value))
+                        self.mode = "between"
+            elif mode == "colon":
+                if ch == ":":
+                    self.mode = "value"
+            elif mode == "value":
+                if ch == '"':
+                    self.mode, self.start, self.escaped = "string", self.pos + 1, False
+                elif ch in "{[":
+                    self.mode, self.start, self.depth, self.in_string, self.escaped = "nested", self.pos, 1, False, False
+                elif not ch.isspace():
+                    self.mode = "scalar"
+            elif mode == "nested":
+                if self.in_string:
+                    if self.escaped:
+                        self.escaped = False
+                    elif ch == "\\":
+                        self.escaped = True
+                    elif ch == '"':
+                        self.in_string = False
+                elif ch == '"':
+                    self.in_string = True
+                elif ch in "{[":
+                    self.depth += 1
+                elif ch in "}]":
+                    self.depth -= 1
+                    if self.depth == 0:
+                        try:
+                            value = json.loads(buf[self.start:self.pos + 1])
+                            if self.key is not None:
+                                done.append((self.key, json.dumps(value, indent=2)))
+                        except ValueError:
+                            pass
+                        self.mode = "between"
+            elif mode == "scalar":
+                if ch == ",":
+                    self.mode = "between"
+                elif ch == "}":
+                    self.mode = "done"
+            self.pos += 1
+        return done
+
+    @staticmethod
+    def _decode(raw: str):
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return None
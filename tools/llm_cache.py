@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Cache of chat completion texts keyed by model, messages, temperature and
+# max_tokens: a bounded in-memory LRU in front of a SQLite file.
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.path.abspath(os.environ.get("LLM_CACHE_PATH", os.path.join("work", ".llm-cache.sqlite")))
+LLM_CACHE_MAX_ITEMS = int(os.environ.get("LLM_CACHE_MAX_ITEMS", "256"))
+LLM_CACHE_MAX_DISK_ITEMS = int(os.environ.get("LLM_CACHE_MAX_DISK_ITEMS", "5000"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Nodes whose calls are never cached. Fixer replies are not reused by default:
+# a fix that did not work would otherwise be served again on the next retry.
+LLM_CACHE_DISABLED_NODES = {n.strip() for n in os.environ.get("LLM_CACHE_DISABLED_NODES", "Fixer").split(",") if n.strip()}
+
+STATS = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+
+_memory = OrderedDict()  # key -> (created, value)
+_lock = threading.Lock()
+_conn = None
+
+
+def _db():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+        _conn = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        _conn.commit()
+    return _conn
+
+
+def make_key(model: str, messages, temperature, max_tokens) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def enabled_for(node: str = None) -> bool:
+    return LLM_CACHE_ENABLED and node not in LLM_CACHE_DISABLED_NODES
+
+
+def lookup(model: str, messages, temperature, max_tokens, node: str = None):
+    """
+    Look a completion up in memory, then on disk.
+    Returns (key, value); key is None when caching is disabled for `node`, and
+    value is None on a miss. Pass the key to store() after calling the model.
+    """
+    if not enabled_for(node):
+        STATS["bypassed"] += 1
+        return None, None
+
+    key = make_key(model, messages, temperature, max_tokens)
+    now = time.time()
+    with _lock:
+        item = _memory.get(key)
+        if item and now - item[0] <= LLM_CACHE_TTL:
+            _memory.move_to_end(key)
+            STATS["hits"] += 1
+            return key, item[1]
+        _memory.pop(key, None)
+
+        try:
+            row = _db().execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= LLM_CACHE_TTL:
+                _db().execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                _db().commit()
+                _remember(key, row[1], row[0])
+                STATS["hits"] += 1
+                STATS["disk_hits"] += 1
+                return key, row[0]
+        except sqlite3.Error as e:
+            print(f"llm_cache: disk lookup failed: {e}")
+
+        STATS["misses"] += 1
+    return key, None
+
+
+def store(key: str, value: str):
+    """Store a completion under a key returned by lookup()."""
+    if key is None or not value:
+        return
+    now = time.time()
+    with _lock:
+        _remember(key, now, value)
+        STATS["stores"] += 1
+        try:
+            db = _db()
+            db.execute("INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)", (key, value, now, now))
+            db.execute("DELETE FROM llm_cache WHERE created < ?", (now - LLM_CACHE_TTL,))
+            (count,) = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > LLM_CACHE_MAX_DISK_ITEMS:
+                db.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed ASC LIMIT ?)",
+                    (count - LLM_CACHE_MAX_DISK_ITEMS,),
+                )
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"llm_cache: disk store failed: {e}")
+
+
+def _remember(key: str, created: float, value: str):
+    _memory[key] = (created, value)
+    _memory.move_to_end(key)
+    while len(_memory) > LLM_CACHE_MAX_ITEMS:
+        _memory.popitem(last=False)
+
+
+def clear():
+    with _lock:
+        _memory.clear()
+        try:
+            _db().execute("DELETE FROM llm_cache")
+            _db().commit()
+        except sqlite3.Error as e:
+            print(f"llm_cache: clear failed: {e}")
+
+
+def stats() -> dict:
+    lookups = STATS["hits"] + STATS["misses"]
+    return {
+        **STATS,
+        "memory_items": len(_memory),
+        "hit_rate": round(STATS["hits"] / lookups, 3) if lookups else None,
+    }
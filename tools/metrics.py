@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# In-process metrics in the Prometheus text exposition format, served at
+# /metrics. Counters, gauges and histograms are declared below; labels are
+# passed as keyword arguments. Values live in memory and reset on restart.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_PREFIX = "lovable_"
+
+# Upper bounds in seconds: wide enough for LLM calls and npm phases
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+RETRY_BUCKETS = (0, 1, 2, 3, 5)
+
+_families = {}  # name -> {"type", "help", "buckets", "series": {label tuple: value}}
+_lock = threading.Lock()
+
+
+def _declare(kind: str, name: str, help_text: str, buckets=None):
+    _families[name] = {"type": kind, "help": help_text, "buckets": buckets, "series": {}}
+
+
+_declare("histogram", "node_duration_seconds", "Wall time of one graph node run.", LATENCY_BUCKETS)
+_declare("counter", "node_runs_total", "Graph node runs by outcome.")
+_declare("histogram", "llm_request_duration_seconds", "Latency of chat completion API calls (cache hits excluded).", LATENCY_BUCKETS)
+_declare("histogram", "llm_first_token_seconds", "Time to the first streamed token of a chat completion.", LATENCY_BUCKETS)
+_declare("counter", "llm_requests_total", "Chat completion requests by node and source (api, cache or error).")
+_declare("counter", "llm_tokens_total", "Tokens reported in response.usage, by node and kind (prompt or completion).")
+_declare("histogram", "llm_completion_tokens", "Completion tokens per API call.", TOKEN_BUCKETS)
+_declare("counter", "json_parse_total", "Model replies parsed, by the parse path that succeeded.")
+_declare("histogram", "phase_duration_seconds", "Subprocess phases (npm install, npm run build, ...) by outcome.", LATENCY_BUCKETS)
+_declare("histogram", "job_queue_wait_seconds", "Time a job spent queued before a worker picked it up.", LATENCY_BUCKETS)
+_declare("histogram", "job_duration_seconds", "Run time of a job once started.", LATENCY_BUCKETS)
+_declare("histogram", "build_retries", "Fixer -> rebuild rounds per finished pipeline run.", RETRY_BUCKETS)
+_declare("histogram", "time_to_ready_seconds", "Time from dev server start until it is ready.", LATENCY_BUCKETS)
+_declare("histogram", "http_request_duration_seconds", "HTTP request latency by route.", HTTP_BUCKETS)
+_declare("gauge", "jobs_queued", "Jobs waiting for a worker.")
+_declare("gauge", "jobs_running", "Jobs being run by a worker.")
+_declare("gauge", "previews_live", "Preview dev servers currently running.")
+_declare("counter", "llm_cache_events_total", "LLM cache lookups and stores, by event.")
+_declare("counter", "dep_installs_total", "Dependency installs by source (unchanged, store or install).")
+_declare("histogram", "workspace_setup_seconds", "Time to set a new run's workspace up, by source (pool, template or existing).", LATENCY_BUCKETS)
+_declare("counter", "template_bytes_copied_total", "Template bytes really copied (not linked) into workspaces.")
+_declare("counter", "exports_total", "Export downloads by cache outcome (hit or miss).")
+_declare("gauge", "workspace_pool_ready", "Pre-provisioned workspaces ready to be claimed.")
+_declare("gauge", "workspace_pool_target", "Pool size the provisioner keeps (claim rate x provisioning time).")
+_declare("counter", "workspace_pool_claims_total", "Workspace claims by outcome (hits or misses).")
+_declare("gauge", "workspace_pool_hit_ratio", "Share of new runs that got a pre-provisioned workspace.")
+
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not METRICS_ENABLED:
+        return
+    series = _families[name]["series"]
+    key = _key(labels)
+    with _lock:
+        series[key] = series.get(key, 0) + value
+
+
+def set_value(name: str, value: float, **labels):
+    """Set a gauge, or mirror a counter kept elsewhere (e.g. a module's STATS dict)."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _families[name]["series"][_key(labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    if not METRICS_ENABLED:
+        return
+    family = _families[name]
+    key = _key(labels)
+    with _lock:
+        h = family["series"].get(key)
+        if h is None:
+            h = family["series"][key] = {"buckets": [0] * len(family["buckets"]), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(family["buckets"]):
+            if value <= bound:
+                h["buckets"][i] += 1
+        h["sum"] += value
+        h["count"] += 1
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe the duration of the with-block in histogram `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def record_llm(node: str, seconds: float, usage=None):
+    """Record one chat completion API call; usage is the response's usage object (or None)."""
+    observe("llm_request_duration_seconds", seconds, node=node)
+    inc("llm_requests_total", node=node, source="api")
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    inc("llm_tokens_total", prompt_tokens, node=node, kind="prompt")
+    inc("llm_tokens_total", completion_tokens, node=node, kind="completion")
+    observe("llm_completion_tokens", completion_tokens, node=node)
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _lock:
+        for name, family in _families.items():
+            full = METRICS_PREFIX + name
+            lines.append(f"# HELP {full} {family['help']}")
+            lines.append(f"# TYPE {full} {family['type']}")
+            for key, value in sorted(family["series"].items()):
+                if family["type"] != "histogram":
+                    lines.append(f"{full}{_format_labels(key)} {_number(value)}")
+                    continue
+                for bound, count in zip(family["buckets"], value["buckets"]):
+                    lines.append(f"{full}_bucket{_format_labels(key, (('le', _number(bound)),))} {count}")
+                lines.append(f"{full}_bucket{_format_labels(key, (('le', '+Inf'),))} {value['count']}")
+                lines.append(f"{full}_sum{_format_labels(key)} {_number(value['sum'])}")
+                lines.append(f"{full}_count{_format_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot(name: str) -> list:
+    """
+    Current series of one metric as [(labels dict, value)]. Histogram values
+    are {"bounds", "buckets" (cumulative counts), "sum", "count"}.
+    """
+    family = _families[name]
+    with _lock:
+        out = []
+        for key, value in family["series"].items():
+            if family["type"] == "histogram":
+                value = {"bounds": family["buckets"], "buckets": list(value["buckets"]),
+                         "sum": value["sum"], "count": value["count"]}
+            out.append((dict(key), value))
+    return out
+
+
+def reset():
+    with _lock:
+        for family in _families.values():
+            family["series"].clear()
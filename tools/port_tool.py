@@ -0,0 +1,88 @@
+import os
+import socket
+import threading
+from tools import coordination
+
+# Preview dev servers get one port per slug from this range (docker-compose
+# publishes 3000-3050).
+PREVIEW_PORT_MIN = int(os.environ.get("PREVIEW_PORT_MIN", "3000"))
+PREVIEW_PORT_MAX = int(os.environ.get("PREVIEW_PORT_MAX", "3050"))
+PREVIEW_HOST = os.environ.get("PREVIEW_HOST", "localhost")
+
+LEASES = {}  # slug -> port
+_lock = threading.Lock()
+
+
+def is_port_free(port: int) -> bool:
+    """
+    Check whether nothing is listening on `port` by trying to bind it.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("0.0.0.0", port))
+            return True
+        except OSError:
+            return False
+
+
+def lease(slug: str) -> int:
+    """
+    Return the port leased to `slug`, leasing a free one from the range if needed.
+    A slug keeps its port across rebuilds and edits until release() is called.
+    """
+    shared = coordination.enabled()
+    with _lock:
+        if slug in LEASES:
+            return LEASES[slug]
+        if shared:
+            # Keep the port the slug had on another worker
+            port = coordination.port_of(slug)
+            if port is not None and coordination.claim_port(slug, port):
+                LEASES[slug] = port
+                return port
+        taken = set(LEASES.values())
+        for port in range(PREVIEW_PORT_MIN, PREVIEW_PORT_MAX + 1):
+            if port in taken or not is_port_free(port):
+                continue
+            if shared and not coordination.claim_port(slug, port):
+                continue
+            LEASES[slug] = port
+            print(f"Leased port {port} to {slug}")
+            return port
+    raise RuntimeError(f"No free preview port in range {PREVIEW_PORT_MIN}-{PREVIEW_PORT_MAX}")
+
+
+def reserve(slug: str, port: int) -> bool:
+    """
+    Lease a specific port to `slug`, e.g. the port of a preview that survived a
+    restart. Returns False if another slug holds it.
+    """
+    with _lock:
+        holder = next((s for s, p in LEASES.items() if p == port), None)
+        if holder not in (None, slug):
+            return False
+        if coordination.enabled() and not coordination.claim_port(slug, port):
+            return False
+        LEASES[slug] = port
+    return True
+
+
+def release(slug: str):
+    """
+    Release the port leased to `slug`. Returns the port, or None if it had none.
+    """
+    with _lock:
+        port = LEASES.pop(slug, None)
+    if coordination.enabled():
+        coordination.release_port(slug)
+    if port is not None:
+        print(f"Released port {port} from {slug}")
+    return port
+
+
+def get(slug: str):
+    return LEASES.get(slug)
+
+
+def preview_url(port: int) -> str:
+    return f"http://{PREVIEW_HOST}:{port}"
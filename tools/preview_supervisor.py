@@ -0,0 +1,318 @@
+import os
+import time
+import signal
+import platform
+import threading
+import subprocess
+from collections import OrderedDict
+from tools import readiness, shell_tool, port_tool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Owner of every preview dev server. Keeps the Popen handles, caps the number
+# of live previews (least recently used ones are stopped first), stops idle
+# previews and reaps exited ones. Stopped previews are restarted on access.
+# Previews that outlive a server restart are adopted by PID (no Popen handle).
+# A preview stopped by the supervisor gives its port back; the restart on
+# access leases one again.
+PREVIEW_MAX_LIVE = int(os.environ.get("PREVIEW_MAX_LIVE", "4"))
+PREVIEW_IDLE_TIMEOUT = float(os.environ.get("PREVIEW_IDLE_TIMEOUT", "900"))
+PREVIEW_REAP_INTERVAL = float(os.environ.get("PREVIEW_REAP_INTERVAL", "15"))
+PREVIEW_STOP_GRACE = float(os.environ.get("PREVIEW_STOP_GRACE", "5"))
+# Per-process limits. The heap cap goes to node via NODE_OPTIONS; an address-space
+# limit (PREVIEW_MEMORY_MB) is off by default because V8 reserves far more virtual
+# memory than it uses. 0 disables a limit.
+PREVIEW_HEAP_MB = int(os.environ.get("PREVIEW_HEAP_MB", "768"))
+PREVIEW_MEMORY_MB = int(os.environ.get("PREVIEW_MEMORY_MB", "0"))
+PREVIEW_CPU_SECONDS = int(os.environ.get("PREVIEW_CPU_SECONDS", "0"))
+PREVIEW_NOFILE = int(os.environ.get("PREVIEW_NOFILE", "4096"))
+PREVIEW_NICE = int(os.environ.get("PREVIEW_NICE", "5"))
+
+PREVIEWS = OrderedDict()  # slug -> record, least recently used first
+_starting = set()  # slugs whose dev server is being started
+STATS = {"started": 0, "stopped_idle": 0, "evicted": 0, "exited": 0, "restarted": 0, "adopted": 0}
+_lock = threading.RLock()
+_reaper = None
+
+
+def _limit(pid: int):
+    """
+    Apply rlimits and niceness to a just-started dev server, from the parent
+    (a preexec_fn is not safe in this multi-threaded process). Popen returns
+    once npm has exec'd, before it forks next, so the children inherit them.
+    """
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        if PREVIEW_MEMORY_MB:
+            limit = PREVIEW_MEMORY_MB * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if PREVIEW_CPU_SECONDS:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (PREVIEW_CPU_SECONDS, PREVIEW_CPU_SECONDS))
+        if PREVIEW_NOFILE:
+            soft, hard = resource.prlimit(pid, resource.RLIMIT_NOFILE)
+            wanted = PREVIEW_NOFILE if hard == resource.RLIM_INFINITY else min(PREVIEW_NOFILE, hard)
+            resource.prlimit(pid, resource.RLIMIT_NOFILE, (wanted, hard))
+        if PREVIEW_NICE:
+            # The dev server leads its own process group (start_new_session)
+            os.setpriority(os.PRIO_PGRP, pid, min(19, os.getpriority(os.PRIO_PROCESS, 0) + PREVIEW_NICE))
+    except (OSError, ValueError) as e:
+        print(f"Preview supervisor: could not apply limits to pid {pid}: {e}")
+
+
+def _env(port: int) -> dict:
+    env = {**os.environ, "PORT": str(port)}
+    if PREVIEW_HEAP_MB:
+        env["NODE_OPTIONS"] = f"{env.get('NODE_OPTIONS', '')} --max-old-space-size={PREVIEW_HEAP_MB}".strip()
+    return env
+
+
+def start(slug: str, repo_path: str, port: int, log_path: str) -> int:
+    """
+    Start `npm run dev` for slug on port, replacing the slug's previous server.
+    Makes room first by stopping the least recently used previews. Victims
+    are chosen under the lock but stopped outside it, so other requests are
+    not blocked for the stop grace periods.
+    Returns: PID of the process.
+    """
+    with _lock:
+        previous = PREVIEWS.pop(slug, None)
+        # Previews other threads are starting count towards the cap too
+        live = len(PREVIEWS) + len(_starting - {slug})
+        victims = []
+        while PREVIEW_MAX_LIVE > 0 and live + 1 > PREVIEW_MAX_LIVE and PREVIEWS:
+            victims.append(PREVIEWS.popitem(last=False)[1])
+            live -= 1
+        _starting.add(slug)
+    try:
+        if previous:
+            _terminate(previous, "restart")
+        for record in victims:
+            print(f"Preview supervisor: evicting least recently used preview {record['slug']}")
+            _terminate(record, "evicted", release_port=True)
+            STATS["evicted"] += 1
+        return _spawn(slug, repo_path, port, log_path)
+    finally:
+        with _lock:
+            _starting.discard(slug)
+
+
+def _spawn(slug: str, repo_path: str, port: int, log_path: str) -> int:
+    log = open(log_path, "a", encoding="utf-8")
+    windows = platform.system() == "Windows"
+    cmd = ["npm", "run", "dev", "--", "-p", str(port)]
+    popen = subprocess.Popen(
+        " ".join(cmd) if windows else cmd,
+        cwd=repo_path,
+        stdout=log,
+        stderr=log,
+        shell=windows,
+        env=_env(port),
+        # Own session so the whole npm -> next tree is stopped together
+        start_new_session=not windows,
+    )
+    log.close()
+    if not windows:
+        _limit(popen.pid)
+    now = time.time()
+    with _lock:
+        PREVIEWS[slug] = {
+            "slug": slug,
+            "repo_path": repo_path,
+            "port": port,
+            "log_path": log_path,
+            "popen": popen,
+            "pid": popen.pid,
+            "started": now,
+            "last_access": now,
+        }
+        STATS["started"] += 1
+    start_reaper()
+    return popen.pid
+
+
+def ensure_running(slug: str, repo_path: str, port: int, log_path: str, url: str) -> dict:
+    """
+    Restart a preview that was stopped (idle, evicted or crashed) and wait until
+    it serves. Returns {"pid", "restarted", "ready"} where ready is the
+    readiness result, or None if the preview was already live.
+    """
+    if is_live(slug):
+        touch(slug)
+        return {"pid": PREVIEWS[slug]["pid"], "restarted": False, "ready": None}
+    offset = readiness.log_offset(log_path)
+    pid = start(slug, repo_path, port, log_path)
+    STATS["restarted"] += 1
+    ready = readiness.wait_ready(pid, log_path, url, offset=offset, slug=slug, is_alive=lambda: is_live(slug))
+    return {"pid": pid, "restarted": True, "ready": ready}
+
+
+def adopt(slug: str, pid: int, repo_path: str, port: int, log_path: str, url: str) -> bool:
+    """
+    Take over a dev server started before a restart, if its process is still
+    alive and its port answers. Returns True if it was adopted.
+    """
+    if not pid or not shell_tool.is_running(pid) or not readiness.probe(url):
+        return False
+    now = time.time()
+    with _lock:
+        PREVIEWS[slug] = {
+            "slug": slug,
+            "repo_path": repo_path,
+            "port": port,
+            "log_path": log_path,
+            "popen": None,
+            "pid": pid,
+            "started": now,
+            "last_access": now,
+        }
+        STATS["adopted"] += 1
+    start_reaper()
+    print(f"Preview supervisor: adopted {slug} (pid {pid}) on port {port}")
+    return True
+
+
+def _alive(record) -> bool:
+    popen = record["popen"]
+    return popen.poll() is None if popen else shell_tool.is_running(record["pid"])
+
+
+def _wait(record, timeout: float) -> bool:
+    """Wait up to timeout for the process to exit. Returns True if it did."""
+    if record["popen"]:
+        try:
+            record["popen"].wait(timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+    deadline = time.time() + timeout
+    while shell_tool.is_running(record["pid"]):
+        if time.time() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def stop(slug: str, reason: str = "stopped", release_port: bool = False) -> bool:
+    """
+    Stop the slug's dev server (process group SIGTERM, then SIGKILL) and reap it.
+    With release_port, the slug's port lease is released as well.
+    """
+    with _lock:
+        record = PREVIEWS.pop(slug, None)
+    if record is None:
+        return False
+    _terminate(record, reason, release_port)
+    return True
+
+
+def _terminate(record, reason: str, release_port: bool = False):
+    slug = record["slug"]
+    if _alive(record):
+        _signal(record, signal.SIGTERM)
+        if not _wait(record, PREVIEW_STOP_GRACE):
+            _signal(record, signal.SIGKILL)
+            _wait(record, PREVIEW_STOP_GRACE)
+    if release_port:
+        port_tool.release(slug)
+    print(f"Preview supervisor: {slug} (pid {record['pid']}) {reason}")
+
+
+def _signal(record, sig):
+    try:
+        if platform.system() == "Windows":
+            popen = record["popen"]
+            if popen:
+                popen.terminate() if sig == signal.SIGTERM else popen.kill()
+            else:
+                os.kill(record["pid"], sig)
+        else:
+            os.killpg(record["pid"], sig)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def stop_all():
+    for slug in list(PREVIEWS):
+        stop(slug, reason="shutdown")
+
+
+def touch(slug: str):
+    """Record an access, keeping the preview alive and most recently used."""
+    with _lock:
+        record = PREVIEWS.get(slug)
+        if record:
+            record["last_access"] = time.time()
+            PREVIEWS.move_to_end(slug)
+
+
+def is_live(slug: str) -> bool:
+    with _lock:
+        record = PREVIEWS.get(slug)
+        return record is not None and _alive(record)
+
+
+def get(slug: str):
+    with _lock:
+        record = PREVIEWS.get(slug)
+        return {k: v for k, v in record.items() if k != "popen"} if record else None
+
+
+def reap():
+    """Drop previews whose process exited (reaping the zombie) and stop idle ones."""
+    now = time.time()
+    with _lock:
+        records = list(PREVIEWS.values())
+    for record in records:
+        slug = record["slug"]
+        if not _alive(record):
+            with _lock:
+                # The slug may have been restarted since the snapshot; that preview owns the port now
+                current = PREVIEWS.get(slug) is record
+                if current:
+                    del PREVIEWS[slug]
+            if not current:
+                continue
+            STATS["exited"] += 1
+            port_tool.release(slug)
+            code = record["popen"].returncode if record["popen"] else "unknown"
+            print(f"Preview supervisor: {slug} exited with code {code}")
+        elif PREVIEW_IDLE_TIMEOUT and now - record["last_access"] > PREVIEW_IDLE_TIMEOUT:
+            with _lock:
+                current = PREVIEWS.get(slug) is record
+                if current:
+                    del PREVIEWS[slug]
+            if current:
+                _terminate(record, f"idle for {now - record['last_access']:.0f}s", release_port=True)
+                STATS["stopped_idle"] += 1
+
+
+def _reaper_loop():
+    while True:
+        time.sleep(PREVIEW_REAP_INTERVAL)
+        try:
+            reap()
+        except Exception as e:
+            print(f"Preview supervisor: reaper error: {e}")
+
+
+def start_reaper():
+    global _reaper
+    with _lock:
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reaper_loop, name="preview-reaper", daemon=True)
+            _reaper.start()
+
+
+def stats() -> dict:
+    now = time.time()
+    with _lock:
+        live = [
+            {"slug": r["slug"], "pid": r["pid"], "port": r["port"],
+             "uptime": round(now - r["started"]), "idle": round(now - r["last_access"])}
+            for r in PREVIEWS.values()
+        ]
+    return {**STATS, "live": live, "max_live": PREVIEW_MAX_LIVE, "idle_timeout": PREVIEW_IDLE_TIMEOUT}
@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from collections import deque
+import httpx
+from tools import shell_tool, metrics
+
+# Dev server readiness: watch the server's log for its "ready" line, fail as
+# soon as the process exits, and probe over HTTP (pooled client, exponential
+# backoff) in case the log does not say.
+READY_TIMEOUT = float(os.environ.get("READY_TIMEOUT", "60"))
+READY_PROBE_INITIAL = float(os.environ.get("READY_PROBE_INITIAL", "0.1"))
+READY_PROBE_MAX = float(os.environ.get("READY_PROBE_MAX", "2.0"))
+
+READY_MARKERS = ("✓ Ready", "Ready in", "ready - started server", "started server on")
+FATAL_MARKERS = ("EADDRINUSE", "Error: Cannot find module", "command not found", "npm ERR!")
+
+TIMINGS = deque(maxlen=200)
+_timings_lock = threading.Lock()
+_client = None
+_client_lock = threading.Lock()
+
+
+def client() -> httpx.Client:
+    """Shared HTTP client, so probes reuse connections instead of opening one per poll."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(timeout=2.0, limits=httpx.Limits(max_connections=20, max_keepalive_connections=10))
+        return _client
+
+
+def log_offset(log_path: str) -> int:
+    try:
+        return os.path.getsize(log_path)
+    except OSError:
+        return 0
+
+
+def probe(url: str) -> bool:
+    """Any HTTP response means the server is accepting requests."""
+    try:
+        client().get(url)
+        return True
+    except httpx.HTTPError:
+        return False
+
+
+def wait_ready(pid: int, log_path: str, url: str, offset: int = 0, timeout: float = None, slug: str = None, is_alive=None) -> dict:
+    """
+    Wait until the dev server with this pid is ready to serve `url`.
+    Only log output after `offset` is considered. `is_alive()` replaces the
+    PID check when the caller owns the process handle.
+    Returns: {"ready", "via": "log"|"http"|None, "seconds", "reason"}
+    """
+    timeout = READY_TIMEOUT if timeout is None else timeout
+    start = time.time()
+    pos, carry = offset, ""
+    recent = deque(maxlen=5)
+    next_probe, interval = start + READY_PROBE_INITIAL, READY_PROBE_INITIAL
+    result = None
+
+    while result is None:
+        try:
+            with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                f.seek(pos)
+                chunk = f.read()
+                pos = f.tell()
+        except OSError:
+            chunk = ""
+        lines = (carry + chunk).split("\n")
+        carry = lines.pop()
+        for line in lines:
+            if line.strip():
+                recent.append(line.strip())
+            if any(m in line for m in READY_MARKERS):
+                result = {"ready": True, "via": "log", "reason": line.strip()}
+                break
+            if any(m in line for m in FATAL_MARKERS):
+                result = {"ready": False, "via": None, "reason": line.strip()}
+                break
+        if result:
+            break
+
+        now = time.time()
+        if not (is_alive() if is_alive else shell_tool.is_running(pid)):
+            output = " | ".join(list(recent) + [carry.strip()] if carry.strip() else list(recent))
+            result = {"ready": False, "via": None, "reason": f"dev server exited: {output or 'no output'}"}
+        elif now >= next_probe:
+            if probe(url):
+                result = {"ready": True, "via": "http", "reason": ""}
+            interval = min(interval * 2, READY_PROBE_MAX)
+            next_probe = time.time() + interval
+        if result is None:
+            if time.time() - start > timeout:
+                result = {"ready": False, "via": None, "reason": f"dev server not ready after {timeout:.0f}s"}
+            else:
+                time.sleep(0.05)
+
+    result["seconds"] = round(time.time() - start, 2)
+    if result["ready"]:
+        with _timings_lock:
+            TIMINGS.append({"slug": slug, "seconds": result["seconds"], "via": result["via"]})
+        metrics.observe("time_to_ready_seconds", result["seconds"], via=result["via"])
+    print(f"Readiness: {slug or url} ready={result['ready']} via={result['via']} in {result['seconds']}s {result['reason']}")
+    return result
+
+
+def stats() -> dict:
+    with _timings_lock:
+        seconds = sorted(t["seconds"] for t in TIMINGS)
+        via = {}
+        for t in TIMINGS:
+            via[t["via"]] = via.get(t["via"], 0) + 1
+    return {
+        "count": len(seconds),
+        "avg_seconds": round(sum(seconds) / len(seconds), 2) if seconds else None,
+        "p95_seconds": seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))] if seconds else None,
+        "via": via,
+        "recent": list(TIMINGS)[-10:],
+    }
@@ -1,8 +1,34 @@
 import os
+import re
+import time
 import shutil
+import fnmatch
 import difflib
+import threading
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Template materialization: build output, caches and dependencies are never
+# copied into a workspace, and files nobody writes to are linked, not copied.
+# TEMPLATE_LINK_MODE: "auto" (reflink, else hardlink, else copy), "hardlink" or "copy".
+# TEMPLATE_EXCLUDE patterns match names at any depth; a leading "/" anchors one
+# to the template root (a template's own out/ or dist/, not e.g. components/dist).
+TEMPLATE_LINK_MODE = os.environ.get("TEMPLATE_LINK_MODE", "auto")
+TEMPLATE_EXCLUDE = tuple(p for p in os.environ.get(
+    "TEMPLATE_EXCLUDE", ".next,node_modules,.git,.turbo,.cache,/out,/dist,*.tsbuildinfo,*.log,.DS_Store").split(",") if p)
+# Files the pipeline rewrites in place (npm, the Scaffolder); these always get their own copy
+TEMPLATE_WRITABLE = tuple(p for p in os.environ.get(
+    "TEMPLATE_WRITABLE", "package.json,package-lock.json,pages/index.js,styles/globals.css,tailwind.config.js").split(",") if p)
+FICLONE = 0x40049409  # linux/fs.h: clone a file's extents (reflink)
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+_reflink_devices = {}  # (source st_dev, destination st_dev) -> whether FICLONE works
+
 def create_work_dir(base: str, slug: str) -> str:
     target = os.path.abspath(os.path.join(base, slug))
     os.makedirs(target, exist_ok=True)
@@ -25,17 +51,239 @@ def copy_template(template_dir: str, dest_dir: str, overwrite: bool = True):
         shutil.rmtree(dest_dir)
     shutil.copytree(template_dir, dest_dir)
 
+def link_tree(src_dir: str, dest_dir: str, ignore=None):
+    """
+    Recreate src_dir at dest_dir with hardlinked files, falling back to a real
+    copy where hardlinks are not possible (e.g. across filesystems).
+    Args:
+        src_dir (str): Source directory.
+        dest_dir (str): Destination directory, must not exist yet.
+        ignore: Optional shutil.copytree ignore callable.
+    """
+    def _link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    shutil.copytree(src_dir, dest_dir, symlinks=True, ignore=ignore, copy_function=_link_or_copy)
+
+def _excluded(rel_path: str) -> bool:
+    name = rel_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(rel_path, pattern[1:]) if pattern.startswith("/") else fnmatch.fnmatch(name, pattern)
+               for pattern in TEMPLATE_EXCLUDE)
+
+def _tree_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def template_manifest(template_dir: str) -> dict:
+    """
+    Files of template_dir as {"files": [(rel_path, size)], "skipped_bytes"},
+    without excluded build artifacts. Built once per template and rebuilt
+    when one of its directories changes.
+    """
+    template_dir = os.path.abspath(template_dir)
+    dirs_seen = []
+    for root, dirs, _ in os.walk(template_dir):
+        rel_root = os.path.relpath(root, template_dir).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root + "/"
+        dirs[:] = sorted(d for d in dirs if not _excluded(rel_root + d))
+        dirs_seen.append((root, os.stat(root).st_mtime_ns))
+    signature = tuple(dirs_seen)
+    with _manifests_lock:
+        cached = _manifests.get(template_dir)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+    files, skipped = [], 0
+    for root, _ in dirs_seen:
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, template_dir).replace(os.sep, "/")
+            if _excluded(rel_path):
+                skipped += _tree_size(path)
+            elif os.path.isfile(path):
+                files.append((rel_path, os.path.getsize(path)))
+    manifest = {"files": files, "skipped_bytes": skipped}
+    with _manifests_lock:
+        _manifests[template_dir] = (signature, manifest)
+    return manifest
+
+def _reflink(src: str, dst: str) -> bool:
+    """Copy-on-write clone of src at dst (btrfs, XFS, ...). False where unsupported."""
+    if fcntl is None:
+        return False
+    device = (os.stat(src).st_dev, os.stat(os.path.dirname(dst)).st_dev)
+    if _reflink_devices.get(device) is False:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        shutil.copystat(src, dst)
+        _reflink_devices[device] = True
+        return True
+    except OSError:
+        _reflink_devices[device] = False
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+def materialize_template(template_dir: str, dest_dir: str, writable=TEMPLATE_WRITABLE) -> dict:
+    """
+    Create dest_dir from the template's manifest. Excluded artifacts are
+    skipped; files matching `writable` get a reflink or real copy, all others a
+    reflink or hardlink to the template. write_file breaks hardlinks, so a
+    workspace never writes through to the template.
+    Returns stats: files, reflinked, linked, copied, bytes_copied, skipped_bytes, seconds.
+    """
+    if not os.path.exists(template_dir):
+        raise ValueError(f"Source template directory {template_dir} does not exist")
+    start = time.time()
+    stats = {"files": 0, "reflinked": 0, "linked": 0, "copied": 0, "bytes_copied": 0}
+    manifest = template_manifest(template_dir)
+    for rel_path, size in manifest["files"]:
+        src = os.path.join(template_dir, rel_path)
+        dst = os.path.join(dest_dir, rel_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        stats["files"] += 1
+        if TEMPLATE_LINK_MODE == "auto" and _reflink(src, dst):
+            stats["reflinked"] += 1
+            continue
+        if TEMPLATE_LINK_MODE != "copy" and not any(fnmatch.fnmatch(rel_path, p) for p in writable):
+            try:
+                os.link(src, dst)
+                stats["linked"] += 1
+                continue
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+        stats["copied"] += 1
+        stats["bytes_copied"] += size
+    os.makedirs(dest_dir, exist_ok=True)
+    stats["skipped_bytes"] = manifest["skipped_bytes"]
+    stats["seconds"] = round(time.time() - start, 4)
+    return stats
+
 def read_file(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
+def _break_link(path: str):
+    """Unlink a hardlinked file before writing it, so the write does not reach the template."""
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except OSError:
+        pass
+
 def write_file(path: str, content: str):
     os.makedirs(os.path.dirname(path), exist_ok=True)
+    _break_link(path)
     with open(path, "w", encoding="utf-8") as f:
         f.write(content)
 
+def write_file_atomic(path: str, content: str):
+    """
+    Write content to path through a temporary file and os.replace, so readers
+    (e.g. a watching dev server) never see a half-written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique per thread: jobs of one worker may write the same file concurrently
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def list_source_files(repo_path: str, extensions, skip_dirs=("node_modules", ".next", ".git")) -> list:
+    """
+    Relative paths of the files under repo_path with one of `extensions`,
+    skipping dependency and build output directories.
+    """
+    found = []
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = sorted(d for d in dirs if d not in skip_dirs and not d.startswith("."))
+        for name in sorted(files):
+            if name.endswith(tuple(extensions)):
+                found.append(os.path.relpath(os.path.join(root, name), repo_path).replace(os.sep, "/"))
+    return found
+
 def make_unified_diff(original: str, new: str, filename: str) -> str:
-    orig_lines = original.splitlines(keepends=True)
-    new_lines = new.splitlines(keepends=True)
+    orig_lines = original.splitlines()
+    new_lines = new.splitlines()
     diff = difflib.unified_diff(orig_lines, new_lines, fromfile=filename, tofile=filename, lineterm="")
-    return "".join(diff)
+    return "\n".join(diff)
+
+HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+def looks_like_diff(text: str) -> bool:
+    """True if text is a unified diff rather than complete file content."""
+    head = text.lstrip()[:400]
+    return head.startswith(("--- ", "@@", "diff --git")) or re.search(r"^@@ -\d", head, re.MULTILINE) is not None
+
+def _parse_hunks(diff: str) -> list:
+    hunks = []
+    for line in diff.splitlines():
+        if line.startswith(("--- ", "+++ ", "diff --git", "index ", "\\ No newline")):
+            continue
+        if line.startswith("@@"):
+            match = HUNK_RE.match(line)
+            hunks.append((int(match.group(1)) if match else None, []))
+            continue
+        if not hunks:
+            continue
+        # Models sometimes drop the leading space of empty context lines
+        tag, text = (line[0], line[1:]) if line[:1] in (" ", "+", "-") else (" ", line)
+        hunks[-1][1].append((tag, text))
+    return hunks
+
+def _find_block(lines: list, block: list, hint: int, start: int):
+    """Position of `block` in lines at or after start, preferring the one closest to hint."""
+    wanted = [l.rstrip() for l in block]
+    candidates = range(start, len(lines) - len(block) + 1)
+    for at in sorted(candidates, key=lambda i: abs(i - hint)):
+        if [l.rstrip() for l in lines[at:at + len(block)]] == wanted:
+            return at
+    return None
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """
+    Apply a unified diff (as produced by make_unified_diff) to original.
+    Hunks are located by their context, starting at the line number in the
+    hunk header, so slightly wrong line numbers still apply.
+    Raises ValueError if a hunk's context is not found.
+    """
+    lines = original.splitlines()
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise ValueError("no hunks in diff")
+
+    result, pos = [], 0
+    for old_start, body in hunks:
+        old = [text for tag, text in body if tag in (" ", "-")]
+        new = [text for tag, text in body if tag in (" ", "+")]
+        hint = max(0, (old_start or 1) - 1)
+        if old:
+            at = _find_block(lines, old, hint, pos)
+            if at is None:
+                raise ValueError(f"hunk at line {old_start} does not match the file")
+        else:
+            at = min(max(hint + 1 if old_start else pos, pos), len(lines))
+        result.extend(lines[pos:at])
+        result.extend(new)
+        pos = at + len(old)
+    result.extend(lines[pos:])
+    return "\n".join(result) + ("\n" if original.endswith("\n") or not original else "")
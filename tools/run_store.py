@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+# Durable store of run states (slug -> final graph state), so runs survive
+# server reloads and crashes. Backed by SQLite; only the most recently used
+# RUN_STORE_CACHE_SIZE runs are kept decoded in memory. Several processes can
+# share the file: a cached run is reused only while its row is unchanged.
+RUN_STORE_PATH = os.path.abspath(os.environ.get("RUN_STORE_PATH", os.path.join("work", ".runs.sqlite")))
+RUN_STORE_CACHE_SIZE = int(os.environ.get("RUN_STORE_CACHE_SIZE", "64"))
+# Graph checkpoints (for resuming a pipeline) live in their own file
+CHECKPOINT_PATH = os.path.abspath(os.environ.get("CHECKPOINT_PATH", os.path.join("work", ".checkpoints.sqlite")))
+# Checkpoints of successful runs are deleted at once; the others (failed runs
+# that can be resumed) are kept for the newest CHECKPOINT_MAX_THREADS threads
+# and at most CHECKPOINT_MAX_AGE seconds.
+CHECKPOINT_MAX_THREADS = int(os.environ.get("CHECKPOINT_MAX_THREADS", "100"))
+CHECKPOINT_MAX_AGE = float(os.environ.get("CHECKPOINT_MAX_AGE", str(7 * 24 * 3600)))
+
+# langgraph-checkpoint-sqlite is optional; without it checkpoints are kept in
+# memory and a pipeline can only be resumed until the server restarts
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:
+    SqliteSaver = None
+from langgraph.checkpoint.memory import InMemorySaver
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+_threads = OrderedDict()  # checkpointed thread_id -> started, oldest first (in-memory checkpointer)
+_threads_conn = None      # table of checkpointed threads next to durable checkpoints
+
+
+class RunStore(MutableMapping):
+    """
+    Dict-like slug -> run state mapping persisted to SQLite. Values are copied
+    on write: after changing a run in place, assign it back (RUNS[slug] = run)
+    to persist the change.
+    """
+
+    def __init__(self, path: str = RUN_STORE_PATH, cache_size: int = RUN_STORE_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs (slug TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _remember(self, slug: str, state: dict, updated: float):
+        self._cache[slug] = (updated, state)
+        self._cache.move_to_end(slug)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __getitem__(self, slug: str) -> dict:
+        with self._lock:
+            row = self._conn.execute("SELECT updated FROM runs WHERE slug = ?", (slug,)).fetchone()
+            if row is None:
+                self._cache.pop(slug, None)
+                raise KeyError(slug)
+            cached = self._cache.get(slug)
+            if cached and cached[0] == row[0]:
+                self._cache.move_to_end(slug)
+                return cached[1]
+            updated, data = self._conn.execute("SELECT updated, state FROM runs WHERE slug = ?", (slug,)).fetchone()
+            state = json.loads(data)
+            self._remember(slug, state, updated)
+            return state
+
+    def __setitem__(self, slug: str, state: dict):
+        data = json.dumps(state, default=str)
+        updated = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs (slug, state, updated) VALUES (?, ?, ?)", (slug, data, updated)
+            )
+            self._conn.commit()
+            self._remember(slug, state, updated)
+
+    def __delitem__(self, slug: str):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM runs WHERE slug = ?", (slug,)).rowcount
+            self._conn.commit()
+            self._cache.pop(slug, None)
+        if not deleted:
+            raise KeyError(slug)
+
+    def __contains__(self, slug) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM runs WHERE slug = ?", (slug,)).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            slugs = [row[0] for row in self._conn.execute("SELECT slug FROM runs ORDER BY updated")]
+        return iter(slugs)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def update_run(self, slug: str, changes: dict) -> dict:
+        """Merge `changes` into the stored run and persist it. Returns the new state."""
+        with self._lock:
+            state = {**self.get(slug, {}), **changes}
+            self[slug] = state
+            return state
+
+    def stats(self) -> dict:
+        return {"runs": len(self), "cached": len(self._cache), "cache_size": self.cache_size, "path": self.path}
+
+
+def checkpointer():
+    """
+    Shared LangGraph checkpointer: SQLite-backed when langgraph-checkpoint-sqlite
+    is installed, in memory otherwise.
+    """
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            if SqliteSaver is not None:
+                os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+                _checkpointer = SqliteSaver(sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False))
+            else:
+                print("run_store: langgraph-checkpoint-sqlite not installed, checkpoints are kept in memory")
+                _checkpointer = InMemorySaver()
+        return _checkpointer
+
+
+def durable_checkpoints() -> bool:
+    return SqliteSaver is not None
+
+
+def _thread_table():
+    """Connection holding the checkpointed threads when checkpoints are durable, else None."""
+    global _threads_conn
+    if SqliteSaver is None:
+        return None
+    if _threads_conn is None:
+        os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+        _threads_conn = sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False, timeout=30)
+        _threads_conn.execute("CREATE TABLE IF NOT EXISTS checkpoint_threads (thread_id TEXT PRIMARY KEY, started REAL NOT NULL)")
+        _threads_conn.commit()
+    return _threads_conn
+
+
+def track_thread(thread_id: str):
+    """Record a thread a run is about to checkpoint under, then prune old threads."""
+    now = time.time()
+    with _checkpointer_lock:
+        db = _thread_table()
+        if db is None:
+            _threads[thread_id] = now
+            _threads.move_to_end(thread_id)
+        else:
+            db.execute("INSERT OR REPLACE INTO checkpoint_threads (thread_id, started) VALUES (?, ?)", (thread_id, now))
+            db.commit()
+    prune_checkpoints()
+
+
+def _expired_threads() -> list:
+    cutoff = time.time() - CHECKPOINT_MAX_AGE
+    with _checkpointer_lock:
+        db = _thread_table()
+        if db is None:
+            threads = list(_threads.items())
+        else:
+            threads = db.execute("SELECT thread_id, started FROM checkpoint_threads ORDER BY started").fetchall()
+    excess = max(0, len(threads) - CHECKPOINT_MAX_THREADS)
+    return [thread_id for i, (thread_id, started) in enumerate(threads) if i < excess or started < cutoff]
+
+
+def prune_checkpoints() -> int:
+    """Delete the checkpoints of threads beyond CHECKPOINT_MAX_THREADS or older than CHECKPOINT_MAX_AGE."""
+    expired = _expired_threads()
+    for thread_id in expired:
+        delete_checkpoints(thread_id)
+    if expired:
+        print(f"run_store: pruned checkpoints of {len(expired)} threads")
+    return len(expired)
+
+
+def delete_checkpoints(thread_id: str):
+    if not thread_id:
+        return
+    try:
+        checkpointer().delete_thread(thread_id)
+    except Exception as e:
+        print(f"run_store: could not delete checkpoints of {thread_id}: {e}")
+    with _checkpointer_lock:
+        db = _thread_table()
+        if db is None:
+            _threads.pop(thread_id, None)
+        else:
+            db.execute("DELETE FROM checkpoint_threads WHERE thread_id = ?", (thread_id,))
+            db.commit()
@@ -2,46 +2,219 @@ import subprocess
 import os
 import signal
 import time
+import asyncio
 import platform
+import threading
+import concurrent.futures
+from collections import deque
+from tools import metrics
 
-def run_command(cmd, cwd=None, timeout=600):
+# Lines of stdout/stderr kept in memory per phase; the full output goes to the phase's log file
+PHASE_TAIL_LINES = int(os.environ.get("PHASE_TAIL_LINES", "200"))
+# Seconds between SIGTERM and SIGKILL when a phase is stopped
+PHASE_KILL_GRACE = float(os.environ.get("PHASE_KILL_GRACE", "5"))
+STREAM_LIMIT = 4 * 1024 * 1024  # longest single output line accepted
+
+_cancel_events = {}
+_cancel_lock = threading.Lock()
+
+
+def cancel_event(key: str) -> threading.Event:
+    with _cancel_lock:
+        return _cancel_events.setdefault(key, threading.Event())
+
+
+def cancel(key: str):
+    """Stop the phases running under cancel_key=key (and any started later, until clear_cancel)."""
+    cancel_event(key).set()
+
+
+def clear_cancel(key: str):
+    with _cancel_lock:
+        _cancel_events.pop(key, None)
+
+
+def run_phase(cmd, cwd=None, name=None, timeout=None, log_path=None, on_line=None, cancel_key=None, env=None) -> dict:
+    """
+    Run one command as a named phase, streaming its output line by line instead
+    of buffering it. Each line goes to on_line(stream, line) and log_path (appended);
+    only the last PHASE_TAIL_LINES lines per stream are kept in memory.
+    The phase is stopped (process group SIGTERM, then SIGKILL) on timeout or
+    when cancel(cancel_key) is called.
+    Returns: {"name", "cmd", "status": ok|failed|timeout|cancelled, "exit_code",
+              "seconds", "stdout_tail", "stderr_tail", "log_path"}
+    """
+    coro = _run_phase(list(cmd), cwd, name or cmd[0], timeout, log_path, on_line,
+                      cancel_event(cancel_key) if cancel_key else None, env)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Called from inside an event loop: run the phase on its own loop in a helper thread
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+async def _pump(stream, stream_name, tail, log, on_line):
+    while True:
+        try:
+            raw = await stream.readline()
+        except ValueError:
+            raw = await stream.read(STREAM_LIMIT)
+        if not raw:
+            return
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        tail.append(line)
+        if log:
+            log.write(f"{line}\n")
+        if on_line:
+            try:
+                on_line(stream_name, line)
+            except Exception as e:
+                print(f"run_phase: on_line callback failed: {e}")
+
+
+def _signal_process(proc, sig):
+    try:
+        if platform.system() == "Windows":
+            proc.terminate() if sig == signal.SIGTERM else proc.kill()
+        else:
+            os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+async def _run_phase(cmd, cwd, name, timeout, log_path, on_line, cancelled, env):
+    start = time.time()
+    stdout_tail, stderr_tail = deque(maxlen=PHASE_TAIL_LINES), deque(maxlen=PHASE_TAIL_LINES)
+    log = None
+    if log_path:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        log = open(log_path, "a", encoding="utf-8")
+        log.write(f"=== {name}: {' '.join(cmd)} ({time.strftime('%Y-%m-%d %H:%M:%S')}) ===\n")
+
+    status, exit_code = "ok", None
+    try:
+        kwargs = {"cwd": cwd, "stdout": asyncio.subprocess.PIPE, "stderr": asyncio.subprocess.PIPE, "env": env, "limit": STREAM_LIMIT}
+        if platform.system() == "Windows":
+            # Shell so npm.cmd is found
+            proc = await asyncio.create_subprocess_shell(" ".join(cmd), **kwargs)
+        else:
+            # Own process group so the whole npm/node tree can be stopped
+            proc = await asyncio.create_subprocess_exec(*cmd, start_new_session=True, **kwargs)
+
+        work = asyncio.ensure_future(asyncio.gather(
+            _pump(proc.stdout, "stdout", stdout_tail, log, on_line),
+            _pump(proc.stderr, "stderr", stderr_tail, log, on_line),
+            proc.wait(),
+        ))
+        deadline = start + timeout if timeout else None
+        while not work.done():
+            await asyncio.wait({work}, timeout=0.2)
+            if work.done():
+                break
+            if cancelled is not None and cancelled.is_set():
+                status = "cancelled"
+            elif deadline and time.time() > deadline:
+                status = "timeout"
+            else:
+                continue
+            _signal_process(proc, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(asyncio.shield(work), PHASE_KILL_GRACE)
+            except asyncio.TimeoutError:
+                _signal_process(proc, signal.SIGKILL)
+                await work
+            break
+        exit_code = proc.returncode
+        if status == "ok" and exit_code != 0:
+            status = "failed"
+    except FileNotFoundError as e:
+        status, exit_code = "failed", 127
+        stderr_tail.append(str(e))
+    finally:
+        if status == "timeout":
+            stderr_tail.append(f"{name} timed out after {timeout}s")
+        elif status == "cancelled":
+            stderr_tail.append(f"{name} was cancelled")
+        if log:
+            log.write(f"=== {name}: {status} (exit {exit_code}) in {time.time() - start:.1f}s ===\n")
+            log.close()
+
+    metrics.observe("phase_duration_seconds", time.time() - start, phase=name, status=status)
+    return {
+        "name": name,
+        "cmd": " ".join(cmd),
+        "status": status,
+        "exit_code": 124 if status == "timeout" else 130 if status == "cancelled" else exit_code,
+        "seconds": round(time.time() - start, 2),
+        "stdout_tail": "\n".join(stdout_tail),
+        "stderr_tail": "\n".join(stderr_tail),
+        "log_path": log_path,
+    }
+
+
+def tail(text: str, lines: int = None) -> str:
+    """The last `lines` (default PHASE_TAIL_LINES, the bound run_phase applies to each stream) lines of text."""
+    return "\n".join(text.split("\n")[-(lines or PHASE_TAIL_LINES):])
+
+
+def run_command(cmd, cwd=None, timeout=600, **phase_kwargs):
     """
     Run a shell command with proper handling for Windows (npm.cmd) and Linux/Mac.
+    Output is streamed through run_phase, so stdout/stderr are bounded tails.
     Returns: (exit_code, stdout, stderr)
     """
-    # If on Windows, force shell=True so npm.cmd is found
-    use_shell = platform.system() == "Windows"
-
-    proc = subprocess.run(
-        " ".join(cmd) if use_shell else cmd,
-        cwd=cwd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        shell=use_shell,
-        timeout=timeout
-    )
-    return proc.returncode, proc.stdout, proc.stderr
+    result = run_phase(cmd, cwd=cwd, timeout=timeout, **phase_kwargs)
+    return result["exit_code"], result["stdout_tail"], result["stderr_tail"]
 
 
-def start_dev_server(cwd, logfile_path):
+def start_dev_server(cwd, logfile_path, port=None):
     """
     Start `npm run dev` in the background, redirecting logs to a file.
+    If `port` is given the server listens there (`next dev -p <port>`).
     Returns: PID of the process.
     """
     f = open(logfile_path, "a", encoding="utf-8")
     use_shell = platform.system() == "Windows"
 
+    cmd = ["npm", "run", "dev"]
+    env = None
+    if port:
+        # The last -p wins, so this overrides the port hardcoded in package.json
+        cmd += ["--", "-p", str(port)]
+        env = {**os.environ, "PORT": str(port)}
+
     popen = subprocess.Popen(
-        "npm run dev" if use_shell else ["npm", "run", "dev"],
+        " ".join(cmd) if use_shell else cmd,
         cwd=cwd,
         stdout=f,
         stderr=f,
-        shell=use_shell
+        shell=use_shell,
+        env=env
     )
     return popen.pid
 
 
+def is_running(pid: int) -> bool:
+    """
+    Check whether a process with this PID still exists.
+    """
+    if not pid:
+        return False
+    try:
+        # Reap our own exited children first; a zombie would still answer kill(pid, 0)
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except (ChildProcessError, OSError, AttributeError):
+        pass
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
 def stop_pid(pid: int):
     """
     Kill process by PID.
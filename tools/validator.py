@@ -0,0 +1,412 @@
+import os
+import re
+import json
+import time
+from tools import repo_tool
+
+# esprima is optional; without it JS/JSX syntax is checked by a bracket scanner
+try:
+    import esprima
+except ImportError:
+    esprima = None
+
+# Fast checks of a generated workspace that catch what would otherwise only
+# fail after `npm install` + `npm run build`: broken manifests, missing
+# scripts/dependencies, imports of files or packages that do not exist, and
+# unbalanced syntax.
+SOURCE_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs")
+RESOLVE_EXTENSIONS = ("", ".js", ".jsx", ".ts", ".tsx", ".mjs", ".json", ".css", ".scss")
+REQUIRED_SCRIPTS = ("dev", "build")
+REQUIRED_DEPENDENCIES = ("next", "react", "react-dom")
+# JSON files that allow comments, so they are not strict-parsed
+JSONC_FILES = ("tsconfig.json", "jsconfig.json")
+
+NODE_BUILTINS = {
+    "assert", "buffer", "child_process", "crypto", "events", "fs", "http", "https", "net", "os",
+    "path", "process", "querystring", "stream", "string_decoder", "timers", "url", "util", "zlib",
+}
+
+IMPORT_RE = re.compile(
+    r"""(?:^|[;\s])(?:import\s+(?:[\w*{}\s,$]+?\s+from\s+)?|export\s+[\w*{}\s,$]+?\s+from\s+)['"]([^'"]+)['"]"""
+    r"""|\b(?:require|import)\s*\(\s*['"]([^'"]+)['"]\s*\)""",
+    re.MULTILINE,
+)
+PAIRS = {")": "(", "]": "[", "}": "{"}
+
+
+def _error(path: str, line, message: str) -> dict:
+    return {"path": path, "line": line, "message": message}
+
+
+def check_manifest(repo_path: str):
+    """
+    Validate package.json. Returns (manifest or None, errors).
+    """
+    path = os.path.join(repo_path, "package.json")
+    if not os.path.isfile(path):
+        return None, [_error("package.json", None, "package.json is missing")]
+    try:
+        manifest = json.loads(repo_tool.read_file(path))
+    except ValueError as e:
+        return None, [_error("package.json", getattr(e, "lineno", None), f"invalid JSON: {e}")]
+    if not isinstance(manifest, dict):
+        return None, [_error("package.json", 1, "package.json must be a JSON object")]
+
+    errors = []
+    scripts = manifest.get("scripts") if isinstance(manifest.get("scripts"), dict) else {}
+    for script in REQUIRED_SCRIPTS:
+        if not scripts.get(script):
+            errors.append(_error("package.json", None, f'missing script "{script}" (expected "next {script}")'))
+    deps = declared_dependencies(manifest)
+    for dep in REQUIRED_DEPENDENCIES:
+        if dep not in deps:
+            errors.append(_error("package.json", None, f'missing dependency "{dep}"'))
+    return manifest, errors
+
+
+def declared_dependencies(manifest: dict) -> set:
+    deps = set()
+    for field in ("dependencies", "devDependencies", "peerDependencies", "optionalDependencies"):
+        if isinstance(manifest.get(field), dict):
+            deps.update(manifest[field])
+    return deps
+
+
+def check_json(repo_path: str, rel_path: str) -> list:
+    try:
+        json.loads(repo_tool.read_file(os.path.join(repo_path, rel_path)))
+    except ValueError as e:
+        return [_error(rel_path, getattr(e, "lineno", None), f"invalid JSON: {e}")]
+    return []
+
+
+def _resolves(base: str) -> bool:
+    for ext in RESOLVE_EXTENSIONS:
+        if os.path.isfile(base + ext):
+            return True
+    return os.path.isdir(base) and any(os.path.isfile(os.path.join(base, "index" + ext)) for ext in RESOLVE_EXTENSIONS[1:])
+
+
+def _package_name(spec: str) -> str:
+    parts = spec.split("/")
+    return "/".join(parts[:2]) if spec.startswith("@") else parts[0]
+
+
+def check_imports(repo_path: str, rel_path: str, source: str, deps) -> list:
+    """
+    Check that relative and "@/" imports point at files in the workspace and
+    that package imports are declared in package.json (skipped when deps is None).
+    """
+    errors = []
+    file_dir = os.path.dirname(os.path.join(repo_path, rel_path))
+    strings = _string_starts(source)
+    for match in IMPORT_RE.finditer(source):
+        group = 1 if match.group(1) else 2
+        spec = match.group(group)
+        if match.start(group) - 1 not in strings:
+            continue  # inside a comment, string or template literal
+        line = source.count("\n", 0, match.start(group)) + 1
+        if spec.startswith("."):
+            if not _resolves(os.path.normpath(os.path.join(file_dir, spec))):
+                errors.append(_error(rel_path, line, f"cannot resolve import '{spec}'"))
+        elif spec.startswith("@/") or spec.startswith("~/"):
+            target = spec[2:]
+            if not (_resolves(os.path.join(repo_path, target)) or _resolves(os.path.join(repo_path, "src", target))):
+                errors.append(_error(rel_path, line, f"cannot resolve import '{spec}'"))
+        elif deps is not None and not spec.startswith(("node:", "http:", "https:", "data:")):
+            name = _package_name(spec)
+            if name not in deps and name not in NODE_BUILTINS:
+                errors.append(_error(rel_path, line, f"package '{name}' is imported but not in package.json"))
+    return errors
+
+
+def _quote_end(source: str, start: int, quote: str):
+    """Index of the quote closing source[start] on the same line, or None."""
+    i = start + 1
+    while i < len(source) and source[i] != "\n":
+        if source[i] == "\\":
+            i += 2
+            continue
+        if source[i] == quote:
+            return i
+        i += 1
+    return None
+
+
+# After these keywords a "/" starts a regex literal; after other identifiers,
+# numbers and closing brackets it is a division
+REGEX_AFTER_WORD_RE = re.compile(
+    r"(?:^|[^\w$])(?:return|typeof|instanceof|in|of|new|delete|void|throw|case|do|else|yield|await)$")
+
+
+def _regex_end(source: str, start: int):
+    """
+    If the "/" at source[start] (in code) starts a regex literal closed on the
+    same line, the index just past it and its flags; otherwise None.
+    """
+    j = start - 1
+    while j >= 0 and source[j] in " \t":
+        j -= 1
+    if j >= 0 and (source[j] in ")]}" or source[j].isalnum() or source[j] in "_$"):
+        if not REGEX_AFTER_WORD_RE.search(source, max(0, j - 10), j + 1):
+            return None
+    i, in_class = start + 1, False
+    while i < len(source) and source[i] != "\n":
+        ch = source[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "[":
+            in_class = True
+        elif ch == "]":
+            in_class = False
+        elif ch == "/" and not in_class:
+            i += 1
+            while i < len(source) and (source[i].isalnum() or source[i] == "_"):
+                i += 1  # flags
+            return i
+        i += 1
+    return None
+
+
+def _string_starts(source: str) -> set:
+    """
+    Positions of the opening quotes of real string literals, i.e. not inside
+    comments, template literals, regex literals or other strings.
+    """
+    starts = set()
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end < 0 else end
+        elif ch in "'\"":
+            end = _quote_end(source, i, ch)
+            if end is not None:
+                starts.add(i)
+            i = (end + 1) if end is not None else i + 1
+        elif ch == "`":
+            i += 1
+            while i < n and source[i] != "`":
+                i += 2 if source[i] == "\\" else 1
+            i += 1
+        elif ch == "/":
+            i = _regex_end(source, i) or i + 1
+        else:
+            i += 1
+    return starts
+
+
+JSX_NAME_RE = re.compile(r"[A-Za-z_$][\w$.:-]*")
+# A "<" after one of these (or at the start of the file) opens a JSX element;
+# after an identifier, ")" or "]" it is a comparison or a type argument
+JSX_AFTER = "(,=:?[{};&|!>"
+JSX_AFTER_WORD_RE = re.compile(r"(?:^|[^\w$])(?:return|yield|default|else|case|await)$")
+
+
+def _starts_jsx(source: str, i: int) -> bool:
+    """Whether the "<" at source[i] (in code) opens a JSX element or fragment."""
+    rest = source[i + 1:i + 80]
+    if not rest.startswith(">"):
+        name = JSX_NAME_RE.match(rest)
+        if not name:
+            return False
+        after = rest[name.end():].lstrip()
+        if after.startswith(",") or after.startswith("extends "):
+            return False  # generic arrow function in .tsx: <T,>() or <T extends X>()
+    j = i - 1
+    while j >= 0 and source[j].isspace():
+        j -= 1
+    if j < 0 or source[j] in JSX_AFTER:
+        return True
+    return JSX_AFTER_WORD_RE.search(source, max(0, j - 7), j + 1) is not None
+
+
+def scan_brackets(rel_path: str, source: str) -> list:
+    """
+    Bracket-balance scan aware of comments, strings, template literals and
+    JSX. JSX text and attribute strings are skipped (so "1) Pick a plan :)"
+    in an element is text), while elements must be closed and {expressions}
+    inside them are scanned as code. A quote that is not closed on its line
+    is taken as text, since JS strings cannot span lines.
+    """
+    jsx = rel_path.endswith((".js", ".jsx", ".tsx", ".mjs", ".cjs"))
+    # (kind, line, label): kind is a bracket, "${", "`" (template literal),
+    # "tag" (inside a JSX opening tag) or "jsx" (JSX children)
+    stack = []
+    lineno = 1
+    i, n = 0, len(source)
+
+    def skip_to(j):
+        nonlocal i, lineno
+        lineno += source.count("\n", i, j)
+        i = j
+
+    while i < n:
+        ch = source[i]
+        mode = stack[-1][0] if stack else "code"
+        if ch == "\n":
+            lineno += 1
+            i += 1
+            continue
+
+        if mode == "`":
+            if ch == "\\":
+                skip_to(i + 2)
+            elif ch == "`":
+                stack.pop()
+                i += 1
+            elif source.startswith("${", i):
+                stack.append(("${", lineno, "${"))
+                i += 2
+            else:
+                i += 1
+            continue
+
+        if mode == "tag":
+            if ch == "{":
+                stack.append(("{", lineno, "{"))
+            elif ch in "'\"":
+                end = source.find(ch, i + 1)
+                if end < 0:
+                    return [_error(rel_path, lineno, "unterminated JSX attribute string")]
+                skip_to(end)
+            elif source.startswith("/>", i):
+                stack.pop()  # self-closing element
+                i += 1
+            elif ch == ">":
+                stack[-1] = ("jsx", stack[-1][1], stack[-1][2])
+            i += 1
+            continue
+
+        if mode == "jsx":
+            if ch == "{":
+                stack.append(("{", lineno, "{"))
+            elif ch == "}":
+                return [_error(rel_path, lineno, "unexpected '}' in JSX text")]
+            elif source.startswith("</", i):
+                end = source.find(">", i)
+                if end < 0:
+                    return [_error(rel_path, lineno, "unterminated JSX closing tag")]
+                closing = source[i + 2:end].strip()
+                if closing != stack[-1][2]:
+                    expected = f"</{stack[-1][2]}>" if stack[-1][2] else "</>"
+                    return [_error(rel_path, lineno, f"unexpected '</{closing}>', expected '{expected}'")]
+                stack.pop()
+                skip_to(end)
+            elif source.startswith("<>", i):
+                stack.append(("jsx", lineno, ""))
+                i += 1
+            elif ch == "<" and JSX_NAME_RE.match(source, i + 1):
+                name = JSX_NAME_RE.match(source, i + 1).group()
+                stack.append(("tag", lineno, name))
+                i += len(name)
+            i += 1
+            continue
+
+        # Code (top level, brackets and ${} of template literals)
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            skip_to(n if end < 0 else end + 2)
+            continue
+        if source.startswith("//", i) and (i == 0 or source[i - 1] in " \t\n;{}(),"):
+            end = source.find("\n", i)
+            skip_to(n if end < 0 else end)
+            continue
+        if ch in "'\"":
+            end = _quote_end(source, i, ch)
+            i = (end + 1) if end is not None else i + 1
+            continue
+        if ch == "/":
+            end = _regex_end(source, i)
+            if end is not None:
+                i = end
+                continue
+        if ch == "`":
+            stack.append(("`", lineno, "`"))
+        elif jsx and ch == "<" and _starts_jsx(source, i):
+            if source.startswith("<>", i):
+                stack.append(("jsx", lineno, ""))
+                i += 1
+            else:
+                name = JSX_NAME_RE.match(source, i + 1).group()
+                stack.append(("tag", lineno, name))
+                i += len(name)
+        elif ch in "([{":
+            stack.append((ch, lineno, ch))
+        elif ch in ")]}":
+            top = stack[-1][0] if stack else None
+            if ch == "}" and top == "${":
+                stack.pop()  # back into the template literal
+            elif top != PAIRS[ch]:
+                return [_error(rel_path, lineno, f"unexpected '{ch}'")]
+            else:
+                stack.pop()
+        i += 1
+
+    if stack:
+        kind, line, label = stack[-1]
+        if kind == "`":
+            return [_error(rel_path, None, "unterminated template literal")]
+        if kind in ("tag", "jsx"):
+            return [_error(rel_path, line, f"JSX element '<{label}>' is never closed")]
+        return [_error(rel_path, line, f"'{label[0]}' is never closed")]
+    return []
+
+
+def check_syntax(rel_path: str, source: str) -> list:
+    if esprima is not None and rel_path.endswith((".js", ".jsx", ".mjs", ".cjs")):
+        try:
+            esprima.parseModule(source, {"jsx": True, "tolerant": False})
+            return []
+        except Exception as e:
+            message = str(e)
+            line = getattr(e, "lineNumber", None)
+            if "Unexpected token" in message or "Unexpected identifier" in message or "Invalid" in message:
+                return [_error(rel_path, line, f"syntax error: {message}")]
+            # esprima lags behind newer syntax; fall back to the scanner
+    return scan_brackets(rel_path, source)
+
+
+def validate_workspace(repo_path: str) -> dict:
+    """
+    Run all checks over the workspace.
+    Returns: {"errors": [{"path", "line", "message"}], "files": n, "ms": elapsed}
+    """
+    start = time.perf_counter()
+    manifest, errors = check_manifest(repo_path)
+    deps = declared_dependencies(manifest) if manifest is not None else None
+
+    files = repo_tool.list_source_files(repo_path, SOURCE_EXTENSIONS + (".json", ".css"))
+    for rel_path in files:
+        name = os.path.basename(rel_path)
+        if name in ("package.json", "package-lock.json") or name in JSONC_FILES:
+            continue
+        if rel_path.endswith(".json"):
+            errors += check_json(repo_path, rel_path)
+            continue
+        try:
+            source = repo_tool.read_file(os.path.join(repo_path, rel_path))
+        except (OSError, UnicodeDecodeError) as e:
+            errors.append(_error(rel_path, None, f"unreadable: {e}"))
+            continue
+        if rel_path.endswith(".css"):
+            errors += scan_brackets(rel_path, re.sub(r"url\([^)]*\)", "url()", source))
+            continue
+        errors += check_syntax(rel_path, source)
+        errors += check_imports(repo_path, rel_path, source, deps)
+
+    return {"errors": errors, "files": len(files), "ms": round(1000 * (time.perf_counter() - start), 1)}
+
+
+def format_errors(errors: list) -> str:
+    """Render errors like build output ("./path:line" then the message) so analyze_build_log can read them."""
+    out = []
+    for e in errors:
+        out.append(f"./{e['path']}:{e['line']}" if e.get("line") else f"./{e['path']}")
+        out.append(f"Validation error: {e['message']}")
+    return "\n".join(out)
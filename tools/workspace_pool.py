@@ -0,0 +1,219 @@
+import os
+import math
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from collections import deque
+from pathlib import Path
+from tools import repo_tool, shell_tool, dep_store, build_cache
+
+# Warm pool of workspaces copied from the template, with node_modules installed
+# and (optionally) a compiler cache from one template build. A new run claims
+# one with a single rename instead of copying and installing on its critical
+# path. Pool entries live in WORKSPACE_POOL_DIR as
+#   prov-<pid>-<id>        being provisioned by process <pid>
+#   ready-<template>-<id>  ready to be claimed (template = template fingerprint)
+# so several API workers can share one pool directory. Off by default: the
+# provisioner installs and builds in the background from startup, and the
+# Scaffolder's own package.json and config files replace much of what it warmed.
+WORKSPACE_POOL = os.environ.get("WORKSPACE_POOL", "0") == "1"
+WORKSPACE_POOL_DIR = os.path.abspath(os.environ.get("WORKSPACE_POOL_DIR", os.path.join("work", ".pool")))
+WORKSPACE_POOL_MIN = int(os.environ.get("WORKSPACE_POOL_MIN", "1"))
+WORKSPACE_POOL_MAX = int(os.environ.get("WORKSPACE_POOL_MAX", "4"))
+# Claims over this many seconds give the request rate used to size the pool
+WORKSPACE_POOL_WINDOW = float(os.environ.get("WORKSPACE_POOL_WINDOW", "600"))
+WORKSPACE_POOL_WARM_BUILD = os.environ.get("WORKSPACE_POOL_WARM_BUILD", "1") == "1"
+WORKSPACE_POOL_TIMEOUT = float(os.environ.get("WORKSPACE_POOL_TIMEOUT", "900"))
+
+TEMPLATE_DIR = str(Path(__file__).resolve().parents[1] / "templates" / "next-basic")
+SKIP_DIRS = ("node_modules", ".next")
+
+STATS = {"hits": 0, "misses": 0, "provisioned": 0, "failed": 0, "discarded": 0}
+
+_claims = deque(maxlen=1000)  # timestamps of claim attempts (hits and misses)
+_provision_seconds = None     # moving average of the time to provision one workspace
+_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+
+
+def template_fingerprint(template_dir: str = TEMPLATE_DIR) -> str:
+    """Hash of the template's file names, sizes and mtimes; pooled copies of an older template are discarded."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(template_dir):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            st = os.stat(os.path.join(root, name))
+            h.update(f"{os.path.relpath(os.path.join(root, name), template_dir)}:{st.st_size}:{st.st_mtime_ns};".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def _entries(prefix: str) -> list:
+    try:
+        names = os.listdir(WORKSPACE_POOL_DIR)
+    except OSError:
+        return []
+    return [os.path.join(WORKSPACE_POOL_DIR, n) for n in names if n.startswith(prefix)]
+
+
+def _ready(fingerprint: str) -> list:
+    """Ready workspaces for the current template, oldest first."""
+    entries = []
+    for path in _entries(f"ready-{fingerprint}-"):
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    return [path for _, path in sorted(entries)]
+
+
+def _provisioning() -> list:
+    return _entries("prov-")
+
+
+def target_size() -> int:
+    """
+    Pool size from Little's law: workspaces in flight = claim rate x time to
+    provision one, so the pool refills as fast as runs take workspaces.
+    Clamped to [WORKSPACE_POOL_MIN, WORKSPACE_POOL_MAX].
+    """
+    now = time.time()
+    with _lock:
+        recent = sum(1 for t in _claims if t > now - WORKSPACE_POOL_WINDOW)
+        provision = _provision_seconds
+    if not recent or provision is None:
+        return WORKSPACE_POOL_MIN
+    rate = recent / WORKSPACE_POOL_WINDOW
+    return max(WORKSPACE_POOL_MIN, min(WORKSPACE_POOL_MAX, math.ceil(rate * provision)))
+
+
+def claim(dest: str) -> bool:
+    """
+    Move a ready workspace to dest (which must not exist or be an empty
+    directory). os.rename is atomic, so two claimers never get the same one.
+    Returns False when the pool is off or empty; the caller copies the template.
+    """
+    if not WORKSPACE_POOL:
+        return False
+    with _lock:
+        _claims.append(time.time())
+    _wake.set()
+    for path in _ready(template_fingerprint()):
+        try:
+            if os.path.isdir(dest) and not os.listdir(dest):
+                os.rmdir(dest)
+            os.rename(path, dest)
+        except FileNotFoundError:
+            continue  # taken by another worker
+        except OSError as e:
+            print(f"workspace_pool: could not claim {path}: {e}")
+            break
+        STATS["hits"] += 1
+        print(f"workspace_pool: claimed {os.path.basename(path)} for {dest}")
+        return True
+    STATS["misses"] += 1
+    return False
+
+
+def provision() -> str:
+    """Build one ready workspace: copy the template, install dependencies, warm the compiler cache."""
+    global _provision_seconds
+    fingerprint = template_fingerprint()
+    work = os.path.join(WORKSPACE_POOL_DIR, f"prov-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    start = time.time()
+    try:
+        os.makedirs(WORKSPACE_POOL_DIR, exist_ok=True)
+        repo_tool.materialize_template(TEMPLATE_DIR, work)
+        code, out, err, source = dep_store.ensure_installed(
+            work, lambda: shell_tool.run_command(["npm", "install"], cwd=work, timeout=WORKSPACE_POOL_TIMEOUT, name="pool_install")
+        )
+        if code != 0:
+            raise RuntimeError(f"npm install failed: {(err or out)[-300:]}")
+        if WORKSPACE_POOL_WARM_BUILD:
+            build_cache.prepare(work)
+            code, out, err = shell_tool.run_command(["npm", "run", "build"], cwd=work, timeout=WORKSPACE_POOL_TIMEOUT, name="pool_build")
+            next_dir = os.path.join(work, ".next")
+            # Keep only the compiler cache; the run builds its own app
+            for name in os.listdir(next_dir) if os.path.isdir(next_dir) else []:
+                path = os.path.join(next_dir, name)
+                if name == "cache" and code == 0:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+        ready = os.path.join(WORKSPACE_POOL_DIR, f"ready-{fingerprint}-{uuid.uuid4().hex[:8]}")
+        os.rename(work, ready)
+    except Exception as e:
+        STATS["failed"] += 1
+        shutil.rmtree(work, ignore_errors=True)
+        print(f"workspace_pool: provisioning failed: {e}")
+        return None
+    seconds = time.time() - start
+    with _lock:
+        _provision_seconds = seconds if _provision_seconds is None else 0.7 * _provision_seconds + 0.3 * seconds
+    STATS["provisioned"] += 1
+    print(f"workspace_pool: {os.path.basename(ready)} ready in {seconds:.1f}s (deps={source})")
+    return ready
+
+
+def _discard_stale(fingerprint: str):
+    """Remove ready workspaces of an older template and leftovers of processes that died mid-provisioning."""
+    for path in _entries("ready-"):
+        if not os.path.basename(path).startswith(f"ready-{fingerprint}-"):
+            shutil.rmtree(path, ignore_errors=True)
+            STATS["discarded"] += 1
+    for path in _provisioning():
+        try:
+            pid = int(os.path.basename(path).split("-")[1])
+        except (IndexError, ValueError):
+            pid = None
+        if pid != os.getpid() and not shell_tool.is_running(pid):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _loop():
+    failures = 0
+    while True:
+        try:
+            fingerprint = template_fingerprint()
+            _discard_stale(fingerprint)
+            # Workspaces being provisioned by any worker count towards the target
+            if len(_ready(fingerprint)) + len(_provisioning()) < target_size():
+                if provision():
+                    failures = 0
+                    continue
+                failures += 1
+        except Exception as e:
+            failures += 1
+            print(f"workspace_pool: provisioner error: {e}")
+        # Back off after failures (e.g. no network for npm install)
+        _wake.wait(min(300, 5 * 2 ** failures) if failures else 5)
+        _wake.clear()
+
+
+def start():
+    """Start the background provisioner (once per process)."""
+    global _thread
+    if not WORKSPACE_POOL or _thread is not None:
+        return
+    _thread = threading.Thread(target=_loop, name="workspace-pool", daemon=True)
+    _thread.start()
+
+
+def stats() -> dict:
+    fingerprint = template_fingerprint()
+    with _lock:
+        provision_seconds = _provision_seconds
+    claims = STATS["hits"] + STATS["misses"]
+    return {
+        **STATS,
+        "enabled": WORKSPACE_POOL,
+        "hit_ratio": round(STATS["hits"] / claims, 3) if claims else None,
+        "ready": len(_ready(fingerprint)),
+        "provisioning": len(_provisioning()),
+        "target": target_size(),
+        "provision_seconds": round(provision_seconds, 2) if provision_seconds is not None else None,
+    }
@@ -1,5 +1,188 @@
-import shutil
+import os
+import time
+import uuid
+import fnmatch
+import hashlib
+import zipfile
+import threading
+from collections import OrderedDict
 
-def zip_dir(src_dir: str, dest_path_without_ext: str) -> str:
-    archive = shutil.make_archive(dest_path_without_ext, 'zip', root_dir=src_dir)
+# Export archives: only the app's sources go in (dependency and build
+# directories are excluded by EXPORT_EXCLUDE), the zip is streamed to the
+# client while it is produced, and the finished artifact is cached under a
+# hash of the included files so an unchanged app downloads straight from disk.
+EXPORT_EXCLUDE = tuple(p for p in os.environ.get(
+    "EXPORT_EXCLUDE",
+    "node_modules,.next,.git,.turbo,.cache,.vercel,out,dist,coverage,*.log,*.zip,.env,.env.*,.DS_Store,.lovable-*,*.tmp-*",
+).split(",") if p)
+EXPORT_CACHE_DIR = os.path.abspath(os.environ.get("EXPORT_CACHE_DIR", os.path.join("work", ".exports")))
+EXPORT_CACHE_MAX = int(os.environ.get("EXPORT_CACHE_MAX", "32"))
+CHUNK_SIZE = 64 * 1024
+
+STATS = {"hits": 0, "misses": 0, "bytes_streamed": 0}
+
+_digests = OrderedDict()  # abs path -> (size, mtime_ns, sha256), so unchanged files are not read again
+_digests_lock = threading.Lock()
+DIGEST_CACHE_MAX = 20000
+
+
+def _excluded(rel_path: str, exclude) -> bool:
+    parts = rel_path.split("/")
+    return any(fnmatch.fnmatch(part, pattern) for part in parts for pattern in exclude)
+
+
+def iter_files(src_dir: str, exclude=EXPORT_EXCLUDE):
+    """Yield (rel_path, abs_path) of the files to export, in a stable order."""
+    for root, dirs, files in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root + "/"
+        dirs[:] = sorted(d for d in dirs if not _excluded(rel_root + d, exclude))
+        for name in sorted(files):
+            rel_path = rel_root + name
+            abs_path = os.path.join(root, name)
+            if not _excluded(rel_path, exclude) and os.path.isfile(abs_path):
+                yield rel_path, abs_path
+
+
+def _file_digest(path: str) -> str:
+    st = os.stat(path)
+    with _digests_lock:
+        cached = _digests.get(path)
+        if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+            _digests.move_to_end(path)
+            return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _digests_lock:
+        _digests[path] = (st.st_size, st.st_mtime_ns, digest)
+        while len(_digests) > DIGEST_CACHE_MAX:
+            _digests.popitem(last=False)
+    return digest
+
+
+def export_key(src_dir: str, exclude=EXPORT_EXCLUDE) -> str:
+    """Hash of the exclusion rules and of every included file's path and content."""
+    h = hashlib.sha256(",".join(exclude).encode("utf-8"))
+    for rel_path, abs_path in iter_files(src_dir, exclude):
+        h.update(f"{rel_path}\0{_file_digest(abs_path)}\n".encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def cached_export(key: str):
+    """Path of the cached archive for key, or None."""
+    path = os.path.join(EXPORT_CACHE_DIR, f"{key}.zip")
+    if not os.path.isfile(path):
+        STATS["misses"] += 1
+        return None
+    os.utime(path)
+    STATS["hits"] += 1
+    return path
+
+
+def _evict():
+    try:
+        entries = [os.path.join(EXPORT_CACHE_DIR, n) for n in os.listdir(EXPORT_CACHE_DIR) if n.endswith(".zip")]
+        entries.sort(key=os.path.getmtime, reverse=True)
+    except OSError:
+        return
+    for path in entries[EXPORT_CACHE_MAX:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class _ChunkWriter:
+    """Write-only, non-seekable file object collecting what zipfile writes, so it can be yielded in chunks."""
+
+    def __init__(self, tee=None):
+        self.chunks = []
+        self.buffered = 0
+        self.position = 0
+        self.tee = tee
+
+    def write(self, data) -> int:
+        if data:
+            data = bytes(data)
+            self.chunks.append(data)
+            self.buffered += len(data)
+            self.position += len(data)
+            if self.tee:
+                self.tee.write(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data, self.chunks, self.buffered = b"".join(self.chunks), [], 0
+        return data
+
+
+def stream_zip(src_dir: str, key: str = None, exclude=EXPORT_EXCLUDE):
+    """
+    Generate the zip of src_dir in chunks while it is being written. With a
+    key, the archive is also written to the export cache and published there
+    once complete; an interrupted download leaves nothing behind.
+    """
+    tee = tmp = None
+    if key:
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        tmp = os.path.join(EXPORT_CACHE_DIR, f"{key}.zip.tmp-{uuid.uuid4().hex[:8]}")
+        tee = open(tmp, "wb")
+    out = _ChunkWriter(tee)
+    start = time.time()
+    try:
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+            for rel_path, abs_path in iter_files(src_dir, exclude):
+                info = zipfile.ZipInfo.from_file(abs_path, rel_path)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(abs_path, "rb") as src, zf.open(info, "w", force_zip64=info.file_size > 2 ** 31) as dst:
+                    for block in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        dst.write(block)
+                        if out.buffered >= CHUNK_SIZE:
+                            yield out.take()
+                data = out.take()
+                if data:
+                    yield data
+        data = out.take()  # central directory
+        if data:
+            yield data
+        STATS["bytes_streamed"] += out.position
+        if tee:
+            tee.close()
+            os.replace(tmp, os.path.join(EXPORT_CACHE_DIR, f"{key}.zip"))
+            tmp = None
+            _evict()
+        print(f"zip_tool: exported {src_dir} ({out.position} bytes) in {time.time() - start:.2f}s")
+    finally:
+        if tee and not tee.closed:
+            tee.close()
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def zip_dir(src_dir: str, dest_path_without_ext: str, exclude=EXPORT_EXCLUDE) -> str:
+    """Write the filtered zip of src_dir to dest_path_without_ext + ".zip". Returns its path."""
+    archive = dest_path_without_ext + ".zip"
+    os.makedirs(os.path.dirname(os.path.abspath(archive)), exist_ok=True)
+    tmp = f"{archive}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        for chunk in stream_zip(src_dir, exclude=exclude):
+            f.write(chunk)
+    os.replace(tmp, archive)
     return archive
+
+
+def stats() -> dict:
+    try:
+        cached = [n for n in os.listdir(EXPORT_CACHE_DIR) if n.endswith(".zip")]
+    except OSError:
+        cached = []
+    return {**STATS, "cached": len(cached), "cache_max": EXPORT_CACHE_MAX, "exclude": list(EXPORT_EXCLUDE)}
@@ -0,0 +1,110 @@
+import os
+import re
+import math
+import threading
+import time
+from collections import deque
+
+# Local build/edit classifier used before the LLM intent call.
+# A small logistic model over slug presence and keyword hits gives P(edit);
+# only requests whose confidence is below INTENT_CONFIDENCE_THRESHOLD go to the LLM.
+INTENT_CONFIDENCE_THRESHOLD = float(os.environ.get("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+EDIT_KEYWORDS = ("change", "edit", "modify", "update", "replace", "rename", "remove", "delete", "fix",
+                 "tweak", "adjust", "make it", "make the", "instead")
+COMPONENT_KEYWORDS = ("color", "colour", "navbar", "button", "background", "header", "footer", "font",
+                      "title", "sidebar", "logo", "text", "theme", "layout", "padding", "margin")
+BUILD_KEYWORDS = ("build", "create", "generate", "new app", "new project", "from scratch", "start over",
+                  "scaffold", "landing page", "dashboard", "website", "clone of")
+
+# Weights of the scoring model (logit of P(edit))
+WEIGHTS = {
+    "bias": -2.0,
+    "slug": 2.5,         # a slug was sent with the request
+    "known_slug": 1.5,   # ...and it names an app this server has built
+    "edit": 1.2,         # per edit keyword hit
+    "component": 0.6,    # per component keyword hit
+    "build": -1.4,       # per build keyword hit
+}
+
+STATS = {"local": 0, "llm": 0, "llm_failed": 0}
+_latencies = {"local": deque(maxlen=500), "llm": deque(maxlen=500)}
+_lock = threading.Lock()
+
+
+def _hits(text: str, keywords) -> int:
+    return sum(1 for k in keywords if re.search(rf"\b{re.escape(k)}\b", text))
+
+
+def features(prompt: str, slug=None, known_slug=False) -> dict:
+    text = (prompt or "").lower()
+    return {
+        "slug": 1 if slug else 0,
+        "known_slug": 1 if slug and known_slug else 0,
+        "edit": min(_hits(text, EDIT_KEYWORDS), 3),
+        "component": min(_hits(text, COMPONENT_KEYWORDS), 3),
+        "build": min(_hits(text, BUILD_KEYWORDS), 3),
+    }
+
+
+def score(prompt: str, slug=None, known_slug=False):
+    """
+    Returns (action, confidence) from the local model. Without a slug there is
+    nothing to edit, so the answer is always a confident "build".
+    """
+    if not slug:
+        return "build", 1.0
+    f = features(prompt, slug, known_slug)
+    z = WEIGHTS["bias"] + sum(WEIGHTS[name] * value for name, value in f.items())
+    p_edit = 1.0 / (1.0 + math.exp(-z))
+    return ("edit", p_edit) if p_edit >= 0.5 else ("build", 1.0 - p_edit)
+
+
+def classify(prompt: str, slug=None, known_slug=False, llm_fn=None) -> dict:
+    """
+    Decide build vs edit for a /process request. Clear cases are answered
+    locally; low-confidence ones call llm_fn(prompt, slug), which returns the
+    intent dict, and fall back to the local answer if that call fails.
+    Returns: {"action", "slug", "details", "source", "confidence"}
+    """
+    start = time.perf_counter()
+    action, confidence = score(prompt, slug, known_slug)
+    local = {"action": action, "slug": slug, "details": prompt, "source": "local", "confidence": round(confidence, 3)}
+
+    if confidence >= INTENT_CONFIDENCE_THRESHOLD or llm_fn is None:
+        _record("local", start)
+        return local
+
+    try:
+        intent = llm_fn(prompt, slug)
+        if intent.get("action") not in ("build", "edit"):
+            raise ValueError(f"unexpected action {intent.get('action')!r}")
+        _record("llm", start)
+        return {**intent, "slug": intent.get("slug") or slug, "details": intent.get("details") or prompt,
+                "source": "llm", "confidence": round(confidence, 3)}
+    except Exception as e:
+        print(f"Intent: LLM fallback failed, using local answer: {e}")
+        with _lock:
+            STATS["llm_failed"] += 1
+        _record("llm", start)
+        return local
+
+
+def _record(source: str, start: float):
+    with _lock:
+        STATS[source] += 1
+        _latencies[source].append(time.perf_counter() - start)
+
+
+def stats() -> dict:
+    with _lock:
+        decisions = STATS["local"] + STATS["llm"]
+        out = {
+            **STATS,
+            "decisions": decisions,
+            "fallback_rate": round(STATS["llm"] / decisions, 3) if decisions else None,
+            "threshold": INTENT_CONFIDENCE_THRESHOLD,
+        }
+        for source, items in _latencies.items():
+            out[f"{source}_avg_ms"] = round(1000 * sum(items) / len(items), 2) if items else None
+    return out
@@ -0,0 +1,240 @@
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from tools import metrics, coordination, shell_tool
+
+# Background job queue for pipeline runs.
+# `/process` submits a job and returns its id straight away; a bounded pool of
+# worker threads picks jobs up and runs the handler registered for their kind.
+# With COORD_BACKEND=sqlite the queue, job status and events live in the
+# shared coordination database, so any worker process can take a job and any
+# can answer for it.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "20"))
+JOB_HISTORY_MAX = int(os.environ.get("JOB_HISTORY_MAX", "200"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "0.5"))  # shared queue only
+
+# Keys of a finished run's state that are exposed through the job API
+RESULT_KEYS = ("slug", "run_url", "repo_path", "last_error", "task_log", "parse_paths", "build_phases", "pipeline_status", "workspace_stats")
+
+JOBS = {}
+HANDLERS = {}
+_pending = queue.Queue(maxsize=JOB_QUEUE_MAX)
+_lock = threading.Lock()
+_workers = []
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+def register_handler(kind: str, fn):
+    """
+    Register the function that runs jobs of `kind`. It is called as
+    fn(payload, emit) where emit(event) publishes a progress event to the job's
+    event stream, and returns the result (the final graph state).
+    """
+    HANDLERS[kind] = fn
+
+
+def start_workers():
+    coordination.start_heartbeat(on_cancel=shell_tool.cancel)
+    loop = _shared_worker_loop if coordination.enabled() else _worker_loop
+    with _lock:
+        while len(_workers) < JOB_WORKERS:
+            t = threading.Thread(target=loop, name=f"job-worker-{len(_workers)}", daemon=True)
+            _workers.append(t)
+            t.start()
+
+
+def submit(kind: str, payload: dict, slug: str = None) -> dict:
+    """
+    Enqueue a job and return its record. Raises QueueFullError when the queue
+    already holds JOB_QUEUE_MAX pending jobs.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler registered for job kind '{kind}'")
+    start_workers()
+
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "kind": kind,
+        "slug": slug,
+        "status": "queued",
+        "payload": payload,
+        "result": None,
+        "error": None,
+        "created": time.time(),
+        "started": None,
+        "finished": None,
+        "events": [],
+    }
+    if coordination.enabled():
+        # Only the worker that claims the job keeps it in JOBS
+        if not coordination.enqueue_job(job, JOB_QUEUE_MAX):
+            raise QueueFullError(f"Job queue is full ({JOB_QUEUE_MAX} pending)")
+        print(f"Job {job['id']} queued (shared): kind={kind} slug={slug}")
+        return job
+    with _lock:
+        JOBS[job["id"]] = job
+    try:
+        _pending.put_nowait(job["id"])
+    except queue.Full:
+        with _lock:
+            JOBS.pop(job["id"], None)
+        raise QueueFullError(f"Job queue is full ({JOB_QUEUE_MAX} pending)")
+    print(f"Job {job['id']} queued: kind={kind} slug={slug} depth={_pending.qsize()}")
+    return job
+
+
+def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None and coordination.enabled():
+        job = coordination.get_job(job_id)
+    return job
+
+
+def events_since(job: dict, seq: int) -> list:
+    """Events of the job after sequence number seq, read again from the shared store for remote jobs."""
+    if job["id"] in JOBS or not coordination.enabled():
+        return job["events"][seq:]
+    return coordination.events_since(job["id"], seq)
+
+
+def cancel(job: dict):
+    """Stop the job's running phase, here or (through the heartbeat) on the worker running it."""
+    if job["id"] in JOBS:
+        shell_tool.cancel(job["slug"])
+    elif coordination.enabled():
+        coordination.request_cancel(job["id"])
+
+
+def active_job_for_slug(slug: str):
+    """Return the queued or running job for `slug`, if any."""
+    if coordination.enabled():
+        return coordination.active_job_for_slug(slug)
+    with _lock:
+        for job in JOBS.values():
+            if job["slug"] == slug and job["status"] in ("queued", "running"):
+                return job
+    return None
+
+
+def publish(job: dict, event: dict):
+    """Append a progress event to the job; each event gets a sequence number."""
+    event = {**event, "seq": len(job["events"]) + 1, "job_id": job["id"]}
+    job["events"].append(event)
+    if job.get("shared"):
+        coordination.add_event(job["id"], event)
+
+
+def describe(job: dict) -> dict:
+    """JSON-friendly view of a job, without its payload."""
+    info = {k: job[k] for k in ("id", "kind", "slug", "status", "error", "created", "started", "finished")}
+    result = job.get("result")
+    if isinstance(result, dict):
+        info["result"] = {k: result.get(k) for k in RESULT_KEYS}
+    else:
+        info["result"] = None
+    return info
+
+
+def stats() -> dict:
+    if coordination.enabled():
+        counts = coordination.job_counts()
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "running_here": sum(1 for j in JOBS.values() if j["status"] == "running"),
+            "workers": JOB_WORKERS,
+            "queue_max": JOB_QUEUE_MAX,
+            "backend": "shared",
+        }
+    with _lock:
+        running = sum(1 for j in JOBS.values() if j["status"] == "running")
+    return {
+        "queued": _pending.qsize(),
+        "running": running,
+        "workers": JOB_WORKERS,
+        "queue_max": JOB_QUEUE_MAX,
+    }
+
+
+def _prune_history():
+    with _lock:
+        finished = [j for j in JOBS.values() if j["status"] in ("done", "error")]
+        if len(finished) <= JOB_HISTORY_MAX:
+            return
+        finished.sort(key=lambda j: j["finished"] or 0)
+        for job in finished[:len(finished) - JOB_HISTORY_MAX]:
+            JOBS.pop(job["id"], None)
+
+
+def _worker_loop():
+    while True:
+        job_id = _pending.get()
+        job = JOBS.get(job_id)
+        if job is None:
+            _pending.task_done()
+            continue
+        job["status"] = "running"
+        job["started"] = time.time()
+        try:
+            _run_job(job)
+        finally:
+            _pending.task_done()
+            _prune_history()
+
+
+def _shared_worker_loop():
+    while True:
+        try:
+            claimed = coordination.claim_job(list(HANDLERS))
+        except Exception as e:
+            print(f"Job worker: claiming from the shared queue failed: {e}")
+            claimed = None
+        if claimed is None:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+        job = {**claimed, "events": [], "shared": True}
+        with _lock:
+            JOBS[job["id"]] = job
+        try:
+            _run_job(job)
+        finally:
+            # The shared store has the record now; keep only a bounded local history
+            _prune_history()
+            coordination.prune_jobs(JOB_HISTORY_MAX)
+
+
+def _run_job(job: dict):
+    job_id = job["id"]
+    publish(job, {"type": "status", "status": "running"})
+    print(f"Job {job_id} started after {job['started'] - job['created']:.2f}s in queue")
+    metrics.observe("job_queue_wait_seconds", job["started"] - job["created"], kind=job["kind"])
+    try:
+        job["result"] = HANDLERS[job["kind"]](job["payload"], lambda event: publish(job, event))
+        job["status"] = "done"
+    except Exception as e:
+        traceback.print_exc()
+        job["error"] = str(e)
+        job["status"] = "error"
+    finally:
+        job["finished"] = time.time()
+        job["payload"] = None
+        result = job["result"] if isinstance(job["result"], dict) else {}
+        if job.get("shared"):
+            # Record the outcome before the "done" event, so readers that see the event find the job finished
+            coordination.finish_job(job_id, job["status"], describe(job)["result"], job["error"], job["finished"])
+        publish(job, {
+            "type": "done",
+            "status": job["status"],
+            "error": job["error"],
+            "run_url": result.get("run_url"),
+            "last_error": result.get("last_error"),
+        })
+        metrics.observe("job_duration_seconds", job["finished"] - job["started"], kind=job["kind"], status=job["status"])
+        print(f"Job {job_id} {job['status']} in {job['finished'] - job['started']:.2f}s")
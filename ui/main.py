@@ -1,72 +1,173 @@
 from fastapi import FastAPI, Request, Form, HTTPException
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse, RedirectResponse, PlainTextResponse, Response
 from pathlib import Path
-from graph.engine import run_graph
-from tools import repo_tool
-from tools.zip_tool import zip_dir
-import shutil, os, time, signal, subprocess
+from graph.engine import run_graph, graph_kind, resume_config
+from graph import background_build
+from tools import repo_tool, port_tool, dep_store, build_cache, llm_cache, shell_tool, readiness, preview_supervisor, metrics, run_store, coordination, workspace_pool, zip_tool
+from ui import jobs, intent as intent_tool
+import shutil, os, time, signal, json, asyncio, uuid
 import openai
 from dotenv import load_dotenv
 
 load_dotenv()
+EXPORT_BUILD_TIMEOUT = float(os.environ.get("EXPORT_BUILD_TIMEOUT", "600"))
+# Previews keep running across restarts (they are adopted again on startup); set 1 to stop them on shutdown
+PREVIEW_STOP_ON_SHUTDOWN = os.environ.get("PREVIEW_STOP_ON_SHUTDOWN", "0") == "1"
 openai.api_key = os.getenv("OPENAI_API_KEY")
 client = openai.OpenAI()
 
 app = FastAPI()
 templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
-RUNS = {}
-
-def kill_all_existing_servers(slug_to_keep=None):
-    for slug, run in list(RUNS.items()):
-        if slug == slug_to_keep:
-            continue
-        pid = run.get("pid")
-        if pid:
-            try:
-                os.kill(pid, signal.SIGTERM)
-                print(f"Killed previous PID {pid} for {slug}")
-                time.sleep(1)
-            except Exception as e:
-                print(f"Failed to kill PID {pid}: {e}")
-        
-        repo = run.get("repo_path")
-        if repo and os.path.exists(repo):
-            shutil.rmtree(repo, ignore_errors=True)
-        if slug != slug_to_keep:
-            del RUNS[slug]
-    
+RUNS = run_store.RunStore()  # slug -> run state, persisted across restarts
+
+
+def _redirect_to_owner(request: Request, slug: str):
+    """
+    With several nodes sharing the run registry, a slug's workspace and preview
+    live on the node holding its lease; send requests for it there.
+    """
+    lease = coordination.remote_owner(slug)
+    if lease:
+        url = lease["url"] + request.url.path
+        if request.url.query:
+            url += "?" + request.url.query
+        return RedirectResponse(url, status_code=307)
+    return None
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
     try:
-        subprocess.run(
-            "netstat -aon | findstr :3000 | findstr LISTENING | for /F \"tokens=5\" %a in ('more') do taskkill /F /PID %a",
-            shell=True, capture_output=True
-        )
-        print("Cleared port 3000 of any lingering processes")
-    except Exception as e:
-        print(f"Failed to clear port 3000: {e}")
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw path, so slugs and job ids do not create new series
+        route = request.scope.get("route")
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                        method=request.method, route=getattr(route, "path", "unmatched"), status=status)
+
+def llm_intent(prompt, slug=None):
+    messages = [
+        {"role": "system", "content": "You are an AI assistant that analyzes user prompts for a Next.js app builder. Determine if the prompt is for a new app build or an edit to an existing app. If the prompt contains words like 'change', 'edit', 'modify', 'update', or refers to specific components like 'navbar', 'color', etc., classify it as an edit. Output a JSON object with 'action' (build/edit), 'slug' (if edit, use the provided slug or null), and 'details' (parsed intent or features)."},
+        {"role": "user", "content": f"Prompt: {prompt}\nExisting slug (if any): {slug}"}
+    ]
+    cache_key, intent = llm_cache.lookup("gpt-3.5-turbo", messages, 0.1, 150, node="Intent")
+    if intent is not None:
+        return json.loads(intent)
+    start = time.perf_counter()
+    response = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        max_tokens=150,
+        temperature=0.1
+    )
+    metrics.record_llm("Intent", time.perf_counter() - start, response.usage)
+    intent = response.choices[0].message.content
+    parsed = json.loads(intent)
+    llm_cache.store(cache_key, intent)
+    return parsed
 
 def detect_intent(prompt, slug=None):
+    # Clear cases are decided locally; the LLM is only asked when the local model is unsure
+    intent = intent_tool.classify(prompt, slug, known_slug=slug in RUNS, llm_fn=llm_intent)
+    print(f"Intent: {intent['action']} ({intent['source']}, confidence={intent['confidence']})")
+    return intent
+
+def run_pipeline(state: dict, emit=None) -> dict:
+    """
+    Job handler for builds and edits: run the graph, streaming node events to
+    `emit`, and record the result in RUNS.
+    """
+    slug = state["slug"]
+    shell_tool.clear_cancel(slug)
+    resume = bool(state.get("resume"))
+    # Each pipeline run checkpoints under its own thread; /resume continues it
+    thread_id = state["thread_id"] if resume else f"{slug}-{uuid.uuid4().hex[:8]}"
+    kind = state.get("graph_kind") or graph_kind(state)
+    if not resume:
+        # The slug's previous thread can no longer be resumed once a new run starts
+        previous = (RUNS.get(slug) or {}).get("thread_id")
+        if previous and previous != thread_id:
+            run_store.delete_checkpoints(previous)
+        run_store.track_thread(thread_id)
+    RUNS.update_run(slug, {"thread_id": thread_id, "graph_kind": kind, "pipeline_status": "running"})
+    result = run_graph(state, on_event=emit, thread_id=thread_id, kind=kind, resume=resume)
+    if not result.get("repo_path"):
+        print(f"Warning: repo_path not set for slug {slug}")
+        result["repo_path"] = state.get("repo_path") or repo_tool.create_work_dir("work", slug)
+    succeeded = bool(result.get("run_url")) and not result.get("last_error")
+    result.update({"thread_id": thread_id, "graph_kind": kind, "pipeline_status": "done" if succeeded else "failed"})
+    result.pop("resume", None)
+    # Merge, so keys set outside the graph (prod_build, background build results) survive an edit
+    result = RUNS.update_run(slug, result)
+    if succeeded:
+        # Failed runs keep their checkpoints for /resume; finished ones do not need them
+        run_store.delete_checkpoints(thread_id)
+    metrics.observe("build_retries", result.get("build_retry_count", 0), outcome="ok" if result.get("run_url") else "failed")
+    if result.get("run_url"):
+        print(f"Server for {slug} started at {result['run_url']} with PID {result.get('pid')}")
+    if result.get("run_url") and result.get("prod_build") == "pending":
+        start_production_build(result)
+    return result
+
+def start_production_build(run: dict):
+    """
+    Run the production build of a previewed app in the background and merge its
+    outcome (and any Fixer changes) back into RUNS when it finishes.
+    """
+    slug = run["slug"]
+    base_log_len = len(run.get("task_log", []))
+
+    def on_done(record, final_state):
+        current = RUNS.get(slug)
+        if current is None:
+            return
+        changes = {
+            "prod_build": record["status"],
+            "task_log": current.get("task_log", []) + final_state.get("task_log", [])[base_log_len:],
+        }
+        if final_state.get("file_diffs"):
+            changes["file_diffs"] = final_state["file_diffs"]
+        RUNS.update_run(slug, changes)
+
+    return background_build.start(run, on_done=on_done)
+
+jobs.register_handler("build", run_pipeline)
+jobs.register_handler("edit", run_pipeline)
+jobs.register_handler("resume", run_pipeline)
+
+def _submit_job(kind: str, state: dict, slug: str) -> dict:
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that analyzes user prompts for a Next.js app builder. Determine if the prompt is for a new app build or an edit to an existing app. If the prompt contains words like 'change', 'edit', 'modify', 'update', or refers to specific components like 'navbar', 'color', etc., classify it as an edit. Output a JSON object with 'action' (build/edit), 'slug' (if edit, use the provided slug or null), and 'details' (parsed intent or features)."},
-                {"role": "user", "content": f"Prompt: {prompt}\nExisting slug (if any): {slug}"}
-            ],
-            max_tokens=150,
-            temperature=0.1
-        )
-        intent = response.choices[0].message.content
-        import json
-        return json.loads(intent)
-    except Exception as e:
-        print(f"OpenAI intent detection failed: {e}")
-        # Fallback: if slug exists and prompt has edit keywords, treat as edit
-        edit_keywords = ['change', 'edit', 'modify', 'update', 'color', 'navbar', 'button', 'background']
-        if slug and any(keyword in prompt.lower() for keyword in edit_keywords):
-            return {"action": "edit", "slug": slug, "details": prompt}
+        return jobs.submit(kind, state, slug=slug)
+    except jobs.QueueFullError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "30"})
+
+def _job_response(request: Request, job: dict):
+    """
+    Render the task log fragment for a job. While the job is pending, the control
+    panel follows /jobs/{id}/events and fetches /jobs/{id}/log once it is done.
+    """
+    slug = job["slug"]
+    result = job.get("result") if job["status"] == "done" else None
+    if result is not None:
+        task_log = result.get("task_log", [])
+        # Previews are opened through /preview/{slug} so idle ones are restarted on access
+        run_url = f"/preview/{slug}" if result.get("run_url") else None
+    else:
+        task_log = list((RUNS.get(slug) or {}).get("task_log", []))
+        if job["status"] == "error":
+            task_log.append({"node": "Job", "when": None, "status": "err", "note": job["error"]})
         else:
-            return {"action": "edit" if slug else "build", "slug": slug, "details": prompt}
+            task_log.append({"node": "Job", "when": None, "status": job["status"], "note": f"job {job['id']}"})
+        run_url = None
+    return templates.TemplateResponse(
+        "_task_log.html",
+        {"request": request, "task_log": task_log, "run_url": run_url, "slug": slug,
+         "job_id": job["id"], "job_status": job["status"]}
+    )
 
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
@@ -87,26 +188,27 @@ def process(request: Request, prompt: str = Form(...), slug: str = Form(None)):
         if provided_slug and provided_slug in RUNS:
             action = "edit"
         else:
-            kill_all_existing_servers(provided_slug)
             # Clean the slug generation
             slug_base = "_".join(prompt.strip().lower().split()[:6])
             # Remove any special characters from slug
             slug_base = "".join(c for c in slug_base if c.isalnum() or c in ['_', '-'])
             provided_slug = f"{slug_base}-{int(time.time())}"
+            # Same prompt within the same second (concurrent users): keep slugs unique
+            suffix = 2
+            while provided_slug in RUNS:
+                provided_slug = f"{slug_base}-{int(time.time())}-{suffix}"
+                suffix += 1
             init_state = {"user_prompt": str(details), "slug": provided_slug, "task_log": [], "file_diffs": [], "repo_path": None}
             RUNS[provided_slug] = init_state
-            result = run_graph(init_state)
-            RUNS[provided_slug] = result
-            if not result.get("repo_path"):
-                print(f"Warning: repo_path not set for slug {provided_slug}")
-                result["repo_path"] = repo_tool.create_work_dir("work", provided_slug)
-            if result.get("run_url"):
-                print(f"New server started at {result['run_url']} with PID {result.get('pid')}")
-            return templates.TemplateResponse(
-                "_task_log.html",
-                {"request": request, "task_log": result.get("task_log", []), "run_url": result.get("run_url"), "slug": provided_slug}
-            )
-    elif action == "edit":
+            try:
+                job = _submit_job("build", init_state, provided_slug)
+            except HTTPException:
+                # Rejected (queue full): do not leave a run behind that never ran
+                RUNS.pop(provided_slug, None)
+                raise
+            return _job_response(request, job)
+
+    if action == "edit":
         # Clean the provided_slug for matching
         if provided_slug:
             provided_slug = provided_slug.strip('"\'')
@@ -126,16 +228,12 @@ def process(request: Request, prompt: str = Form(...), slug: str = Form(None)):
             print(f"Run not found for slug: {provided_slug}")
             print(f"Available slugs: {list(RUNS.keys())}")
             raise HTTPException(404, f"Run not found for slug: {provided_slug}")
+
+        if jobs.active_job_for_slug(provided_slug):
+            raise HTTPException(409, f"A job is already in progress for slug: {provided_slug}")
             
-        pid = run.get("pid")
-        if pid:
-            try:
-                os.kill(pid, signal.SIGTERM)
-                print(f"Killed PID {pid} for {provided_slug}")
-                time.sleep(1)
-            except Exception as e:
-                print(f"Failed to kill PID {pid}: {e}")
-        
+        # The preview keeps running: edits are hot-reloaded into it, and the
+        # Builder restarts it itself when an edit needs a full rebuild
         # For edits, we need to run the graph with the edit instruction
         edit_prompt = f"Original app: {run.get('user_prompt', '')}. Edit requirement: {details}"
         
@@ -146,49 +244,274 @@ def process(request: Request, prompt: str = Form(...), slug: str = Form(None)):
             "repo_path": run.get("repo_path"),
             "task_log": run.get("task_log", []),
             "file_diffs": run.get("file_diffs", []),
-            "edit_mode": True  # Add flag to indicate edit mode
+            "pid": run.get("pid"),
+            "port": run.get("port"),
+            "run_url": run.get("run_url"),
+            "edit_mode": True,  # Edits of an existing workspace run the edit graph
+            "edit_request": str(details),
+            "original_prompt": run.get("original_prompt") or run.get("user_prompt", ""),
         }
         
-        result = run_graph(edit_state)
-        RUNS[provided_slug] = result
-        
-        if not result.get("repo_path") and run.get("repo_path"):
-            result["repo_path"] = run.get("repo_path")
-            
-        if result.get("run_url"):
-            print(f"Edited server started at {result['run_url']} with PID {result.get('pid')}")
-            
-        return templates.TemplateResponse(
-            "_task_log.html",
-            {"request": request, "task_log": result.get("task_log", []), "run_url": result.get("run_url"), "slug": provided_slug}
-        )
-    else:
-        raise HTTPException(400, "Invalid action detected")
+        job = _submit_job("edit", edit_state, provided_slug)
+        return _job_response(request, job)
+
+    raise HTTPException(400, "Invalid action detected")
+
+@app.get("/jobs")
+def jobs_stats():
+    return jobs.stats()
+
+@app.get("/intent/stats")
+def intent_stats():
+    return intent_tool.stats()
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    return llm_cache.stats()
+
+@app.get("/builds/stats")
+def builds_stats():
+    return {"build_cache": build_cache.summary(), "dep_store": dict(dep_store.STATS), "readiness": readiness.stats(),
+            "workspace_pool": workspace_pool.stats(), "exports": zip_tool.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    # Point-in-time values are read from their owners at scrape time
+    job_stats = jobs.stats()
+    metrics.set_value("jobs_queued", job_stats["queued"])
+    metrics.set_value("jobs_running", job_stats["running"])
+    metrics.set_value("previews_live", len(preview_supervisor.stats()["live"]))
+    for event in ("hits", "disk_hits", "misses", "stores", "bypassed"):
+        metrics.set_value("llm_cache_events_total", llm_cache.STATS[event], event=event)
+    for source, count in dep_store.STATS.items():
+        metrics.set_value("dep_installs_total", count, source=source)
+    pool = workspace_pool.stats()
+    metrics.set_value("workspace_pool_ready", pool["ready"])
+    metrics.set_value("workspace_pool_target", pool["target"])
+    for outcome in ("hits", "misses"):
+        metrics.set_value("workspace_pool_claims_total", pool[outcome], outcome=outcome)
+    if pool["hit_ratio"] is not None:
+        metrics.set_value("workspace_pool_hit_ratio", pool["hit_ratio"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/builds/{slug}")
+def production_build_status(slug: str):
+    record = background_build.status(slug)
+    if not record:
+        raise HTTPException(404, "No background build for this run")
+    return record
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return jobs.describe(job)
+
+@app.post("/jobs/{job_id}/cancel")
+def job_cancel(job_id: str):
+    """Stop the job's running install/build phase; the job then ends without running the Fixer."""
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if job["status"] != "running":
+        raise HTTPException(409, f"Job is {job['status']}")
+    jobs.cancel(job)
+    return jobs.describe(job)
+
+@app.get("/jobs/{job_id}/log", response_class=HTMLResponse)
+def job_log(request: Request, job_id: str):
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return _job_response(request, job)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """
+    Server-sent events for a job: one `node` event per task_log entry as each
+    graph node completes, then a final `done` event.
+    """
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    try:
+        start = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        start = 0
+
+    async def stream():
+        sent = start
+        while True:
+            for event in jobs.events_since(job, sent):
+                sent = event["seq"]
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if event["type"] == "done":
+                    return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.get("/export/{slug}")
-def export(slug: str):
+def export(request: Request, slug: str):
+    redirect = _redirect_to_owner(request, slug)
+    if redirect:
+        return redirect
     run = RUNS.get(slug)
     if not run:
         raise HTTPException(404, "Run not found")
     repo = run.get("repo_path")
     if not repo:
         raise HTTPException(400, "No repo available")
-    zip_path = zip_dir(repo, os.path.join("work", slug, "artifact"))
-    return FileResponse(zip_path, media_type="application/zip", filename=os.path.basename(zip_path))
+    headers = {}
+    if run.get("prod_build") in ("pending", "on_export"):
+        # Previews served before their production build: build now (or finish the running one)
+        if not background_build.status(slug):
+            start_production_build(run)
+        record = background_build.wait(slug, EXPORT_BUILD_TIMEOUT)
+        headers["X-Build-Status"] = record["status"] if record else "unknown"
+    # Archives are keyed by the content of the exported files: an unchanged app is served from the cache
+    key = zip_tool.export_key(repo)
+    headers["ETag"] = f'"{key}"'
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    filename = f"{slug}.zip"
+    cached = zip_tool.cached_export(key)
+    metrics.inc("exports_total", cache="hit" if cached else "miss")
+    if cached:
+        return FileResponse(cached, media_type="application/zip", filename=filename, headers={**headers, "X-Export-Cache": "hit"})
+    headers.update({"Content-Disposition": f'attachment; filename="{filename}"', "X-Export-Cache": "miss"})
+    return StreamingResponse(zip_tool.stream_zip(repo, key), media_type="application/zip", headers=headers)
+
+@app.get("/preview/{slug}")
+def preview(request: Request, slug: str):
+    """
+    Redirect to the slug's dev server, restarting it first if the supervisor
+    stopped it (idle timeout or eviction).
+    """
+    redirect = _redirect_to_owner(request, slug)
+    if redirect:
+        return redirect
+    run = RUNS.get(slug)
+    repo_path = (run or {}).get("repo_path")
+    if not run or not repo_path or not os.path.isdir(repo_path):
+        raise HTTPException(404, "Run not found")
+    lease = coordination.owner(slug)
+    if lease and not lease["local"] and run.get("run_url") and readiness.probe(run["run_url"]):
+        # Another worker of this host supervises the preview and it is up
+        return RedirectResponse(run["run_url"], status_code=307)
+    if not preview_supervisor.is_live(slug):
+        if jobs.active_job_for_slug(slug):
+            raise HTTPException(503, "The app is being rebuilt", headers={"Retry-After": "5"})
+        port = port_tool.lease(slug)
+        url = port_tool.preview_url(port)
+        outcome = preview_supervisor.ensure_running(slug, repo_path, port, os.path.join(repo_path, "dev_server.log"), url)
+        if outcome["ready"] and not outcome["ready"]["ready"]:
+            raise HTTPException(503, f"Preview failed to start: {outcome['ready']['reason']}", headers={"Retry-After": "10"})
+        run = RUNS.update_run(slug, {"pid": outcome["pid"], "port": port, "run_url": url})
+    preview_supervisor.touch(slug)
+    return RedirectResponse(run.get("run_url") or port_tool.preview_url(run["port"]), status_code=307)
+
+@app.post("/preview/{slug}/touch")
+def preview_touch(request: Request, slug: str):
+    """Heartbeat from the control panel while a preview is on screen."""
+    redirect = _redirect_to_owner(request, slug)
+    if redirect:
+        return redirect
+    preview_supervisor.touch(slug)
+    return {"live": preview_supervisor.is_live(slug)}
+
+@app.get("/previews")
+def previews():
+    return preview_supervisor.stats()
+
+@app.post("/resume/{slug}")
+def resume(slug: str):
+    """
+    Continue a run that was interrupted or failed from its last checkpoint
+    instead of starting over at SpecSynthesizer.
+    """
+    run = RUNS.get(slug)
+    if not run:
+        raise HTTPException(404, "Run not found")
+    if jobs.active_job_for_slug(slug):
+        raise HTTPException(409, f"A job is already in progress for slug: {slug}")
+    if run.get("pipeline_status") == "done" or not run.get("thread_id"):
+        raise HTTPException(400, "Nothing to resume for this run")
+    if resume_config(run.get("graph_kind") or "build", run["thread_id"]) is None:
+        raise HTTPException(410, "No checkpoint left for this run; start a new build")
+    state = {**run, "resume": True}
+    job = _submit_job("resume", state, slug)
+    return jobs.describe(job)
+
+@app.get("/runs/stats")
+def runs_stats():
+    return {**RUNS.stats(), "durable_checkpoints": run_store.durable_checkpoints()}
+
+@app.get("/cluster")
+def cluster():
+    return coordination.stats()
+
+@app.on_event("startup")
+def restore_runs():
+    """
+    Pick persisted runs up again: previews that survived the restart are
+    adopted, and runs whose pipeline was cut off are marked resumable.
+    """
+    if coordination.enabled():
+        # Join the cluster and take jobs other workers enqueued
+        jobs.start_workers()
+    workspace_pool.start()
+    adopted = interrupted = 0
+    for slug in list(RUNS):
+        run = RUNS[slug]
+        if coordination.enabled() and (run.get("pid") or run.get("pipeline_status") == "running") \
+                and not coordination.acquire(slug):
+            continue  # a live sibling worker has this run
+        if run.get("pipeline_status") == "running" and not jobs.active_job_for_slug(slug):
+            RUNS.update_run(slug, {"pipeline_status": "interrupted"})
+            interrupted += 1
+        port, repo_path = run.get("port"), run.get("repo_path")
+        if run.get("pid") and port and repo_path and port_tool.reserve(slug, port):
+            log_path = os.path.join(repo_path, "dev_server.log")
+            if preview_supervisor.adopt(slug, run["pid"], repo_path, port, log_path, port_tool.preview_url(port)):
+                adopted += 1
+            else:
+                port_tool.release(slug)
+    print(f"Restored {len(RUNS)} runs: {adopted} previews adopted, {interrupted} interrupted runs resumable")
+
+@app.on_event("shutdown")
+def stop_previews():
+    if PREVIEW_STOP_ON_SHUTDOWN:
+        preview_supervisor.stop_all()
 
 @app.post("/reset/{slug}")
-def reset(slug: str):
+def reset(request: Request, slug: str):
+    redirect = _redirect_to_owner(request, slug)
+    if redirect:
+        return redirect
     run = RUNS.get(slug)
     if not run:
         raise HTTPException(404, "Run not found")
+    if jobs.active_job_for_slug(slug):
+        raise HTTPException(409, "A job is still in progress for this run")
     pid = run.get("pid")
-    if pid:
+    if not preview_supervisor.stop(slug, reason="reset") and pid:
+        # Started by an earlier process or a sibling worker: stop its whole process group
         try:
-            os.kill(pid, signal.SIGTERM)
+            os.killpg(pid, signal.SIGTERM)
         except Exception:
-            pass
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except Exception:
+                pass
+    port_tool.release(slug)
+    coordination.release(slug, force=True)
     workdir = run.get("repo_path")
     if workdir and os.path.exists(workdir):
         shutil.rmtree(workdir, ignore_errors=True)
+    run_store.delete_checkpoints(run.get("thread_id"))
     del RUNS[slug]
     return {"ok": True}